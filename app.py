@@ -1,44 +1,65 @@
+import io
 import os
-import json
+import hashlib
 import random
 import tempfile
+import threading
+import time
 from pathlib import Path
-from datetime import datetime
 
 import numpy as np
 from PIL import Image
-import tensorflow as tf
 from tensorflow.keras.preprocessing import image
 
-from flask import Flask, request, render_template, redirect, url_for, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Flask, Response, abort, g, request, render_template, redirect, url_for, jsonify, send_from_directory
 
 # Import modules
 from government_data import calculate_with_government_data
-from voice_assistant_kn import get_agriculture_response, LANGUAGE
-
-# Import speech libraries
-try:
-    from gtts import gTTS
-    GTTS_AVAILABLE = True
-except ImportError:
-    GTTS_AVAILABLE = False
-    print("Warning: gTTS not installed. Text-to-speech will not work.")
+from voice_assistant_kn import get_agriculture_response, get_canned_responses, LANGUAGE
+from tts_cache import TTSCache, get_backend
+from voice_jobs import VoiceJobQueue
+from knowledge_base import get_knowledge_base
+from metrics import REGISTRY, CONTENT_TYPE, REQUESTS, REQUEST_SECONDS, timed
+from profiler import Profiler
+from model_registry import ModelServer
+from prediction_history import get_prediction_history
+from ood import OOD_LABEL
+from gradcam import GRADCAM_ENABLED, GradCamCache
+from severity import estimate as estimate_severity, measurable as severity_measurable
+from static_files import StaticFiles
 
 
 BASE_DIR = Path(__file__).resolve().parent
-MODEL_PATH = BASE_DIR / "saved_models" / "tomato_disease_model.h5"
-CLASS_IND_PATH = BASE_DIR / "saved_models" / "class_indices.json"
-DATA_DIR = BASE_DIR / "data" / "tomato"
 UPLOAD_FOLDER = BASE_DIR / "static" / "uploads"
 AUDIO_FOLDER = BASE_DIR / "static" / "audio"
+DATA_DIR = BASE_DIR / "data" / "tomato"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG"}
+
+# Browsers downscale photos to this longest side before upload (static/js/app.js);
+# uploads from clients without JavaScript are still accepted up to the size limits
+UPLOAD_MAX_SIDE = int(os.environ.get("UPLOAD_MAX_SIDE", 1024))
+UPLOAD_JPEG_QUALITY = float(os.environ.get("UPLOAD_JPEG_QUALITY", 0.85))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 16 * 1024 * 1024))
+UPLOAD_MAX_PIXELS = 40_000_000
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(AUDIO_FOLDER, exist_ok=True)
 
-app = Flask(__name__)
+# /static is served by static_files (cache headers, precompressed assets, metrics)
+app = Flask(__name__, static_folder=None)
 app.config["UPLOAD_FOLDER"] = str(UPLOAD_FOLDER)
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES
+
+
+# Text-to-speech: cached by content hash, canned answers generated in the background
+tts_backend = get_backend()
+tts_cache = TTSCache(tts_backend, AUDIO_FOLDER) if tts_backend else None
+voice_jobs = VoiceJobQueue(tts_cache) if tts_cache else None
+if tts_cache is None:
+    print("Warning: no TTS backend available. Text-to-speech will not work.")
+elif os.environ.get("TTS_PREWARM", "1") == "1":
+    tts_cache.prewarm(get_canned_responses(), LANGUAGE['tts_code'])
 
 
 # Custom Jinja2 filter for number formatting
@@ -55,44 +76,258 @@ def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-# Load model at startup (fail early if missing)
-model = None
-labels = None
-mapping_source = None
-try:
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(f"Model not found at: {MODEL_PATH}")
-
-    model = tf.keras.models.load_model(str(MODEL_PATH))
-
-    # Try to load saved class_indices mapping
-    if CLASS_IND_PATH.exists():
-        with open(CLASS_IND_PATH, "r", encoding="utf-8") as fh:
-            class_indices = json.load(fh)
-        # invert mapping to list by index
-        labels = [None] * len(class_indices)
-        for name, idx in class_indices.items():
-            labels[idx] = name
-        mapping_source = "saved_models/class_indices.json"
-    else:
-        # Fallback: infer classes from data folder (alphabetical, same order as Keras flow_from_directory)
-        if DATA_DIR.exists():
-            folders = [d.name for d in sorted(DATA_DIR.iterdir()) if d.is_dir()]
-            labels = folders
-            mapping_source = "data/tomato (inferred, alphabetical)"
-        else:
-            labels = None
-            mapping_source = "none"
-except Exception as e:
-    # Keep model None and surface error on pages
-    model = None
-    labels = None
-    mapping_source = f"error: {e}"
+def upload_filename(data: bytes, original_name: str) -> str:
+    """Content-addressed name: identical uploads share a file, and the URL can be
+    cached as immutable because it never points at different bytes"""
+    extension = original_name.rsplit(".", 1)[1].lower()
+    return f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+
+
+def save_upload(data: bytes, path: Path):
+    """Write an upload under its content-addressed name. Existing files already hold
+    these bytes and are never rewritten; new ones appear atomically, so a browser
+    (caching the URL as immutable) or a concurrent decode never reads a partial file"""
+    if path.exists():
+        return
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as fh:
+        fh.write(data)
+    try:
+        os.replace(fh.name, path)
+    except OSError:
+        os.unlink(fh.name)
+        raise
+
+
+def validate_upload(data: bytes):
+    """Return an error message if the uploaded bytes are not a usable JPEG/PNG image"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            fmt = img.format
+            width, height = img.size
+            img.verify()
+    except Exception:
+        return "Uploaded file is not a valid image"
+    if fmt not in ALLOWED_IMAGE_FORMATS:
+        return f"Unsupported image format: {fmt}"
+    if width * height > UPLOAD_MAX_PIXELS:
+        return "Image dimensions are too large"
+    return None
+
+
+# Upload sizes before (as reported by the browser) and after client-side downscaling
+upload_stats = {"uploads": 0, "original_bytes": 0, "uploaded_bytes": 0}
+_upload_stats_lock = threading.Lock()
+
+
+def record_upload(original_bytes, uploaded_bytes):
+    with _upload_stats_lock:
+        upload_stats["uploads"] += 1
+        upload_stats["original_bytes"] += original_bytes
+        upload_stats["uploaded_bytes"] += uploaded_bytes
+
+
+@app.context_processor
+def upload_settings():
+    return {"upload_max_side": UPLOAD_MAX_SIDE, "upload_jpeg_quality": UPLOAD_JPEG_QUALITY}
+
+
+static_files = StaticFiles()
+
+
+@app.context_processor
+def static_assets():
+    # CSS/JS links carry a content hash so browsers can cache them for a year
+    return {"asset_url": static_files.url}
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return render_template(
+        "index.html", model_ready=(model_server.current is not None), mapping_source=mapping_source(),
+        error=f"Image is larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB",
+    ), 413
+
+
+# Load model at startup from the registry (saved_models/registry/CURRENT), falling
+# back to saved_models/tomato_disease_model.h5; a watcher hot-swaps new versions
+model_server = ModelServer()
+model_server.load_initial()
+model_server.start_watcher()
+
+
+def mapping_source():
+    current = model_server.current
+    return current.mapping_source if current is not None else model_server.error
+
+
+# Every prediction is logged for the /history dashboard (batched writes off the request path)
+history = get_prediction_history()
+gradcams = GradCamCache()
+
+
+# ---- METRICS ----
+PREDICTIONS = REGISTRY.counter("tomato_predictions_total", "Predictions by top label", ("label",))
+OOD_REJECTIONS = REGISTRY.counter("tomato_ood_rejections_total", "Uploads rejected as not a tomato leaf")
+REGISTRY.gauge_callback(
+    "tomato_model_loaded", "1 when the classifier is loaded", lambda: int(model_server.current is not None))
+REGISTRY.counter_callback(
+    "tomato_upload_bytes_total", "Upload bytes before (original) and after (uploaded) client-side downscaling",
+    lambda: [({"kind": "original"}, upload_stats["original_bytes"]),
+             ({"kind": "uploaded"}, upload_stats["uploaded_bytes"])],
+    ("kind",))
+REGISTRY.counter_callback(
+    "tomato_tts_cache_events_total", "TTS cache hits, misses, errors and evictions",
+    lambda: [({"event": k}, v) for k, v in tts_cache.stats.items()] if tts_cache else [],
+    ("event",))
+REGISTRY.gauge_callback(
+    "tomato_tts_cache_bytes", "Audio bytes held in the TTS cache",
+    lambda: tts_cache.summary()["bytes"] if tts_cache else None)
+REGISTRY.counter_callback(
+    "tomato_history_records_total", "Prediction history records written or dropped (queue full)",
+    lambda: [({"result": "written"}, history.stats["written"]), ({"result": "dropped"}, history.stats["dropped"])],
+    ("result",))
+REGISTRY.gauge_callback(
+    "tomato_history_queue_depth", "Prediction history records waiting to be written", lambda: history.pending())
+REGISTRY.counter_callback(
+    "tomato_gradcam_cache_events_total", "Grad-CAM overlays served from cache (hits) or rendered (misses)",
+    lambda: [({"event": k}, v) for k, v in gradcams.stats.items()], ("event",))
+REGISTRY.counter_callback(
+    "tomato_static_bytes_sent_total", "Body bytes sent for /static files", lambda: static_files.bytes_sent)
+REGISTRY.counter_callback(
+    "tomato_static_bytes_saved_total",
+    "/static bytes not sent thanks to precompression, 304 revalidation and range requests",
+    lambda: [({"reason": k}, v) for k, v in static_files.bytes_saved.items()], ("reason",))
+REGISTRY.counter_callback(
+    "tomato_profiles_total", "Requests profiled by the sampling profiler", lambda: profiler.profiled)
+REGISTRY.gauge_callback(
+    "tomato_knowledge_base_entries", "Q&A entries loaded for the voice assistant",
+    lambda: len(get_knowledge_base().index.entries))
+
+
+# Sampling profiler: off unless PROFILE_SAMPLE_RATE > 0 or a request carries X-Profile: <PROFILE_TOKEN>
+profiler = Profiler()
+
+
+@app.before_request
+def start_timer():
+    request.environ["metrics.start"] = time.perf_counter()
+    g.profile = None
+    if profiler.wanted(request.headers):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.profile = profiler.start(route)
+
+
+@app.after_request
+def record_request(response):
+    start = request.environ.get("metrics.start")
+    # Label by URL rule rather than path so ids and filenames don't explode cardinality
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if start is not None and route != "/metrics":
+        REQUESTS.inc(route=route, status=response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+    session = g.pop("profile", None)
+    if session is not None:
+        response.headers["X-Profile-Id"] = profiler.finish(session).name
+    return response
+
+
+@app.teardown_request
+def stop_profile(exc):
+    # after_request is skipped when a view raises; make sure the sampler still stops
+    session = g.pop("profile", None)
+    if session is not None:
+        profiler.finish(session)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route("/model", methods=["GET"])
+def model_status():
+    """Served and shadow model versions, registry contents and shadow agreement"""
+    return jsonify(model_server.status())
+
+
+@app.route("/debug/profiler", methods=["GET", "POST"])
+def profiler_settings():
+    """Show or change profiler settings at runtime; requires X-Profile: <PROFILE_TOKEN>"""
+    if not profiler.authorized(request.headers):
+        abort(404)
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            if "sample_rate" in data:
+                profiler.sample_rate = min(1.0, max(0.0, float(data["sample_rate"])))
+            if "interval" in data:
+                profiler.interval = max(0.001, float(data["interval"]))
+        except (TypeError, ValueError):
+            return jsonify({"error": "sample_rate and interval must be numbers"}), 400
+        if "trace_tf" in data:
+            profiler.trace_tf = bool(data["trace_tf"])
+    return jsonify(profiler.status())
 
 
 @app.route("/", methods=["GET"])
 def index():
-    return render_template("index.html", model_ready=(model is not None), mapping_source=mapping_source)
+    return render_template("index.html", model_ready=(model_server.current is not None), mapping_source=mapping_source())
+
+
+@app.route("/static/<path:filename>", methods=["GET"], endpoint="static")
+def static_file(filename):
+    return static_files.serve(filename)
+
+
+@app.route("/dataset/<path:filename>", methods=["GET"])
+def dataset_image(filename):
+    """Training images shown as similar cases on the result page"""
+    return send_from_directory(DATA_DIR, filename, max_age=86400)
+
+
+HISTORY_WINDOWS = (7, 30, 90, 365)
+
+
+@app.route("/history", methods=["GET"])
+def prediction_history():
+    """Disease incidence dashboard over recent predictions"""
+    days = request.args.get("days", 30, type=int)
+    days = days if days in HISTORY_WINDOWS else 30
+    region = request.args.get("region") or None
+    daily = history.daily_counts(days, region)
+    totals = history.totals(days, region)
+    return render_template(
+        "history.html",
+        days=days,
+        windows=HISTORY_WINDOWS,
+        region=region,
+        regions=history.regions(),
+        totals=totals,
+        total_count=sum(count for _, count, _ in totals),
+        daily=sorted(daily.items()),
+        daily_max=max((sum(counts.values()) for counts in daily.values()), default=0),
+        trends=history.trends(7, region),
+        by_region=sorted(history.by_region(days).items()) if region is None else [],
+        recent=history.recent(15),
+    )
+
+
+@app.route("/history/data", methods=["GET"])
+def prediction_history_data():
+    """Same aggregates as /history as JSON"""
+    days = max(1, min(request.args.get("days", 30, type=int), 3650))
+    region = request.args.get("region") or None
+    return jsonify({
+        "days": days,
+        "region": region,
+        "daily": history.daily_counts(days, region),
+        "totals": [{"label": label, "count": count, "mean_confidence": round(conf, 4)}
+                   for label, count, conf in history.totals(days, region)],
+        "trends": [{"label": label, "last_7_days": now, "previous_7_days": before,
+                    "change_pct": round(change, 1) if change is not None else None}
+                   for label, now, before, change in history.trends(7, region)],
+        "by_region": history.by_region(days) if region is None else None,
+    })
 
 
 @app.route("/profit-analyser", methods=["GET"])
@@ -119,31 +354,28 @@ def process_voice():
             })
 
         # Get agriculture response (Kannada only)
-        response = get_agriculture_response(question)
-
-        # Generate audio response using gTTS (Kannada)
-        audio_url = None
-        if GTTS_AVAILABLE:
-            try:
-                # Generate TTS in Kannada
-                tts = gTTS(text=response, lang='kn', slow=False)
-                
-                # Save to file with timestamp
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                audio_filename = f"response_{timestamp}_kn.mp3"
-                audio_path = AUDIO_FOLDER / audio_filename
-                tts.save(str(audio_path))
-                
-                audio_url = f"/static/audio/{audio_filename}"
-            except Exception as e:
-                print(f"TTS generation error: {e}")
-                # Continue without audio if TTS fails
+        with timed('voice', 'answer_lookup'):
+            response = get_agriculture_response(question)
 
-        return jsonify({
+        # Audio response (Kannada): served from the TTS cache when the answer repeats,
+        # otherwise synthesized in the background while the client polls audio_status_url
+        result = {
             "success": True,
             "response": response,
-            "audio_url": audio_url
-        })
+            "audio_url": None,
+            "audio_status": "unavailable",
+            "audio_status_url": None,
+        }
+        if voice_jobs is not None:
+            with timed('voice', 'tts_submit'):
+                status, job_id, audio_filename = voice_jobs.submit(response, LANGUAGE['tts_code'])
+            result["audio_status"] = status
+            if audio_filename:
+                result["audio_url"] = f"/static/audio/{audio_filename}"
+            elif job_id:
+                result["audio_status_url"] = url_for("voice_audio_status", job_id=job_id)
+
+        return jsonify(result)
 
     except Exception as e:
         print(f"Error processing voice request: {e}")
@@ -153,6 +385,18 @@ def process_voice():
         })
 
 
+@app.route("/voice-ai/audio/<job_id>", methods=["GET"])
+def voice_audio_status(job_id):
+    """Poll a background TTS job started by /voice-ai/process"""
+    if voice_jobs is None:
+        return jsonify({"status": "unavailable", "audio_url": None})
+    status, audio_filename = voice_jobs.status(job_id)
+    return jsonify({
+        "status": status,
+        "audio_url": f"/static/audio/{audio_filename}" if audio_filename else None,
+    })
+
+
 @app.route("/profit-analyser/analyse", methods=["POST"])
 def analyse_profit():
     # Get form data
@@ -174,15 +418,17 @@ def analyse_profit():
     }
 
     # Perform analysis using government data
-    analysis = calculate_with_government_data(data)
+    with timed('profit', 'analysis'):
+        analysis = calculate_with_government_data(data)
 
-    return render_template("profit_result.html", data=data, analysis=analysis)
+    with timed('profit', 'render'):
+        return render_template("profit_result.html", data=data, analysis=analysis)
 
 
 @app.route("/predict", methods=["POST"])
 def predict():
-    if model is None:
-        return render_template("index.html", model_ready=False, mapping_source=mapping_source, error="Model not loaded")
+    if model_server.current is None:
+        return render_template("index.html", model_ready=False, mapping_source=mapping_source(), error="Model not loaded")
 
     if "file" not in request.files:
         return redirect(url_for("index"))
@@ -190,51 +436,128 @@ def predict():
     if file.filename == "":
         return redirect(url_for("index"))
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
+        with timed('predict', 'upload_read'):
+            data = file.read()
+        with timed('predict', 'validate'):
+            error = validate_upload(data)
+        if error:
+            return render_template("index.html", model_ready=True, mapping_source=mapping_source(), error=error), 400
+        try:
+            original_bytes = int(request.form.get("original_bytes") or len(data))
+        except ValueError:
+            original_bytes = len(data)
+        record_upload(max(original_bytes, len(data)), len(data))
+
+        image_hash = hashlib.sha256(data).hexdigest()
+        filename = upload_filename(data, file.filename)
         save_path = UPLOAD_FOLDER / filename
-        file.save(str(save_path))
+        with timed('predict', 'save'):
+            save_upload(data, save_path)
 
         # Preprocess image
-        img = image.load_img(str(save_path), target_size=(224, 224))
-        x = image.img_to_array(img) / 255.0
-        x = np.expand_dims(x, axis=0)
-
-        preds = model.predict(x)
+        with timed('predict', 'decode_resize'):
+            img = image.load_img(str(save_path), target_size=(224, 224))
+            x = image.img_to_array(img) / 255.0
+            x = np.expand_dims(x, axis=0)
+
+        explain = GRADCAM_ENABLED and bool(request.form.get("explain"))
+
+        # Hold this model version until the prediction is done, even if a new one is swapped in
+        with model_server.acquire() as served:
+            gradcam_url = gradcams.lookup(served.version, image_hash) if explain else None
+            cam = None
+            with timed('predict', 'model_predict'), profiler.tf_trace(g.get("profile")):
+                if explain and gradcam_url is None:
+                    # Same forward pass, plus the last conv feature map for the heatmap
+                    preds, embeddings, cam = served.predict_explained(x)
+                else:
+                    preds, embeddings = served.predict(x)
+            embedding = embeddings[0] if embeddings is not None else None
+            # Reuses the pooled embedding from the same forward pass, no second model call
+            with timed('predict', 'ood_check'):
+                ood = served.ood_check(embedding)
+            is_ood = bool(ood and ood["is_ood"])
+            with timed('predict', 'similar_cases'):
+                similar = served.similar(embedding) if not is_ood else []
+        labels, source, model_version = served.labels, served.mapping_source, served.version
         preds = preds[0]
-        top_idx = int(np.argmax(preds))
-        top_prob = float(preds[top_idx])
-
-        if labels and top_idx < len(labels):
-            predicted_label = labels[top_idx]
-        else:
-            predicted_label = str(top_idx)
-
-        # Compute probabilities list (label, prob)
-        prob_list = []
-        if labels and len(labels) == len(preds):
-            for i, p in enumerate(preds):
-                prob_list.append((labels[i], float(p)))
-        else:
-            for i, p in enumerate(preds):
-                prob_list.append((str(i), float(p)))
-
-        prob_list = sorted(prob_list, key=lambda x: x[1], reverse=True)
-
-        # Define affected rate: if predicted label is 'healthy' -> 0, else top_prob*100
-        if predicted_label.lower().startswith("healthy"):
+        with timed('predict', 'postprocess'):
+            top_idx = int(np.argmax(preds))
+            top_prob = float(preds[top_idx])
+
+            if labels and top_idx < len(labels):
+                predicted_label = labels[top_idx]
+            else:
+                predicted_label = str(top_idx)
+
+            # Compute probabilities list (label, prob)
+            prob_list = []
+            if labels and len(labels) == len(preds):
+                for i, p in enumerate(preds):
+                    prob_list.append((labels[i], float(p)))
+            else:
+                for i, p in enumerate(preds):
+                    prob_list.append((str(i), float(p)))
+
+            prob_list = sorted(prob_list, key=lambda x: x[1], reverse=True)
+
+        # Affected rate: share of the leaf area with lesions, measured from the image
+        # itself rather than model confidence (0 for a healthy diagnosis). Only for
+        # diseases whose lesions the colour segmentation can tell apart from healthy
+        # tissue; None ("Not measured") for the rest
+        severity = None
+        if is_ood:
+            # Not a tomato leaf: report that instead of the (meaningless) top class
+            predicted_label = OOD_LABEL
+            affected_rate = 0.0
+        elif predicted_label.lower().startswith("healthy"):
             affected_rate = 0.0
+        elif severity_measurable(predicted_label):
+            with timed('predict', 'severity'):
+                severity = estimate_severity(x[0])
+            affected_rate = severity["affected_pct"] if severity["leaf_found"] else None
+        else:
+            affected_rate = None
+
+        gradcam_ms = None
+        if cam is not None and not is_ood:
+            start = time.perf_counter()
+            with timed('predict', 'gradcam_render'):
+                gradcam_url = gradcams.render(model_version, image_hash, save_path, cam)
+            gradcam_ms = (time.perf_counter() - start) * 1000
+        elif is_ood:
+            gradcam_url = None
+        if is_ood:
+            # Not a case of any disease: kept out of the label counts and the incidence history
+            OOD_REJECTIONS.inc()
         else:
-            affected_rate = top_prob * 100.0
-
-        return render_template(
-            "result.html",
-            image_url=f"uploads/{filename}",
-            predicted_label=predicted_label,
-            confidence=top_prob * 100.0,
-            affected_rate=affected_rate,
-            prob_list=prob_list,
-            mapping_source=mapping_source,
-        )
+            PREDICTIONS.inc(label=predicted_label)
+            model_server.score_shadow(x, predicted_label, top_prob)
+            history.record(
+                predicted_label, top_prob,
+                top_k=[(label, round(prob, 4)) for label, prob in prob_list[:3]],
+                model_version=model_version,
+                image_hash=image_hash,
+                region=(request.form.get("region") or "")[:64],
+                farm_id=(request.form.get("farm_id") or "")[:64],
+            )
+
+        with timed('predict', 'render'):
+            return render_template(
+                "result.html",
+                image_url=f"uploads/{filename}",
+                predicted_label=predicted_label,
+                confidence=top_prob * 100.0,
+                affected_rate=affected_rate,
+                severity=severity,
+                prob_list=prob_list,
+                similar_cases=similar,
+                ood=ood,
+                is_ood=is_ood,
+                gradcam_url=gradcam_url,
+                gradcam_ms=gradcam_ms,
+                mapping_source=source,
+            )
 
     return redirect(url_for("index"))
 
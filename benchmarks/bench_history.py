@@ -0,0 +1,119 @@
+"""
+Prediction history benchmark
+
+Streams synthetic predictions (spread over a year, many regions, all disease
+classes) through PredictionHistory.record() into a fresh database and reports
+the per-call cost on the request path, sustained ingest throughput, database
+size, and the latency of the dashboard queries served from the daily_counts
+rollup compared with the same aggregate computed by scanning the raw table.
+
+Usage:
+    python benchmarks/bench_history.py [--rows 1000000] [--regions 30] [--db /tmp/history_bench.db]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import date, timedelta
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prediction_history import PredictionHistory, QUEUE_SIZE  # noqa: E402
+
+
+LABELS = ['Bacterial_spot', 'Early_blight', 'Late_blight', 'Leaf_Mold', 'Septoria_leaf_spot',
+          'Spider_mites Two-spotted_spider_mite', 'Target_Spot', 'Tomato_Yellow_Leaf_Curl_Virus',
+          'Tomato_mosaic_virus', 'healthy', 'powdery_mildew']
+
+
+def timed_ms(fn, repeat=20):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--regions', type=int, default=30)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--db', help='database path (default: a temporary file)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tmp = None
+    if args.db:
+        db_path = Path(args.db)
+        for suffix in ('', '-wal', '-shm'):
+            if Path(str(db_path) + suffix).exists():
+                os.remove(str(db_path) + suffix)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = Path(tmp.name) / 'history.db'
+
+    # A queue large enough for the whole run, so record() timings never include drops
+    history = PredictionHistory(db_path, queue_size=max(QUEUE_SIZE, args.rows + 1))
+    regions = [f'region_{i:02d}' for i in range(args.regions)]
+    now = time.time()
+    weights = [rng.random() for _ in LABELS]
+
+    print(f"Recording {args.rows} predictions ...")
+    record_seconds = 0.0
+    worst = 0.0
+    start = time.perf_counter()
+    for i in range(args.rows):
+        label = rng.choices(LABELS, weights)[0]
+        ts = now - rng.random() * args.days * 86400
+        t0 = time.perf_counter()
+        history.record(label, rng.uniform(0.4, 1.0), top_k=[[label, 0.9]], model_version='v1',
+                       image_hash=f'{i:064x}', region=rng.choice(regions), farm_id=str(i % 5000), ts=ts)
+        elapsed = time.perf_counter() - t0
+        record_seconds += elapsed
+        worst = max(worst, elapsed)
+    history.flush()
+    total = time.perf_counter() - start
+    history.close()
+
+    size_mb = sum(os.path.getsize(str(db_path) + s) for s in ('', '-wal') if os.path.exists(str(db_path) + s)) / 1e6
+    print(f"record(): mean {record_seconds / args.rows * 1e6:.1f} us, max {worst * 1000:.2f} ms")
+    print(f"Ingest: {args.rows / total:,.0f} rows/s ({total:.1f}s incl. generation), "
+          f"{history.stats['batches']} batches, database {size_mb:.0f} MB")
+
+    reader = PredictionHistory(db_path)
+    today = date.today()
+    start_day = (today - timedelta(days=29)).isoformat()
+    conn = reader._conn()
+    rollup_rows = conn.execute("SELECT COUNT(*) FROM daily_counts").fetchone()[0]
+    print(f"\nQueries over {args.rows} rows ({rollup_rows} rollup rows), median of 20 runs:")
+    queries = [
+        ('totals 30d (rollup)', lambda: reader.totals(30)),
+        ('totals 30d (raw scan)', lambda: conn.execute(
+            "SELECT label, COUNT(*), AVG(confidence) FROM predictions WHERE day >= ? GROUP BY label",
+            (start_day,)).fetchall()),
+        ('daily 365d (rollup)', lambda: reader.daily_counts(365)),
+        ('daily 365d (raw scan)', lambda: conn.execute(
+            "SELECT day, label, COUNT(*) FROM predictions GROUP BY day, label").fetchall()),
+        ('by region 30d (rollup)', lambda: reader.by_region(30)),
+        ('trends 7d (rollup)', lambda: reader.trends(7)),
+        ('one region 90d (rollup)', lambda: reader.daily_counts(90, regions[0])),
+        ('recent 15', lambda: reader.recent(15)),
+    ]
+    for name, fn in queries:
+        print(f"  {name:<26} {timed_ms(fn, 5 if 'raw' in name else 20):>9.2f} ms")
+    reader.close()
+    if tmp:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
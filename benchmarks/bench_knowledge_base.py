@@ -0,0 +1,104 @@
+"""
+Knowledge base retrieval benchmark
+
+Builds a synthetic Kannada knowledge base, then queries it with noisy
+variants of the stored keys (vowel length swaps, dropped virama, dropped
+syllable, filler words) and reports index build time, query latency
+percentiles and top-1 recall.
+
+Also checks that the voice assistant still answers out-of-scope for everyday
+English sentences that contain Q&A keys as substrings ("phone" contains "ph");
+exits non-zero if any of them gets an agriculture answer.
+
+Usage:
+    python benchmarks/bench_knowledge_base.py [--entries 10000] [--queries 2000]
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from knowledge_base import KnowledgeIndex, _make_entry  # noqa: E402
+from voice_assistant_kn import LANGUAGE, get_agriculture_response  # noqa: E402
+
+
+CONSONANTS = list('ಕಖಗಘಚಛಜಝಟಠಡಢತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಳ')
+VOWEL_SIGNS = ['', 'ಾ', 'ಿ', 'ೀ', 'ು', 'ೂ', 'ೆ', 'ೇ', 'ೊ', 'ೋ', '್']
+FILLERS = ['ಏನು', 'ಮಾಡಬೇಕು', 'ಹೇಗೆ', 'ಎಷ್ಟು', 'ಟಮಾಟೊ', 'ಬಗ್ಗೆ', 'ಹೇಳಿ']
+OUT_OF_SCOPE = [
+    'how do I charge my phone', 'send me a photo', 'the graph shows a phase change',
+    'what is the alphabet', 'is my phd application done', 'target practice this weekend',
+    'temperature on mars today', 'play some music', 'book a flight to delhi',
+]
+NOISE = str.maketrans({'ಾ': '', 'ೀ': 'ಿ', 'ೂ': 'ು', 'ೇ': 'ೆ', 'ೋ': 'ೊ', '್': ''})
+
+
+def random_word(rng):
+    return ''.join(rng.choice(CONSONANTS) + rng.choice(VOWEL_SIGNS) for _ in range(rng.randint(2, 5)))
+
+
+def noisy(key, rng):
+    words = key.split()
+    # vowel-length / virama confusion on one word, sometimes drop a trailing syllable
+    i = rng.randrange(len(words))
+    words[i] = words[i].translate(NOISE)
+    if len(words[i]) > 4 and rng.random() < 0.3:
+        words[i] = words[i][:-1]
+    question = rng.sample(FILLERS, 1) + words + rng.sample(FILLERS, 2)
+    return ' '.join(question)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keys = set()
+    while len(keys) < args.entries:
+        keys.add(' '.join(random_word(rng) for _ in range(rng.randint(1, 3))))
+    keys = sorted(keys)
+    entries = [_make_entry(k, '', f'answer {i}') for i, k in enumerate(keys)]
+
+    start = time.perf_counter()
+    index = KnowledgeIndex(entries)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    hits = 0
+    for _ in range(args.queries):
+        target = rng.randrange(len(keys))
+        question = noisy(keys[target], rng)
+        start = time.perf_counter()
+        results = index.search(question, k=5)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if results and results[0][0] is entries[target]:
+            hits += 1
+
+    print(f"entries:        {len(entries)}")
+    print(f"index build:    {build_ms:.0f} ms ({len(index.postings)} distinct n-grams)")
+    print(f"query p50:      {percentile(latencies, 50):.3f} ms")
+    print(f"query p95:      {percentile(latencies, 95):.3f} ms")
+    print(f"query p99:      {percentile(latencies, 99):.3f} ms")
+    print(f"top-1 recall:   {hits / args.queries:.3f} on noisy queries")
+
+    leaks = [q for q in OUT_OF_SCOPE if get_agriculture_response(q) != LANGUAGE['out_of_scope']]
+    print(f"out of scope:   {len(OUT_OF_SCOPE) - len(leaks)}/{len(OUT_OF_SCOPE)} unrelated sentences rejected")
+    for question in leaks:
+        print(f"  answered: {question!r}")
+    return 1 if leaks else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Web service benchmark / load test
+
+Drives /predict, /profit-analyser/analyse and /voice-ai/process with a
+configurable number of concurrent clients and writes throughput and latency
+percentiles per route to a JSON file, so runs from different commits can be
+compared.
+
+The app is exercised in-process through Flask's test client by default
+(text-to-speech is switched to the silent stub backend so gTTS is never
+called), or over HTTP against a running server with --url. Start that server
+with TTS_BACKEND=silent for comparable numbers.
+
+Usage:
+    python benchmarks/load_test.py run [--concurrency 8] [--requests 200] [--out results.json]
+    python benchmarks/load_test.py run --url http://localhost:5000
+    python benchmarks/load_test.py compare base.json new.json [--threshold 10]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import threading
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+
+RESOLUTIONS = [(224, 224), (640, 480), (1280, 960), (4000, 3000)]
+SEASONS = ['Summer (Mar–Jun)', 'Monsoon (Jul–Sep)', 'Post Monsoon (Oct–Nov)', 'Winter (Dec–Feb)']
+FARMING_TYPES = ['Traditional', 'Modern/Scientific', 'Greenhouse']
+VOICE_QUESTIONS = [
+    'ಬ್ಯಾಕ್ಟೀರಿಯಾ ಸ್ಪಾಟ್ ಏನು ಮಾಡಬೇಕು?',
+    'ಟಮಾಟೊ ಮಾರುಕಟ್ಟೆ ಬೆಲೆ ಎಷ್ಟು?',
+    'ಸೂಕ್ತ ತಾಪಮಾನ ಎಷ್ಟು?',
+    'ಟೊಮೇಟೊ ರೋಗ ಹೇಗೆ ತಡೆಯುವುದು',
+    'ಮಣ್ಣು ಪರೀಕ್ಷೆ ಎಲ್ಲಿ ಮಾಡಿಸಬೇಕು',
+    'ಸ್ಪೈಡರ್ ಮೈಟ್ಸ ಗೆ ಔಷಧಿ',
+    'what is the weather today',
+]
+
+
+# ---- SYNTHETIC INPUTS ----
+def synthetic_leaf(width, height, seed):
+    """JPEG bytes of a leaf-like image: green ellipse with brown lesions on soil"""
+    rng = random.Random(seed)
+    img = Image.new('RGB', (width, height), (110 + rng.randint(-10, 10), 85, 60))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([width * 0.1, height * 0.15, width * 0.9, height * 0.85],
+                 fill=(40 + rng.randint(-10, 10), 130 + rng.randint(-20, 20), 45))
+    for _ in range(rng.randint(3, 12)):
+        cx, cy = rng.uniform(0.25, 0.75) * width, rng.uniform(0.3, 0.7) * height
+        r = rng.uniform(0.01, 0.05) * min(width, height)
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=(100, 70, 30))
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=90)
+    return buf.getvalue()
+
+
+def profit_form(rng):
+    land = round(rng.uniform(0.5, 10), 1)
+    return {
+        'crop_type': 'Tomato',
+        'season': rng.choice(SEASONS),
+        'land_size': str(land),
+        'num_plants': str(int(land * rng.randint(8000, 12000))),
+        'farming_type': rng.choice(FARMING_TYPES),
+        'organic': rng.choice(['Yes', 'No']),
+    }
+
+
+# ---- CLIENTS ----
+class InProcessClient:
+    """Flask test client; one per worker thread"""
+
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._app.test_client()
+        return self._local.client
+
+    def predict(self, name, data):
+        r = self._client().post('/predict', data={'file': (io.BytesIO(data), name)},
+                                content_type='multipart/form-data')
+        return r.status_code, len(r.data)
+
+    def profit(self, form):
+        r = self._client().post('/profit-analyser/analyse', data=form)
+        return r.status_code, len(r.data)
+
+    def voice(self, question):
+        r = self._client().post('/voice-ai/process', json={'question': question})
+        return r.status_code, len(r.data)
+
+
+class HTTPClient:
+    """requests.Session per worker thread against a running server"""
+
+    def __init__(self, base_url):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def predict(self, name, data):
+        r = self._session().post(self.base_url + '/predict', files={'file': (name, data, 'image/jpeg')})
+        return r.status_code, len(r.content)
+
+    def profit(self, form):
+        r = self._session().post(self.base_url + '/profit-analyser/analyse', data=form)
+        return r.status_code, len(r.content)
+
+    def voice(self, question):
+        r = self._session().post(self.base_url + '/voice-ai/process', json={'question': question})
+        return r.status_code, len(r.content)
+
+
+# ---- RUNNER ----
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    f = int(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+
+def run_route(name, call, payloads, concurrency, warmup):
+    for payload in payloads[:warmup]:
+        call(payload)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(payload):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            status, _ = call(payload)
+            ok = status < 400
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, payloads))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    result = {
+        'requests': len(payloads),
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(payloads) / wall, 2) if wall else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+    }
+    for pct in (50, 95, 99):
+        value = percentile(latencies, pct)
+        result[f'p{pct}_ms'] = round(value, 3) if value is not None else None
+    print(f"{name:<28} {result['throughput_rps']:>9} req/s  p50 {result['p50_ms']:>9} ms  "
+          f"p95 {result['p95_ms']:>9} ms  p99 {result['p99_ms']:>9} ms  errors {errors}")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def cmd_run(args):
+    rng = random.Random(args.seed)
+    meta = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'mode': 'http' if args.url else 'in-process',
+        'concurrency': args.concurrency,
+        'requests_per_route': args.requests,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+    if args.url:
+        client = HTTPClient(args.url)
+        meta['url'] = args.url
+    else:
+        os.environ.setdefault('TTS_BACKEND', 'silent')
+        os.environ.setdefault('TTS_PREWARM', '0')
+        # Synthetic predictions must not land in the real incidence dashboard
+        history_dir = None
+        if 'PREDICTION_DB' not in os.environ:
+            history_dir = tempfile.mkdtemp(prefix='load_test_history_')
+            os.environ['PREDICTION_DB'] = os.path.join(history_dir, 'predictions.db')
+        import app as web_app
+        client = InProcessClient(web_app.app)
+        meta['model_loaded'] = web_app.model_server.current is not None
+        if web_app.model_server.current is None:
+            print("Warning: model not loaded, /predict only measures the upload/error path")
+
+    routes = {}
+    selected = set(args.routes.split(','))
+    n = args.requests
+
+    predict_payloads = []
+    if 'predict' in selected:
+        for width, height in RESOLUTIONS:
+            images = [synthetic_leaf(width, height, seed) for seed in range(4)]
+            payloads = [(f'bench_{width}x{height}_{i % 4}.jpg', images[i % 4]) for i in range(n)]
+            predict_payloads += payloads[:4]
+            routes[f'predict_{width}x{height}'] = run_route(
+                f'/predict {width}x{height}', lambda p: client.predict(*p),
+                payloads, args.concurrency, args.warmup)
+
+    if 'profit' in selected:
+        payloads = [profit_form(rng) for _ in range(n)]
+        routes['profit_analyse'] = run_route(
+            '/profit-analyser/analyse', client.profit, payloads, args.concurrency, args.warmup)
+
+    if 'voice' in selected:
+        payloads = [rng.choice(VOICE_QUESTIONS) for _ in range(n)]
+        routes['voice_process'] = run_route(
+            '/voice-ai/process', client.voice, payloads, args.concurrency, args.warmup)
+
+    if not args.url:
+        # Uploads are stored under a hash of their bytes, not the posted file name
+        for name in {web_app.upload_filename(data, name) for name, data in predict_payloads}:
+            (web_app.UPLOAD_FOLDER / name).unlink(missing_ok=True)
+        if history_dir:
+            web_app.history.close()
+            shutil.rmtree(history_dir, ignore_errors=True)
+
+    with open(args.out, 'w', encoding='utf-8') as fh:
+        json.dump({'meta': meta, 'routes': routes}, fh, indent=2)
+    print(f"Results written to {args.out}")
+    return 0
+
+
+def cmd_compare(args):
+    with open(args.base, 'r', encoding='utf-8') as fh:
+        base = json.load(fh)
+    with open(args.new, 'r', encoding='utf-8') as fh:
+        new = json.load(fh)
+
+    print(f"base {base['meta'].get('commit')}  vs  new {new['meta'].get('commit')}")
+    regressions = 0
+    for route in sorted(set(base['routes']) | set(new['routes'])):
+        old_r, new_r = base['routes'].get(route), new['routes'].get(route)
+        if not old_r or not new_r:
+            print(f"{route:<24} only in {'base' if old_r else 'new'}")
+            continue
+        cells = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            before, after = old_r.get(metric), new_r.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = change > args.threshold if metric.endswith('_ms') else change < -args.threshold
+            regressions += worse
+            cells.append(f"{metric} {before}->{after} ({change:+.1f}%){' !' if worse else ''}")
+        print(f"{route:<24} " + '  '.join(cells))
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold}%")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='run the benchmark')
+    run.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    run.add_argument('--concurrency', type=int, default=4)
+    run.add_argument('--requests', type=int, default=100, help='requests per route (and per resolution)')
+    run.add_argument('--warmup', type=int, default=5)
+    run.add_argument('--routes', default='predict,profit,voice')
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--out', default='bench_results.json')
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser('compare', help='diff two results files')
+    compare.add_argument('base')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=10.0, help='percent change counted as regression')
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
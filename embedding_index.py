@@ -0,0 +1,322 @@
+"""
+Embedding Index
+Similar-case retrieval over the pooled MobileNetV2 embeddings of data/tomato.
+
+The classifier's GlobalAveragePooling2D output (1280 floats) is used as an
+image embedding. An offline build embeds every training image, L2-normalises
+the vectors and stores them as a float16 .npy matrix that is memory-mapped at
+serving time. Search is an IVF (inverted file) index: k-means centroids split
+the vectors into lists, the matrix is stored list by list, and a query scans
+only the `nprobe` lists whose centroids are closest, so a lookup reads a few
+contiguous slices instead of the whole matrix.
+
+Index files live next to the model version they were built with
+(saved_models/registry/v<N>/embeddings/, or saved_models/embeddings/ for the
+legacy model), because embeddings from different models are not comparable.
+
+Usage:
+    python embedding_index.py build [--data data/tomato] [--version v3]
+    python embedding_index.py bench [--entries 100000] [--dim 1280]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data" / "tomato"
+LEGACY_INDEX_DIR = BASE_DIR / "saved_models" / "embeddings"
+
+DEFAULT_NPROBE = 6
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 32   # training points per centroid
+CHUNK = 8192                  # rows per block when assigning / scanning
+
+
+def index_dir(version):
+    """Where the index for a model version is stored"""
+    from model_registry import ModelRegistry
+    if version and version != "legacy":
+        return ModelRegistry().path(version) / "embeddings"
+    return LEGACY_INDEX_DIR
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ---- K-MEANS ----
+def assign(vectors, centroids):
+    """Nearest centroid (by inner product on unit vectors) per row, in blocks"""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), CHUNK):
+        block = np.asarray(vectors[start:start + CHUNK], dtype=np.float32)
+        out[start:start + CHUNK] = (block @ centroids.T).argmax(axis=1)
+    return out
+
+
+def train_centroids(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means on a sample of the (unit-length) vectors"""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        # Re-seed empty lists with random points so every list stays in use
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+# ---- INDEX ----
+class EmbeddingIndex:
+    """IVF index over a memory-mapped float16 matrix stored in list order"""
+
+    def __init__(self, vectors, centroids, offsets, items, meta):
+        self.vectors = vectors        # (N, D) float16, rows grouped by list
+        self.centroids = centroids    # (nlist, D) float32
+        self.offsets = offsets        # (nlist + 1,) row range of each list
+        self.items = items            # [(relative path, label)] in row order
+        self.meta = meta
+        self.nprobe = min(DEFAULT_NPROBE, len(centroids))
+
+    def __len__(self):
+        return len(self.items)
+
+    @classmethod
+    def build(cls, vectors, items, directory, nlist=None, meta=None, seed=0):
+        """Cluster unit vectors (array or memmap) and write the index to `directory`"""
+        directory = Path(directory)
+        os.makedirs(directory, exist_ok=True)
+        n, dim = vectors.shape
+        # ~2*sqrt(N) lists keeps each scanned slice small (the float16 -> float32
+        # conversion of scanned rows dominates query time)
+        nlist = nlist or max(1, min(n, int(2 * np.sqrt(n))))
+        centroids = train_centroids(vectors, nlist, seed=seed)
+        lists = assign(vectors, centroids)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=nlist))]).astype(np.int64)
+
+        # Every file is written under a temp name and renamed into place, meta.json
+        # last: load_index treats meta.json as the marker of a complete index, and
+        # an interrupted rebuild never leaves a half-written file behind
+        out = np.lib.format.open_memmap(directory / "vectors.npy.tmp", mode="w+", dtype=np.float16, shape=(n, dim))
+        for start in range(0, n, CHUNK):
+            out[start:start + CHUNK] = vectors[order[start:start + CHUNK]]
+        out.flush()
+        del out
+        os.replace(directory / "vectors.npy.tmp", directory / "vectors.npy")
+        _write_replace(directory / "centroids.npy", lambda fh: np.save(fh, centroids.astype(np.float32)))
+        _write_replace(directory / "offsets.npy", lambda fh: np.save(fh, offsets))
+        _write_replace(directory / "items.json",
+                       lambda fh: fh.write(json.dumps([items[i] for i in order]).encode("utf-8")))
+        meta = dict(meta or {}, entries=n, dim=dim, nlist=nlist)
+        _write_replace(directory / "meta.json", lambda fh: fh.write(json.dumps(meta, indent=2).encode("utf-8")))
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory):
+        directory = Path(directory)
+        with open(directory / "meta.json", "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        with open(directory / "items.json", "r", encoding="utf-8") as fh:
+            items = [tuple(item) for item in json.load(fh)]
+        vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        offsets = np.load(directory / "offsets.npy")
+        if not len(items) == len(vectors) == offsets[-1] == meta["entries"]:
+            raise ValueError(f"Index files in {directory} are from different builds")
+        return cls(vectors, np.load(directory / "centroids.npy"), offsets, items, meta)
+
+    def search(self, query, k=5, nprobe=None):
+        """Top-k (path, label, cosine similarity) for one embedding"""
+        query = normalize(np.ravel(query))
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        rows, scores = [], []
+        for lst in probe:
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+            if end > start:
+                scores.append(np.asarray(self.vectors[start:end], dtype=np.float32) @ query)
+                rows.append(np.arange(start, end))
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.items[rows[i]][0], self.items[rows[i]][1], float(scores[i])) for i in top]
+
+
+def load_index(version):
+    """Index for a model version, or None if it has not been built"""
+    directory = index_dir(version)
+    if not (directory / "meta.json").exists():
+        return None
+    try:
+        return EmbeddingIndex.load(directory)
+    except Exception as e:
+        print(f"Could not load embedding index from {directory}: {e}")
+        return None
+
+
+# ---- BUILD ----
+def load_model_version(version=None):
+    """(version, LoadedModel) for a registry version, the registry CURRENT, or the legacy model"""
+    from model_registry import ModelRegistry, LEGACY_MODEL_PATH, MODEL_FILE, load_version
+    registry = ModelRegistry()
+    version = version or registry.current() or "legacy"
+    model_path = LEGACY_MODEL_PATH if version == "legacy" else registry.path(version) / MODEL_FILE
+    return version, load_version(version, model_path, None, "")
+
+
+def embed_images(loaded, paths, batch_size=64, workers=None):
+    """
+    Yield (row indices, pooled embeddings, probabilities) for batches of image
+    paths, decoded on the evaluate_model process pool. Unreadable images are
+    reported and skipped.
+    """
+    from evaluate_model import decoded_batches
+    if workers is None:
+        workers = os.cpu_count() or 1
+    for offset, images, ok, errors in decoded_batches(paths, batch_size, workers, 2 * max(1, workers)):
+        for i, message in errors:
+            print(f"Could not read {paths[offset + i]}: {message}")
+        if len(ok):
+            probs, embeddings = loaded.predict(images.astype(np.float32) / 255.0)
+            yield offset + np.asarray(ok), np.asarray(embeddings, dtype=np.float32), np.asarray(probs)
+
+
+def _write_replace(path, write):
+    """Write a file via a temp name and rename it into place"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+def cmd_build(args):
+    from evaluate_model import collect_images
+
+    version, loaded = load_model_version(args.version)
+    if loaded.dual is None:
+        print("Model has no GlobalAveragePooling2D layer to take embeddings from")
+        return 1
+
+    data_dir = Path(args.data).resolve()
+    # Similar cases are served by /dataset from DATA_DIR, so paths are stored relative to it
+    try:
+        data_dir.relative_to(DATA_DIR.resolve())
+    except ValueError:
+        print(f"--data must be inside {DATA_DIR} (served at /dataset/), got {data_dir}")
+        return 1
+    items = collect_images([data_dir])
+    paths = [path for path, _ in items]
+    directory = index_dir(version)
+    os.makedirs(directory, exist_ok=True)
+    dim = int(loaded.dual.outputs[0].shape[-1])
+    raw = np.lib.format.open_memmap(directory / "raw.npy.tmp", mode="w+", dtype=np.float16,
+                                    shape=(len(paths), dim))
+    keep = np.zeros(len(paths), dtype=bool)
+
+    print(f"Embedding {len(paths)} images with model {version}")
+    start = time.perf_counter()
+    for rows, embeddings, _ in embed_images(loaded, paths, args.batch_size, args.workers):
+        raw[rows] = normalize(embeddings)
+        keep[rows] = True
+    print(f"Embedded in {time.perf_counter() - start:.1f}s")
+
+    rows = np.flatnonzero(keep)
+    vectors = raw if keep.all() else raw[rows]
+    kept_items = [(Path(paths[i]).resolve().relative_to(DATA_DIR.resolve()).as_posix(), items[i][1])
+                  for i in rows]
+    start = time.perf_counter()
+    index = EmbeddingIndex.build(vectors, kept_items, directory, nlist=args.nlist,
+                                 meta={"model_version": version, "data_dir": str(data_dir)})
+    del raw, vectors
+    os.remove(directory / "raw.npy.tmp")
+    print(f"Index with {len(index)} entries, {index.meta['nlist']} lists built in "
+          f"{time.perf_counter() - start:.1f}s -> {directory}")
+    return 0
+
+
+# ---- BENCHMARK ----
+def cmd_bench(args):
+    """Latency and recall@k against exact search on clustered synthetic embeddings"""
+    import tempfile
+    rng = np.random.default_rng(args.seed)
+    centers = normalize(rng.standard_normal((args.clusters, args.dim)))
+    members = rng.integers(0, args.clusters, args.entries)
+    vectors = normalize(centers[members] + args.spread * rng.standard_normal((args.entries, args.dim)).astype(np.float32))
+    items = [(f"img_{i}.jpg", f"class_{members[i] % 11}") for i in range(args.entries)]
+
+    queries = normalize(centers[rng.integers(0, args.clusters, args.queries)]
+                        + args.spread * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+    # Ground truth from exact search over the in-memory float32 vectors
+    exact = [set(np.argsort(-(vectors @ q))[:args.k]) for q in queries]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        index = EmbeddingIndex.build(vectors, items, tmp, nlist=args.nlist)
+        print(f"Built {len(index)} x {args.dim} index ({index.meta['nlist']} lists) in "
+              f"{time.perf_counter() - start:.1f}s; vectors file "
+              f"{os.path.getsize(Path(tmp) / 'vectors.npy') / 1e6:.0f} MB")
+        del vectors
+        for nprobe in sorted({max(1, index.nprobe // 2), index.nprobe, index.nprobe * 2}):
+            latencies, hits = [], 0
+            for q, truth in zip(queries, exact):
+                t0 = time.perf_counter()
+                found = index.search(q, args.k, nprobe=nprobe)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                hits += len(truth & {int(path[4:-4]) for path, _, _ in found})
+            latencies.sort()
+            print(f"nprobe {nprobe:>3}: p50 {latencies[len(latencies) // 2]:.2f} ms  "
+                  f"p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms  "
+                  f"recall@{args.k} {hits / (args.k * len(queries)):.3f}")
+        del index
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="embed a dataset with the served model and build its index")
+    build.add_argument("--data", default=DATA_DIR)
+    build.add_argument("--version", help="model version (default: registry CURRENT, else legacy)")
+    build.add_argument("--batch-size", type=int, default=64)
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--nlist", type=int, help="number of IVF lists (default 2*sqrt(N))")
+    build.set_defaults(func=cmd_build)
+
+    bench = sub.add_parser("bench", help="measure search latency and recall on synthetic data")
+    bench.add_argument("--entries", type=int, default=100000)
+    bench.add_argument("--dim", type=int, default=1280)
+    bench.add_argument("--clusters", type=int, default=200)
+    bench.add_argument("--spread", type=float, default=0.03)
+    bench.add_argument("--nlist", type=int)
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--k", type=int, default=5)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
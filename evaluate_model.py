@@ -0,0 +1,259 @@
+"""
+Model Evaluation
+Batch-evaluate the disease classifier on a folder tree or a list of images.
+
+Images are decoded and resized on a process pool while the main process runs
+batched inference, so the model is never waiting on JPEG decoding. Labels come
+from saved_models/class_indices.json; when images sit in class-named folders
+(like data/tomato/<class>/*.jpg) the folder is taken as the true label and a
+confusion matrix, per-class precision/recall and accuracy are reported.
+
+Usage:
+    python evaluate_model.py data/tomato --csv predictions.csv --report report.json
+    python evaluate_model.py leaf1.jpg leaf2.jpg
+    python evaluate_model.py --file-list images.txt --workers 4 --batch-size 64
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from PIL import Image, ImageFile
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_PATH = BASE_DIR / "saved_models" / "tomato_disease_model.h5"
+CLASS_IND_PATH = BASE_DIR / "saved_models" / "class_indices.json"
+IMG_SIZE = 224
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+# ---- INPUTS ----
+def load_labels(path=CLASS_IND_PATH):
+    """Class names ordered by model output index"""
+    with open(path, "r", encoding="utf-8") as fh:
+        class_indices = json.load(fh)
+    labels = [None] * len(class_indices)
+    for name, idx in class_indices.items():
+        labels[idx] = name
+    return labels
+
+
+def collect_images(inputs, file_list=None):
+    """(path, folder name) for every image under the given files/directories"""
+    paths = []
+    for item in inputs:
+        item = Path(item)
+        if item.is_dir():
+            paths.extend(p for p in sorted(item.rglob("*")) if p.suffix.lower() in IMAGE_EXTENSIONS)
+        elif item.is_file():
+            paths.append(item)
+        else:
+            print(f"Warning: {item} not found")
+    if file_list:
+        with open(file_list, "r", encoding="utf-8") as fh:
+            paths.extend(Path(line.strip()) for line in fh if line.strip())
+    return [(str(p), p.parent.name) for p in paths]
+
+
+def decode_batch(paths):
+    """
+    Worker: load, RGB-convert and resize images the same way as
+    keras.preprocessing.image.load_img (nearest neighbour) in app.py.
+    Returns (uint8 array of the decoded images, indices that decoded, errors).
+    """
+    images, ok, errors = [], [], []
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                img = img.resize((IMG_SIZE, IMG_SIZE), Image.NEAREST)
+                images.append(np.asarray(img, dtype=np.uint8))
+            ok.append(i)
+        except Exception as e:
+            errors.append((i, str(e)))
+    batch = np.stack(images) if images else np.zeros((0, IMG_SIZE, IMG_SIZE, 3), np.uint8)
+    return batch, ok, errors
+
+
+def decoded_batches(paths, batch_size, workers, prefetch):
+    """Yield (offset, images, ok, errors) per batch; decoding runs ahead by `prefetch` batches"""
+    chunks = [(i, paths[i:i + batch_size]) for i in range(0, len(paths), batch_size)]
+    if workers <= 0:
+        for offset, chunk in chunks:
+            yield (offset,) + decode_batch(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        position = 0
+        while position < len(chunks) or pending:
+            # Bounded window so decoded images never pile up in memory
+            while position < len(chunks) and len(pending) < prefetch:
+                offset, chunk = chunks[position]
+                pending[pool.submit(decode_batch, chunk)] = offset
+                position += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset = pending.pop(future)
+                yield (offset,) + future.result()
+
+
+# ---- METRICS ----
+def confusion_matrix(true_idx, pred_idx, num_classes):
+    matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(matrix, (true_idx, pred_idx), 1)
+    return matrix
+
+
+def per_class_scores(matrix, labels):
+    tp = np.diag(matrix).astype(float)
+    predicted = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+    return [
+        {"label": label, "precision": round(float(p), 4), "recall": round(float(r), 4),
+         "f1": round(float(f), 4), "support": int(s)}
+        for label, p, r, f, s in zip(labels, precision, recall, f1, support)
+    ]
+
+
+def print_report(matrix, scores, labels):
+    width = max(len(l) for l in labels)
+    print("\nPer-class results:")
+    print(f"{'class':<{width}}  precision  recall     f1  support")
+    for row in scores:
+        if row["support"] or matrix[:, labels.index(row["label"])].sum():
+            print(f"{row['label']:<{width}}  {row['precision']:>9.3f}  {row['recall']:>6.3f}  "
+                  f"{row['f1']:>5.3f}  {row['support']:>7}")
+
+    print("\nConfusion matrix (rows = true, columns = predicted):")
+    print(" " * (width + 2) + " ".join(f"{i:>5}" for i in range(len(labels))))
+    for i, label in enumerate(labels):
+        print(f"{label:<{width}}  " + " ".join(f"{v:>5}" for v in matrix[i]))
+    print("Columns: " + ", ".join(f"{i}={l}" for i, l in enumerate(labels)))
+
+
+# ---- MAIN ----
+def evaluate(args):
+    labels = load_labels(args.class_indices)
+    label_index = {name: i for i, name in enumerate(labels)}
+    items = collect_images(args.inputs, args.file_list)
+    if args.limit:
+        items = items[:args.limit]
+    if not items:
+        print("No images found")
+        return 1
+    paths = [path for path, _ in items]
+
+    import tensorflow as tf
+    start = time.perf_counter()
+    model = tf.keras.models.load_model(str(args.model))
+    load_seconds = time.perf_counter() - start
+    if model.output_shape[-1] != len(labels):
+        print(f"Warning: model has {model.output_shape[-1]} outputs but "
+              f"{args.class_indices} lists {len(labels)} classes")
+
+    print(f"Evaluating {len(paths)} images (batch {args.batch_size}, {args.workers} decode workers)")
+    results = [None] * len(paths)
+    failures = []
+    infer_seconds = 0.0
+    start = time.perf_counter()
+    for offset, images, ok, errors in decoded_batches(paths, args.batch_size, args.workers, args.prefetch):
+        for i, message in errors:
+            failures.append((paths[offset + i], message))
+        if not len(ok):
+            continue
+        x = images.astype(np.float32) / 255.0
+        t0 = time.perf_counter()
+        probs = np.asarray(model.predict_on_batch(x))
+        infer_seconds += time.perf_counter() - t0
+        top = probs.argmax(axis=1)
+        for row, i in enumerate(ok):
+            results[offset + i] = (int(top[row]), float(probs[row, top[row]]))
+    wall_seconds = time.perf_counter() - start
+
+    evaluated = [(path, folder, result) for (path, folder), result in zip(items, results) if result]
+    print(f"Decoded and classified {len(evaluated)} images in {wall_seconds:.2f}s "
+          f"({len(evaluated) / wall_seconds:.1f} images/s; model time {infer_seconds:.2f}s, "
+          f"model load {load_seconds:.2f}s)")
+    for path, message in failures:
+        print(f"Could not read {path}: {message}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["path", "true_label", "predicted_label", "confidence", "correct"])
+            for path, folder, (idx, conf) in evaluated:
+                true_label = folder if folder in label_index else ""
+                correct = "" if not true_label else int(true_label == labels[idx])
+                writer.writerow([path, true_label, labels[idx], f"{conf:.4f}", correct])
+        print(f"Predictions written to {args.csv}")
+
+    if len(evaluated) <= 5 and not args.csv:
+        for path, _, (idx, conf) in evaluated:
+            print(f"{path}: {labels[idx]} ({conf:.2%})")
+
+    report = {
+        "images": len(evaluated),
+        "failed": len(failures),
+        "batch_size": args.batch_size,
+        "workers": args.workers,
+        "wall_seconds": round(wall_seconds, 3),
+        "model_seconds": round(infer_seconds, 3),
+        "images_per_second": round(len(evaluated) / wall_seconds, 2),
+    }
+
+    labelled = [(label_index[folder], idx) for _, folder, (idx, _) in evaluated if folder in label_index]
+    if labelled:
+        true_idx, pred_idx = map(np.array, zip(*labelled))
+        matrix = confusion_matrix(true_idx, pred_idx, len(labels))
+        scores = per_class_scores(matrix, labels)
+        accuracy = float((true_idx == pred_idx).mean())
+        print_report(matrix, scores, labels)
+        print(f"\nAccuracy: {accuracy:.4f} on {len(labelled)} labelled images")
+        report.update(accuracy=round(accuracy, 4), labels=labels,
+                      confusion_matrix=matrix.tolist(), per_class=scores)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Report written to {args.report}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="image files or directories (class-named subfolders give true labels)")
+    parser.add_argument("--file-list", help="text file with one image path per line")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--class-indices", default=CLASS_IND_PATH)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="decode processes (0 = decode in the main process)")
+    parser.add_argument("--prefetch", type=int, default=None, help="batches decoded ahead (default 2 x workers)")
+    parser.add_argument("--limit", type=int, help="evaluate only the first N images")
+    parser.add_argument("--csv", help="write per-image predictions here")
+    parser.add_argument("--report", help="write metrics (confusion matrix, per-class scores, throughput) as JSON")
+    args = parser.parse_args()
+    if not args.inputs and not args.file_list:
+        parser.error("give image files, directories or --file-list")
+    if args.prefetch is None:
+        args.prefetch = max(2, 2 * args.workers)
+    return evaluate(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
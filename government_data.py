@@ -8,6 +8,15 @@ import json
 import random
 from datetime import datetime, timedelta
 
+from price_store import get_price_store
+from metrics import REGISTRY, timed
+
+
+GOV_DATA_FETCHES = REGISTRY.counter(
+    "tomato_gov_data_fetch_total",
+    "Government data lookups by outcome (cache_hit, ok, unavailable = fallback used, error)",
+    ("result",))
+
 
 # Cache for government data (to avoid repeated API calls)
 _cache = {
@@ -26,17 +35,20 @@ def get_government_data():
     # Check cache first
     if _cache['data'] and _cache['timestamp']:
         if datetime.now() - _cache['timestamp'] < timedelta(seconds=_cache['ttl']):
+            GOV_DATA_FETCHES.inc(result='cache_hit')
             return _cache['data']
     
     # Try to fetch from government sources
     gov_data = fetch_from_government_apis()
     
     if gov_data:
+        GOV_DATA_FETCHES.inc(result='ok')
         _cache['data'] = gov_data
         _cache['timestamp'] = datetime.now()
         return gov_data
     
     # Fallback to realistic defaults based on government schemes
+    GOV_DATA_FETCHES.inc(result='unavailable')
     return get_fallback_data()
 
 
@@ -78,6 +90,7 @@ def fetch_from_government_apis():
         return None  # Will trigger fallback
         
     except Exception as e:
+        GOV_DATA_FETCHES.inc(result='error')
         print(f"Government API fetch failed: {e}")
         return None
 
@@ -205,6 +218,19 @@ def get_fallback_data():
     }
 
 
+def get_season_price_ranges(season):
+    """
+    Per-grade (low, high) Rs/kg ranges for the season from the local mandi
+    price store. Returns an empty dict when no history has been ingested.
+    """
+    try:
+        with timed('profit', 'price_store'):
+            return get_price_store().price_ranges(season)
+    except Exception as e:
+        print(f"Mandi price store lookup failed: {e}")
+        return {}
+
+
 def calculate_with_government_data(farm_data):
     """
     Calculate profit analysis using government data
@@ -216,7 +242,8 @@ def calculate_with_government_data(farm_data):
         dict with complete analysis
     """
     
-    gov_data = get_government_data()
+    with timed('profit', 'gov_data'):
+        gov_data = get_government_data()
     
     crop_type = farm_data['crop_type']
     season = farm_data['season']
@@ -265,9 +292,15 @@ def calculate_with_government_data(farm_data):
     grade_b_kg = total_yield_kg * (grade_b_percent / 100)
     grade_c_kg = total_yield_kg * (grade_c_percent / 100)
     
-    # Market prices from government data
+    # Market prices from government data, overridden per grade by the
+    # historical mandi price distribution for this season when available
     price_category = 'organic' if organic == 'Yes' else 'traditional'
-    prices = gov_data['market_prices'][price_category]
+    prices = dict(gov_data['market_prices'][price_category])
+    season_prices = get_season_price_ranges(season)
+    if season_prices:
+        premium = gov_data['input_costs']['organic']['premium'] if organic == 'Yes' else 1.0
+        for grade, (low, high) in season_prices.items():
+            prices[grade] = (low * premium, high * premium)
     
     market_price_a = random.uniform(*prices['grade_a'])
     market_price_b = random.uniform(*prices['grade_b'])
@@ -382,6 +415,6 @@ def calculate_with_government_data(farm_data):
         'profit_margin': round(profit_margin, 1),
         'roi': round(roi, 1),
         'recommendation': recommendation,
-        'data_source': gov_data['source'],
+        'data_source': gov_data['source'] + (' + Mandi price history' if season_prices else ''),
         'last_updated': gov_data['last_updated']
     }
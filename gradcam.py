@@ -0,0 +1,169 @@
+"""
+Grad-CAM Explanations
+Heatmap of the leaf regions that drove a prediction, overlaid on the upload.
+
+The classifier is MobileNetV2 -> GlobalAveragePooling2D -> Dropout -> Dense, so
+the gradient of a class logit with respect to the last convolutional feature map
+(out_relu, 7x7x1280) is the same at every position: the Dense kernel column
+divided by 7*7. Grad-CAM's channel weights are therefore exactly that kernel
+column. The heatmap is computed from the feature map returned by the prediction's
+own forward pass, with no backward pass and no second model call:
+    cam = relu(feature_map @ W[:, class])
+
+Overlays are rendered at display resolution and cached by model version and
+image hash under static/gradcam/, so repeat views cost nothing.
+
+Usage:
+    python gradcam.py bench [--runs 20]     # added latency vs a plain prediction
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+BASE_DIR = Path(__file__).resolve().parent
+GRADCAM_DIR = BASE_DIR / "static" / "gradcam"
+GRADCAM_ENABLED = os.environ.get("GRADCAM", "1") != "0"
+GRADCAM_MAX_FILES = int(os.environ.get("GRADCAM_MAX_FILES", 500))
+DISPLAY_MAX_SIDE = 640
+OVERLAY_ALPHA = 0.45
+
+
+def feature_model(model):
+    """Model returning (pooled embedding, probabilities, last conv feature map) in one forward pass"""
+    import tensorflow as tf
+    pool = next((layer for layer in model.layers
+                 if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D)), None)
+    if pool is None:
+        return None
+    return tf.keras.Model(inputs=model.inputs, outputs=[pool.output, model.output, pool.input])
+
+
+def class_activation(feature_map, weights, class_idx):
+    """(h, w) heatmap in [0, 1] for one image's feature map and a class"""
+    cam = np.maximum(feature_map @ weights[:, class_idx], 0.0)
+    peak = cam.max()
+    return cam / peak if peak > 0 else cam
+
+
+def colormap(values):
+    """Blue -> green -> yellow -> red for values in [0, 1]; returns uint8 RGB"""
+    v = np.clip(values, 0.0, 1.0)[..., None]
+    r = np.clip(1.5 - np.abs(4 * v - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * v - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * v - 1), 0, 1)
+    return (np.concatenate([r, g, b], axis=-1) * 255).astype(np.uint8)
+
+
+def render_overlay(image_path, cam, out_path, max_side=DISPLAY_MAX_SIDE, alpha=OVERLAY_ALPHA):
+    """Upsample the heatmap to the displayed image size and blend it over the photo"""
+    with Image.open(image_path) as img:
+        img.draft("RGB", (max_side, max_side))
+        photo = img.convert("RGB")
+    photo.thumbnail((max_side, max_side))
+    # Colour the 7x7 map and let PIL upsample/blend at display size. The model saw
+    # the image squashed to 224x224, so the heatmap stretches back the same way.
+    color = Image.fromarray(colormap(cam)).resize(photo.size, Image.BILINEAR)
+    mask = Image.fromarray((cam * alpha * 255).astype(np.uint8)).resize(photo.size, Image.BILINEAR)
+    # Unique temp name: concurrent renders of the same image must not share one
+    with tempfile.NamedTemporaryFile(dir=out_path.parent, suffix=".tmp", delete=False) as tmp:
+        Image.composite(color, photo, mask).save(tmp, "JPEG", quality=85)
+    try:
+        os.replace(tmp.name, out_path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+
+
+class GradCamCache:
+    """Rendered overlays keyed by model version and image hash"""
+
+    def __init__(self, directory=GRADCAM_DIR, max_files=GRADCAM_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def path(self, version, image_hash):
+        return self.directory / f"{version}_{image_hash[:32]}.jpg"
+
+    def lookup(self, version, image_hash):
+        """Static URL of a cached overlay, or None"""
+        path = self.path(version, image_hash)
+        hit = path.exists()
+        with self._lock:
+            self.stats["hits" if hit else "misses"] += 1
+        return f"gradcam/{path.name}" if hit else None
+
+    def render(self, version, image_hash, image_path, cam):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(version, image_hash)
+        render_overlay(image_path, cam, path)
+        self._trim()
+        return f"gradcam/{path.name}"
+
+    def _trim(self):
+        files = sorted(self.directory.glob("*.jpg"), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def cmd_bench(args):
+    from embedding_index import load_model_version
+
+    version, loaded = load_model_version(args.version)
+    if loaded.explainer is None:
+        print(f"Model {version} has no GlobalAveragePooling2D layer; Grad-CAM is unavailable")
+        return 1
+    x = np.random.default_rng(0).random((1, 224, 224, 3), dtype=np.float32)
+    loaded.predict(x)
+    loaded.predict_explained(x)
+
+    def median_ms(fn):
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        return sorted(times)[len(times) // 2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        photo = Path(tmp) / "photo.jpg"
+        Image.fromarray((x[0] * 255).astype(np.uint8)).resize((1024, 768)).save(photo)
+        cache = GradCamCache(tmp)
+        _, _, cam = loaded.predict_explained(x)
+        plain = median_ms(lambda: loaded.predict(x))
+        explained = median_ms(lambda: loaded.predict_explained(x))
+        render = median_ms(lambda: cache.render(version, "0" * 64, photo, cam))
+    print(f"Model {version}, median of {args.runs} runs")
+    print(f"  prediction                    {plain:8.1f} ms")
+    print(f"  prediction + heatmap          {explained:8.1f} ms  (+{explained - plain:.1f} ms)")
+    print(f"  overlay render ({DISPLAY_MAX_SIDE}px)        {render:8.1f} ms")
+    print(f"  added per request             {explained - plain + render:8.1f} ms  (cached views: 0 ms)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="latency added by explanations")
+    bench.add_argument("--version")
+    bench.add_argument("--runs", type=int, default=20)
+    bench.set_defaults(func=cmd_bench)
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Keyword Matcher
+Aho-Corasick automaton for finding every occurrence of many keywords in one pass.
+
+Used by the voice assistant so that agriculture keywords, Q&A keys and topic
+words are all matched with a single scan of the question, independent of how
+many keywords there are.
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    Multi-pattern substring matcher.
+
+    Each pattern carries a payload (any value). find_all() returns
+    (start, end, pattern, payload) for every occurrence, including overlapping
+    and nested ones, matching the semantics of `pattern in text`. Patterns added
+    with whole_word=True only match where they are not part of a longer word
+    ("ph" in "soil ph" but not in "phone").
+    """
+
+    def __init__(self, lowercase=True):
+        self.lowercase = lowercase
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._patterns = []
+        self._built = True
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def add(self, pattern, payload=None, whole_word=False):
+        if self.lowercase:
+            pattern = pattern.lower()
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(len(self._patterns))
+        self._patterns.append((pattern, payload, whole_word))
+        self._built = False
+
+    def build(self):
+        """Compute failure links (BFS) and merge outputs along them"""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def find_all(self, text):
+        if not self._built:
+            self.build()
+        if self.lowercase:
+            text = text.lower()
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self._patterns
+        matches = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pid in out[node]:
+                pattern, payload, whole_word = patterns[pid]
+                start = i - len(pattern) + 1
+                if whole_word and ((start > 0 and text[start - 1].isalnum())
+                                   or (i + 1 < len(text) and text[i + 1].isalnum())):
+                    continue
+                matches.append((start, i + 1, pattern, payload))
+        return matches
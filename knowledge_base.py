@@ -0,0 +1,236 @@
+"""
+Voice Assistant Knowledge Base
+Q&A entries loaded from CSV/JSON files with fuzzy BM25 retrieval.
+
+Entries live in data/knowledge_base/ as CSV (key, aliases, answer) or JSON
+(list of {"key", "aliases", "answer"} objects, or a {key: answer} dict).
+Keys and aliases are indexed as character n-grams of a folded form of the
+text, so speech-recognition variants (long vs short vowel signs, dropped
+virama, extra spaces) still share most n-grams with the stored key.
+The files are re-read automatically when they change on disk.
+"""
+
+import os
+import csv
+import json
+import math
+import time
+import unicodedata
+from pathlib import Path
+from threading import Lock
+
+
+BASE_DIR = Path(__file__).resolve().parent
+KNOWLEDGE_BASE_DIR = BASE_DIR / "data" / "knowledge_base"
+
+NGRAM_SIZES = (2, 3)
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_KEY_COVERAGE = 0.6     # share of an entry's key n-grams that must appear in the question
+MAX_DF_RATIO = 0.25        # skip query n-grams present in more than this share of entries
+RELOAD_CHECK_INTERVAL = 5  # seconds between on-disk change checks
+
+# Folding for common Kannada ASR confusions: long/short vowels and vowel signs
+KANNADA_FOLD = str.maketrans({
+    'ಆ': 'ಅ', 'ಈ': 'ಇ', 'ಊ': 'ಉ', 'ೠ': 'ಋ', 'ಏ': 'ಎ', 'ಐ': 'ಎ', 'ಓ': 'ಒ', 'ಔ': 'ಒ',
+    'ೀ': 'ಿ', 'ೂ': 'ು', 'ೄ': 'ೃ', 'ೇ': 'ೆ', 'ೈ': 'ೆ', 'ೋ': 'ೊ', 'ೌ': 'ೊ',
+    'ಃ': None, '‌': None, '‍': None,
+})
+VIRAMA = '್'
+
+
+def fold_text(text):
+    """Normalise text for matching: NFC, lowercase, Kannada vowel folding, no punctuation"""
+    text = unicodedata.normalize('NFC', text).lower().translate(KANNADA_FOLD)
+    out = []
+    for ch in text:
+        if ch.isalnum() or unicodedata.category(ch) in ('Mn', 'Mc'):
+            out.append(ch)
+        else:
+            out.append(' ')
+    return ' '.join(''.join(out).split())
+
+
+def aksharas(word):
+    """
+    Split a word into orthographic syllables so n-grams never separate a
+    consonant from its vowel sign. A dropped or inserted virama between two
+    consonants is a frequent ASR error, so viramas are removed from the units.
+    """
+    units = []
+    for ch in word:
+        if units and unicodedata.category(ch) in ('Mn', 'Mc'):
+            if ch != VIRAMA:
+                units[-1] += ch
+        else:
+            units.append(ch)
+    return units
+
+
+def tokenize(text):
+    """Character n-grams (over aksharas) of each folded word, with word boundary markers"""
+    grams = []
+    for word in fold_text(text).split():
+        units = ['^'] + aksharas(word) + ['$']
+        for n in NGRAM_SIZES:
+            for i in range(len(units) - n + 1):
+                grams.append(''.join(units[i:i + n]))
+    return grams
+
+
+def load_entries(directory=KNOWLEDGE_BASE_DIR):
+    """Read every .csv and .json file in the directory, in name order"""
+    entries = []
+    directory = Path(directory)
+    if not directory.exists():
+        return entries
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() == '.csv':
+            with open(path, 'r', encoding='utf-8-sig', newline='') as fh:
+                for row in csv.DictReader(fh):
+                    entries.append(_make_entry(row.get('key'), row.get('aliases'), row.get('answer')))
+        elif path.suffix.lower() == '.json':
+            with open(path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            if isinstance(data, dict):
+                data = [{'key': k, 'answer': v} for k, v in data.items()]
+            for item in data:
+                entries.append(_make_entry(item.get('key'), item.get('aliases'), item.get('answer')))
+    return [e for e in entries if e is not None]
+
+
+def _make_entry(key, aliases, answer):
+    key = (key or '').strip()
+    answer = (answer or '').strip()
+    if not key or not answer:
+        return None
+    if isinstance(aliases, str):
+        aliases = aliases.split('|')
+    aliases = [a.strip() for a in (aliases or []) if a and a.strip()]
+    return {'key': key, 'aliases': aliases, 'answer': answer}
+
+
+class KnowledgeIndex:
+    """Immutable inverted index over entry keys and aliases"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.postings = {}
+        self.doc_len = []
+        self.key_grams = []
+        for doc_id, entry in enumerate(entries):
+            counts = {}
+            for text in [entry['key']] + entry['aliases']:
+                for gram in tokenize(text):
+                    counts[gram] = counts.get(gram, 0) + 1
+            for gram, tf in counts.items():
+                self.postings.setdefault(gram, []).append((doc_id, tf))
+            self.doc_len.append(sum(counts.values()))
+            # Each surface form (key or alias) is scored for coverage separately
+            self.key_grams.append([set(tokenize(text)) for text in [entry['key']] + entry['aliases']])
+
+        n = len(entries)
+        # 1.0 when no entry yields an n-gram (e.g. all punctuation), so doc_norm never divides by 0
+        self.avg_len = ((sum(self.doc_len) / n) if n else 0.0) or 1.0
+        self.idf = {
+            gram: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for gram, plist in self.postings.items()
+        }
+        self.max_df = max(1, int(n * MAX_DF_RATIO))
+        self.doc_norm = [
+            BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_len) for length in self.doc_len
+        ]
+
+    def search(self, question, k=5):
+        """Top-k (entry, bm25_score, key_coverage) for the question"""
+        query = set(tokenize(question))
+        scores = {}
+        for gram in query:
+            plist = self.postings.get(gram)
+            if not plist or (len(plist) > self.max_df and len(self.entries) > 20):
+                continue
+            weight = self.idf[gram] * (BM25_K1 + 1)
+            doc_norm = self.doc_norm
+            for doc_id, tf in plist:
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf / (tf + doc_norm[doc_id])
+
+        top = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        results = []
+        for doc_id, score in top:
+            coverage = max(
+                (len(grams & query) / len(grams) for grams in self.key_grams[doc_id] if grams),
+                default=0.0,
+            )
+            results.append((self.entries[doc_id], score, coverage))
+        return results
+
+
+class KnowledgeBase:
+    """Hot-reloadable knowledge base backed by a directory of CSV/JSON files"""
+
+    def __init__(self, directory=KNOWLEDGE_BASE_DIR):
+        self.directory = Path(directory)
+        self.index = KnowledgeIndex([])
+        self.version = 0
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = Lock()
+        self.reload()
+
+    def _files_signature(self):
+        if not self.directory.exists():
+            return ()
+        return tuple(
+            (p.name, p.stat().st_mtime_ns, p.stat().st_size)
+            for p in sorted(self.directory.iterdir())
+            if p.suffix.lower() in ('.csv', '.json')
+        )
+
+    def reload(self):
+        """Rebuild the index from disk; the old index keeps serving until the swap"""
+        with self._lock:
+            signature = self._files_signature()
+            try:
+                index = KnowledgeIndex(load_entries(self.directory))
+            except Exception as e:
+                print(f"Knowledge base reload failed, keeping previous version: {e}")
+                return False
+            self.index = index
+            self._signature = signature
+            self.version += 1
+            return True
+
+    def maybe_reload(self):
+        """Reload if the files changed; checks disk at most every RELOAD_CHECK_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return False
+        self._last_check = now
+        if self._files_signature() == self._signature:
+            return False
+        return self.reload()
+
+    def qa_dict(self):
+        """Ordered {key: answer} view, as used by the keyword matcher"""
+        return {entry['key']: entry['answer'] for entry in self.index.entries}
+
+    def alias_map(self):
+        """{alias: key} for every alias"""
+        return {alias: entry['key'] for entry in self.index.entries for alias in entry['aliases']}
+
+    def best_answer(self, question, min_coverage=MIN_KEY_COVERAGE):
+        """Best fuzzy match for the question, or None if no key is covered well enough"""
+        for entry, score, coverage in self.index.search(question, k=5):
+            if coverage >= min_coverage:
+                return entry
+        return None
+
+
+_knowledge_base = None
+
+
+def get_knowledge_base():
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = KnowledgeBase(os.environ.get('KNOWLEDGE_BASE_DIR', KNOWLEDGE_BASE_DIR))
+    return _knowledge_base
@@ -0,0 +1,243 @@
+"""
+Metrics
+Minimal in-process metrics registry rendered in Prometheus text format.
+
+Counters and histograms are updated on the hot path with a dict lookup and a
+lock-protected add, so recording costs about a microsecond; everything else
+(process stats, cache statistics kept by other modules) is read from
+callbacks only when /metrics is scraped. Set METRICS_ENABLED=0 to turn all
+recording into no-ops.
+"""
+
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Seconds; spans sub-millisecond lookups up to multi-second model calls / TTS
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_START_TIME = time.time()
+INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., count, sum]
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block"""
+        if not METRICS_ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose samples come from a function evaluated at scrape time"""
+
+    def __init__(self, name, documentation, kind, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self):
+        try:
+            samples = self.callback()
+        except Exception as e:
+            print(f"Metric callback {self.name} failed: {e}")
+            return []
+        if not isinstance(samples, (list, tuple)):
+            samples = [({}, samples)]
+        lines = self.header()
+        for labels, value in samples:
+            if value is None:
+                continue
+            key = self._key(labels)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, callback, labelnames=()):
+        return self._register(CallbackMetric(name, documentation, "gauge", callback, labelnames))
+
+    def counter_callback(self, name, documentation, callback, labelnames=()):
+        return self._register(CallbackMetric(name, documentation, "counter", callback, labelnames))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Shared hot-path metrics used across app.py, government_data.py and voice_assistant_kn.py
+STAGE_SECONDS = REGISTRY.histogram(
+    "tomato_stage_seconds", "Time spent in each processing stage", ("route", "stage"))
+REQUESTS = REGISTRY.counter(
+    "tomato_http_requests_total", "HTTP requests handled", ("route", "status"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "tomato_http_request_seconds", "End-to-end request handling time", ("route",))
+
+
+def timed(route, stage):
+    """Context manager recording one stage of a route into tomato_stage_seconds"""
+    return STAGE_SECONDS.time(route=route, stage=stage)
+
+
+# ---- PROCESS STATS ----
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:
+            return None
+
+
+def _open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system
+
+
+REGISTRY.counter_callback("process_cpu_seconds_total", "User and system CPU time", _cpu_seconds)
+REGISTRY.gauge_callback("process_resident_memory_bytes", "Resident memory size", _rss_bytes)
+REGISTRY.gauge_callback("process_open_fds", "Open file descriptors", _open_fds)
+REGISTRY.gauge_callback("process_start_time_seconds", "Process start time (unix)", lambda: _START_TIME)
+REGISTRY.gauge_callback("process_threads", "Live Python threads", threading.active_count)
@@ -0,0 +1,511 @@
+"""
+Model Registry
+Versioned model artifacts plus hot-swapping of the model served by app.py.
+
+Layout:
+    saved_models/registry/
+        v1/  model.h5, class_indices.json, training_history.json, metrics.json, manifest.json
+        v2/  ...
+        CURRENT   version served to users (e.g. "v2"); latest version if missing
+        SHADOW    optional candidate scored on a sample of live traffic
+
+Versions are published by training/train_tomato_model.py (or the CLI below) by
+writing into a temporary directory and renaming it, so the watcher never sees a
+half-written version. ModelServer polls CURRENT/SHADOW, loads and warms a new
+version on a background thread, then swaps it in; requests already running keep
+the version they started with until they finish.
+
+Usage:
+    python model_registry.py list
+    python model_registry.py import-legacy          # publish saved_models/*.h5 as a version
+    python model_registry.py publish MODEL.h5 --class-indices class_indices.json [--promote]
+    python model_registry.py promote v3
+    python model_registry.py shadow v4 | off
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+BASE_DIR = Path(__file__).resolve().parent
+SAVED_MODELS_DIR = BASE_DIR / "saved_models"
+REGISTRY_DIR = Path(os.environ.get("MODEL_REGISTRY_DIR", SAVED_MODELS_DIR / "registry"))
+LEGACY_MODEL_PATH = SAVED_MODELS_DIR / "tomato_disease_model.h5"
+LEGACY_CLASS_IND_PATH = SAVED_MODELS_DIR / "class_indices.json"
+DATA_DIR = BASE_DIR / "data" / "tomato"
+
+MODEL_FILE = "model.h5"
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 10))  # seconds, 0 = no watcher
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", 0.1))
+SHADOW_MAX_PENDING = 4
+SIMILAR_K = int(os.environ.get("SIMILAR_K", 6))
+INDEX_CHECK_INTERVAL = 30  # seconds between checks for a (re)built embedding index
+IMG_SIZE = 224
+
+
+# ---- REGISTRY (files) ----
+class ModelRegistry:
+    """Versioned model directories with CURRENT/SHADOW pointer files"""
+
+    def __init__(self, directory=REGISTRY_DIR):
+        self.directory = Path(directory)
+
+    def versions(self):
+        """Published version names, oldest first"""
+        if not self.directory.exists():
+            return []
+        found = [p.name for p in self.directory.iterdir()
+                 if p.is_dir() and p.name[:1] == "v" and p.name[1:].isdigit()]
+        return sorted(found, key=lambda name: int(name[1:]))
+
+    def path(self, version):
+        return self.directory / version
+
+    def _read_pointer(self, name):
+        try:
+            value = (self.directory / name).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        return value if value in self.versions() else None
+
+    def _write_pointer(self, name, version):
+        os.makedirs(self.directory, exist_ok=True)
+        pointer = self.directory / name
+        if version is None:
+            if pointer.exists():
+                pointer.unlink()
+            return
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version: {version}")
+        tmp = pointer.with_name(name + ".tmp")
+        tmp.write_text(version + "\n", encoding="utf-8")
+        os.replace(tmp, pointer)
+
+    def current(self):
+        versions = self.versions()
+        return self._read_pointer("CURRENT") or (versions[-1] if versions else None)
+
+    def shadow(self):
+        shadow = self._read_pointer("SHADOW")
+        return shadow if shadow != self.current() else None
+
+    def promote(self, version):
+        self._write_pointer("CURRENT", version)
+        if self._read_pointer("SHADOW") == version:
+            self._write_pointer("SHADOW", None)
+
+    def set_shadow(self, version):
+        self._write_pointer("SHADOW", version)
+
+    def signature(self):
+        """Changes whenever a pointer file is rewritten or a version is added"""
+        parts = []
+        for name in ("CURRENT", "SHADOW"):
+            try:
+                parts.append((self.directory / name).stat().st_mtime_ns)
+            except OSError:
+                parts.append(None)
+        return tuple(parts) + tuple(self.versions())
+
+    def publish(self, model_path, artifacts=None, metrics=None, promote=False, source=None):
+        """
+        Copy a trained model and its artifacts into the next v<N> directory.
+        artifacts: {filename: path} for class_indices.json / training_history.json.
+        The first version published is promoted automatically.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.versions()
+        version = f"v{int(existing[-1][1:]) + 1 if existing else 1}"
+        tmp_dir = self.directory / f".{version}.tmp"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        shutil.copy2(model_path, tmp_dir / MODEL_FILE)
+        for name, path in (artifacts or {}).items():
+            if path and Path(path).exists():
+                shutil.copy2(path, tmp_dir / name)
+        if metrics is not None:
+            with open(tmp_dir / "metrics.json", "w", encoding="utf-8") as fh:
+                json.dump(metrics, fh, indent=2)
+        with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as fh:
+            json.dump({
+                "version": version,
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "source": str(source or model_path),
+            }, fh, indent=2)
+
+        os.rename(tmp_dir, self.directory / version)
+        if promote or not existing:
+            self.promote(version)
+        return version
+
+    def describe(self, version):
+        info = {"version": version}
+        for name in ("manifest.json", "metrics.json"):
+            try:
+                with open(self.path(version) / name, "r", encoding="utf-8") as fh:
+                    info.update(json.load(fh))
+            except (OSError, ValueError):
+                pass
+        return info
+
+
+def load_labels(class_indices_path, source):
+    """(labels by index, mapping source) from class_indices.json, else the data folder"""
+    if class_indices_path and Path(class_indices_path).exists():
+        with open(class_indices_path, "r", encoding="utf-8") as fh:
+            class_indices = json.load(fh)
+        labels = [None] * len(class_indices)
+        for name, idx in class_indices.items():
+            labels[idx] = name
+        return labels, source
+    # Fallback: infer classes from data folder (alphabetical, same order as Keras flow_from_directory)
+    if DATA_DIR.exists():
+        return [d.name for d in sorted(DATA_DIR.iterdir()) if d.is_dir()], "data/tomato (inferred, alphabetical)"
+    return None, "none"
+
+
+# ---- SERVING ----
+def embedding_model(model):
+    """Model returning (pooled embedding, class probabilities) in one forward pass"""
+    import tensorflow as tf
+    pool = next((layer for layer in model.layers
+                 if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D)), None)
+    if pool is None:
+        return None
+    return tf.keras.Model(inputs=model.inputs, outputs=[pool.output, model.output])
+
+
+class LoadedModel:
+    """A loaded, warmed model version with an in-flight request count"""
+
+    def __init__(self, version, model, labels, mapping_source, dual=None, ood=None, explainer=None,
+                 head_weights=None):
+        self.version = version
+        self.model = model
+        self.dual = dual
+        self.ood = ood
+        self.explainer = explainer
+        self.head_weights = head_weights    # Dense kernel: Grad-CAM channel weights per class
+        self.labels = labels
+        self.mapping_source = mapping_source
+        self.inflight = 0
+        self.retired = False
+        self._index = None
+        self._index_signature = None
+        self._index_checked = float("-inf")
+
+    def label(self, idx):
+        if self.labels and idx < len(self.labels):
+            return self.labels[idx]
+        return str(idx)
+
+    def predict(self, x):
+        """(class probabilities, pooled embeddings or None) for a batch"""
+        if self.dual is not None:
+            embeddings, probs = self.dual.predict(x, verbose=0)
+            return probs, embeddings
+        return self.model.predict(x, verbose=0), None
+
+    def predict_explained(self, x):
+        """(probabilities, pooled embeddings, Grad-CAM heatmap of the top class) for one image"""
+        if self.explainer is None:
+            probs, embeddings = self.predict(x)
+            return probs, embeddings, None
+        from gradcam import class_activation
+        embeddings, probs, feature_maps = self.explainer.predict(x, verbose=0)
+        return probs, embeddings, class_activation(feature_maps[0], self.head_weights, int(np.argmax(probs[0])))
+
+    def similar(self, embedding, k=SIMILAR_K):
+        """Most similar dataset images [(relative path, label, similarity)]"""
+        index = self._embedding_index()
+        if index is None or embedding is None:
+            return []
+        return index.search(embedding, k)
+
+    def ood_check(self, embedding):
+        """Out-of-distribution scores and decision, or None without statistics for this version"""
+        if self.ood is None or embedding is None:
+            return None
+        return self.ood.check(embedding)
+
+    def _embedding_index(self):
+        # The index is built offline (embedding_index.py build) and may appear or be
+        # rebuilt while this version is serving, so check for it periodically
+        now = time.monotonic()
+        if now - self._index_checked < INDEX_CHECK_INTERVAL:
+            return self._index
+        self._index_checked = now
+        from embedding_index import index_dir, load_index
+        try:
+            signature = (index_dir(self.version) / "meta.json").stat().st_mtime_ns
+        except OSError:
+            signature = None
+        if signature != self._index_signature:
+            self._index = load_index(self.version) if signature else None
+            self._index_signature = signature
+        return self._index
+
+
+def load_version(version, model_path, class_indices_path, source):
+    import tensorflow as tf
+    start = time.perf_counter()
+    model = tf.keras.models.load_model(str(model_path))
+    labels, mapping_source = load_labels(class_indices_path, source)
+    dual = embedding_model(model)
+    from gradcam import GRADCAM_ENABLED, feature_model
+    explainer = feature_model(model) if GRADCAM_ENABLED and dual is not None else None
+    # Warm-up: the first predict builds the graph, keep that off the request path
+    warmup = np.zeros((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    (dual or model).predict(warmup, verbose=0)
+    head_weights = None
+    if explainer is not None:
+        from ood import final_dense
+        try:
+            head_weights = final_dense(model)[0]
+            explainer.predict(warmup, verbose=0)
+        except ValueError as e:
+            print(f"Grad-CAM disabled for model {version}: {e}")
+            explainer = None
+    print(f"Model {version} loaded and warmed in {time.perf_counter() - start:.1f}s")
+    from ood import load_detector
+    loaded = LoadedModel(version, model, labels, mapping_source, dual,
+                         ood=load_detector(version, model) if dual is not None else None,
+                         explainer=explainer, head_weights=head_weights)
+    loaded._embedding_index()  # load the similar-case index (if built) now rather than on first request
+    return loaded
+
+
+class ModelServer:
+    """Serves the registry's CURRENT version, hot-swapping when it changes"""
+
+    def __init__(self, registry=None, watch_interval=MODEL_WATCH_INTERVAL,
+                 shadow_sample_rate=SHADOW_SAMPLE_RATE):
+        self.registry = registry or ModelRegistry()
+        self.watch_interval = watch_interval
+        self.shadow_sample_rate = shadow_sample_rate
+        self.current = None
+        self.shadow = None
+        self.error = None
+        self.shadow_stats = {"scored": 0, "agree": 0, "skipped": 0, "top_prob_delta": 0.0}
+        self._lock = threading.Lock()
+        self._signature = None
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_pending = 0
+        self._stop = threading.Event()
+        self._watcher = None
+
+    # -- loading --
+    def _load(self, version):
+        if version is None:
+            return None
+        path = self.registry.path(version)
+        return load_version(version, path / MODEL_FILE, path / "class_indices.json",
+                            f"saved_models/registry/{version}/class_indices.json")
+
+    def load_initial(self):
+        """Blocking load at startup: registry CURRENT, else the legacy saved_models/*.h5"""
+        try:
+            self.refresh()
+            if self.current is None:
+                if not LEGACY_MODEL_PATH.exists():
+                    raise FileNotFoundError(f"Model not found at: {LEGACY_MODEL_PATH}")
+                self.current = load_version("legacy", LEGACY_MODEL_PATH, LEGACY_CLASS_IND_PATH,
+                                            "saved_models/class_indices.json")
+            self.error = None
+        except Exception as e:
+            # Keep model None and surface error on pages
+            self.error = f"error: {e}"
+            print(f"Model load failed: {e}")
+
+    def refresh(self):
+        """Load and swap in CURRENT/SHADOW if the registry pointers changed"""
+        signature = self.registry.signature()
+        if signature == self._signature:
+            return False
+        wanted_current, wanted_shadow = self.registry.current(), self.registry.shadow()
+
+        if wanted_current and (self.current is None or self.current.version != wanted_current):
+            # Reuse the shadow model when it is the one being promoted
+            if self.shadow is not None and self.shadow.version == wanted_current:
+                candidate = self.shadow
+            else:
+                candidate = self._load(wanted_current)
+            self._swap("current", candidate)
+
+        if (self.shadow.version if self.shadow else None) != wanted_shadow:
+            self._swap("shadow", self._load(wanted_shadow))
+            with self._lock:
+                self.shadow_stats = {"scored": 0, "agree": 0, "skipped": 0, "top_prob_delta": 0.0}
+
+        self._signature = signature
+        return True
+
+    def _swap(self, slot, loaded):
+        with self._lock:
+            old = getattr(self, slot)
+            setattr(self, slot, loaded)
+            if old is not None and old is not self.current and old is not self.shadow:
+                old.retired = True
+                self._release_if_drained(old)
+        if loaded is not None:
+            print(f"Serving {slot} model {loaded.version}")
+
+    def _release_if_drained(self, loaded):
+        # Caller holds the lock. Dropping the last reference lets TF free the weights.
+        if loaded.retired and loaded.inflight == 0:
+            print(f"Model {loaded.version} drained")
+            loaded.model = loaded.dual = loaded.explainer = loaded._index = None
+
+    @contextmanager
+    def acquire(self):
+        """The current model for the duration of one request (None if none is loaded)"""
+        with self._lock:
+            loaded = self.current
+            if loaded is not None:
+                loaded.inflight += 1
+        try:
+            yield loaded
+        finally:
+            if loaded is not None:
+                with self._lock:
+                    loaded.inflight -= 1
+                    self._release_if_drained(loaded)
+
+    # -- watcher --
+    def start_watcher(self):
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the loaded version; retry on the next change
+                print(f"Model reload failed: {e}")
+                self._signature = self.registry.signature()
+
+    def stop(self):
+        self._stop.set()
+        self._shadow_pool.shutdown(wait=False)
+
+    # -- shadow traffic --
+    def score_shadow(self, x, primary_label, primary_prob):
+        """Score a sampled request with the shadow model in the background"""
+        shadow = self.shadow
+        if shadow is None or random.random() >= self.shadow_sample_rate:
+            return
+        with self._lock:
+            if self._shadow_pending >= SHADOW_MAX_PENDING:
+                self.shadow_stats["skipped"] += 1
+                return
+            self._shadow_pending += 1
+            shadow.inflight += 1
+        self._shadow_pool.submit(self._run_shadow, shadow, x, primary_label, primary_prob)
+
+    def _run_shadow(self, shadow, x, primary_label, primary_prob):
+        try:
+            preds = shadow.model.predict(x, verbose=0)[0]
+            idx = int(np.argmax(preds))
+            label, prob = shadow.label(idx), float(preds[idx])
+            with self._lock:
+                self.shadow_stats["scored"] += 1
+                self.shadow_stats["agree"] += int(label == primary_label)
+                self.shadow_stats["top_prob_delta"] += prob - primary_prob
+            if label != primary_label:
+                print(f"Shadow {shadow.version} disagrees: {label} ({prob:.2f}) vs {primary_label} ({primary_prob:.2f})")
+        except Exception as e:
+            print(f"Shadow scoring failed: {e}")
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+                shadow.inflight -= 1
+                self._release_if_drained(shadow)
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.shadow_stats)
+        scored = stats["scored"]
+        return {
+            "current": self.current.version if self.current else None,
+            "ood_detection": bool(self.current and self.current.ood),
+            "shadow": self.shadow.version if self.shadow else None,
+            "error": self.error,
+            "versions": [self.registry.describe(v) for v in self.registry.versions()],
+            "shadow_stats": {
+                "scored": scored,
+                "skipped": stats["skipped"],
+                "agreement": round(stats["agree"] / scored, 4) if scored else None,
+                "mean_top_prob_delta": round(stats["top_prob_delta"] / scored, 4) if scored else None,
+            },
+        }
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list versions")
+    sub.add_parser("import-legacy", help="publish saved_models/tomato_disease_model.h5 as a version")
+    publish = sub.add_parser("publish", help="publish a trained model")
+    publish.add_argument("model")
+    publish.add_argument("--class-indices", required=True)
+    publish.add_argument("--history")
+    publish.add_argument("--ood-stats", help="ood_stats.npz written by training or `ood.py fit`")
+    publish.add_argument("--promote", action="store_true")
+    promote = sub.add_parser("promote", help="serve a version")
+    promote.add_argument("version")
+    shadow = sub.add_parser("shadow", help="score a version on live traffic, or 'off'")
+    shadow.add_argument("version")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    if args.command == "list":
+        current, shadow_version = registry.current(), registry.shadow()
+        for version in registry.versions():
+            info = registry.describe(version)
+            marker = " (current)" if version == current else " (shadow)" if version == shadow_version else ""
+            acc = info.get("val_accuracy")
+            print(f"{version}{marker}  created {info.get('created', '?')}"
+                  + (f"  val_accuracy {acc:.4f}" if acc is not None else ""))
+    elif args.command == "import-legacy":
+        version = registry.publish(LEGACY_MODEL_PATH, {
+            "class_indices.json": LEGACY_CLASS_IND_PATH,
+            "training_history.json": SAVED_MODELS_DIR / "training_history.json",
+            "ood_stats.npz": SAVED_MODELS_DIR / "ood_stats.npz",
+        })
+        print(f"Published {version}")
+    elif args.command == "publish":
+        version = registry.publish(args.model, {
+            "class_indices.json": args.class_indices,
+            "training_history.json": args.history,
+            "ood_stats.npz": args.ood_stats,
+        }, promote=args.promote)
+        print(f"Published {version}" + (" (current)" if registry.current() == version else ""))
+    elif args.command == "promote":
+        registry.promote(args.version)
+        print(f"{args.version} is now current")
+    elif args.command == "shadow":
+        registry.set_shadow(None if args.version == "off" else args.version)
+        print("Shadow " + ("disabled" if args.version == "off" else f"set to {args.version}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Out-of-Distribution Detection
+Flags uploads that are not tomato leaves using the classifier's own forward pass.
+
+Two scores are computed from the pooled embedding the model already produces:
+    energy       logsumexp of the logits (embedding @ W + b of the final Dense
+                 layer); low for inputs unlike anything seen in training
+    mahalanobis  squared distance to the nearest class mean under the shared
+                 (tied) covariance of the training embeddings; high when off-manifold
+An image is rejected when either score is past its threshold. Thresholds are
+calibrated on held-out in-distribution images so that about `tpr` of real
+leaves are accepted. The covariance is folded into a whitening matrix, so scoring
+is one 1280x1280 matrix-vector product, around a millisecond on CPU.
+
+Statistics are saved as ood_stats.npz next to the model version: the training
+script writes them, and `python ood.py fit` computes them for an existing model.
+
+Usage:
+    python ood.py fit [--version v3] [--data data/tomato]
+    python ood.py evaluate --ood-dir path/to/non_leaf_images [--version v3]
+    python ood.py evaluate --synthetic 300          # generated soil/skin/sky/noise images
+    python ood.py evaluate --id-dir new_field_photos/ --synthetic 300
+
+`evaluate` scores the dataset's evaluation split by default. Those images were
+kept out of the OOD statistics and thresholds, but the classifier itself was
+trained on them (train_tomato_model.py splits by position, not by this hash),
+so their logits and embeddings are more confident than on new photos and the
+reported AUROC, FPR and leaf acceptance are optimistic. Pass --id-dir with leaf
+photos the model never saw for unbiased figures.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data" / "tomato"
+OOD_STATS_FILE = "ood_stats.npz"
+LEGACY_STATS_PATH = BASE_DIR / "saved_models" / OOD_STATS_FILE
+DEFAULT_TPR = 0.95
+SHRINKAGE = 0.01        # covariance regularisation, relative to the mean variance
+CALIBRATION_SHARE = 0.2
+EVALUATION_SHARE = 0.1  # never used for OOD fitting (the classifier did train on it)
+OOD_LABEL = "out_of_distribution"   # label shown for rejected uploads
+
+
+def stats_path(version):
+    from model_registry import ModelRegistry
+    if version and version != "legacy":
+        return ModelRegistry().path(version) / OOD_STATS_FILE
+    return LEGACY_STATS_PATH
+
+
+def final_dense(model):
+    """(W, b) of the classifier's output layer, so logits = embedding @ W + b"""
+    weights = model.layers[-1].get_weights()
+    if len(weights) != 2:
+        raise ValueError("last layer is not a Dense layer with a bias")
+    return np.asarray(weights[0], dtype=np.float32), np.asarray(weights[1], dtype=np.float32)
+
+
+def logsumexp(x, axis=-1):
+    m = x.max(axis=axis, keepdims=True)
+    return (m + np.log(np.exp(x - m).sum(axis=axis, keepdims=True))).squeeze(axis)
+
+
+class OODDetector:
+    """Energy + Mahalanobis scores on pooled embeddings with calibrated thresholds"""
+
+    def __init__(self, class_means, whitening, energy_threshold, mahalanobis_threshold,
+                 weights=None, bias=None, meta=None):
+        self.whitening = whitening        # (D, D): ||(x - mu) @ whitening||^2 = Mahalanobis distance
+        self.class_means = class_means    # (C, D) class means in the whitened space
+        self.energy_threshold = float(energy_threshold)
+        self.mahalanobis_threshold = float(mahalanobis_threshold)
+        self.weights = weights
+        self.bias = bias
+        self.meta = meta or {}
+
+    # ---- FIT ----
+    @classmethod
+    def fit(cls, embeddings, labels, calibration, weights, bias, tpr=DEFAULT_TPR, shrinkage=SHRINKAGE):
+        """
+        embeddings/labels: training-set embeddings and class indices (class statistics)
+        calibration: held-out in-distribution embeddings (threshold calibration)
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        classes = np.unique(labels)
+        means = np.zeros((int(classes.max()) + 1, embeddings.shape[1]))
+        centered = np.empty_like(embeddings)
+        for c in classes:
+            members = labels == c
+            means[c] = embeddings[members].mean(axis=0)
+            centered[members] = embeddings[members] - means[c]
+        covariance = centered.T @ centered / len(embeddings)
+        covariance += shrinkage * np.trace(covariance) / len(covariance) * np.eye(len(covariance))
+        eigvals, eigvecs = np.linalg.eigh(covariance)
+        whitening = (eigvecs / np.sqrt(eigvals)).astype(np.float32)
+
+        # Only classes that had training samples get a mean
+        detector = cls((means[classes] @ whitening).astype(np.float32), whitening, 0.0, 0.0, weights, bias)
+        energy, distance = detector.scores(calibration)
+        # Split the allowed rejection rate between the two tests
+        tail = (1.0 - tpr) / 2
+        detector.energy_threshold = float(np.quantile(energy, tail))
+        detector.mahalanobis_threshold = float(np.quantile(distance, 1.0 - tail))
+        detector.meta = {"tpr": tpr, "fit_images": int(len(embeddings)),
+                         "calibration_images": int(len(calibration)), "classes": int(len(classes))}
+        return detector
+
+    def save(self, path):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, class_means=self.class_means, whitening=self.whitening,
+                 thresholds=np.array([self.energy_threshold, self.mahalanobis_threshold]),
+                 meta=np.array(json.dumps(self.meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, weights=None, bias=None):
+        with np.load(path) as data:
+            return cls(data["class_means"], data["whitening"], *data["thresholds"],
+                       weights=weights, bias=bias, meta=json.loads(str(data["meta"])))
+
+    # ---- SCORING ----
+    def scores(self, embeddings):
+        """(energy score, Mahalanobis distance) per embedding row"""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        energy = logsumexp(embeddings @ self.weights + self.bias)
+        z = embeddings @ self.whitening
+        # ||z - m||^2 = ||z||^2 - 2 z.m + ||m||^2, minimised over classes
+        distance = ((z * z).sum(axis=1, keepdims=True) - 2 * z @ self.class_means.T
+                    + (self.class_means * self.class_means).sum(axis=1)).min(axis=1)
+        return energy, distance
+
+    def check(self, embedding):
+        """Scores and the accept/reject decision for one image"""
+        energy, distance = self.scores(embedding)
+        energy, distance = float(energy[0]), float(distance[0])
+        reasons = []
+        if energy < self.energy_threshold:
+            reasons.append("energy")
+        if distance > self.mahalanobis_threshold:
+            reasons.append("mahalanobis")
+        return {"is_ood": bool(reasons), "reasons": reasons, "energy": energy, "mahalanobis": distance}
+
+
+def load_detector(version, model):
+    """Detector for a model version, or None if no statistics were saved for it"""
+    path = stats_path(version)
+    if not path.exists():
+        return None
+    try:
+        weights, bias = final_dense(model)
+        return OODDetector.load(path, weights, bias)
+    except Exception as e:
+        print(f"Could not load OOD statistics from {path}: {e}")
+        return None
+
+
+def _bucket(path):
+    return zlib.crc32(os.path.basename(path).encode("utf-8")) % 100
+
+
+def is_calibration(path):
+    """Deterministic ~20% split by file name, used to set the thresholds"""
+    return _bucket(path) < CALIBRATION_SHARE * 100
+
+
+def is_evaluation(path):
+    """Deterministic ~10% split by file name, held out from statistics and thresholds"""
+    return CALIBRATION_SHARE * 100 <= _bucket(path) < (CALIBRATION_SHARE + EVALUATION_SHARE) * 100
+
+
+# ---- OFFLINE ----
+def embed_all(loaded, paths, batch_size, workers):
+    from embedding_index import embed_images
+    embeddings = np.zeros((len(paths), loaded.dual.outputs[0].shape[-1]), dtype=np.float32)
+    keep = np.zeros(len(paths), dtype=bool)
+    for rows, batch, _ in embed_images(loaded, paths, batch_size, workers):
+        embeddings[rows] = batch
+        keep[rows] = True
+    return embeddings, keep
+
+
+def cmd_fit(args):
+    from evaluate_model import collect_images
+    from embedding_index import load_model_version
+    from model_registry import load_labels
+
+    version, loaded = load_model_version(args.version)
+    labels, _ = load_labels(args.class_indices or (stats_path(version).parent / "class_indices.json"), "")
+    label_index = {name: i for i, name in enumerate(labels)}
+    items = [(path, folder) for path, folder in collect_images([args.data]) if folder in label_index]
+    paths = [path for path, _ in items]
+    print(f"Embedding {len(paths)} images with model {version}")
+    embeddings, keep = embed_all(loaded, paths, args.batch_size, args.workers)
+
+    y = np.array([label_index[folder] for _, folder in items])
+    calib = np.array([is_calibration(path) for path in paths])
+    train = keep & ~calib & ~np.array([is_evaluation(path) for path in paths])
+    weights, bias = final_dense(loaded.model)
+    detector = OODDetector.fit(embeddings[train], y[train], embeddings[keep & calib],
+                               weights, bias, tpr=args.tpr)
+    detector.meta["model_version"] = version
+    detector.save(stats_path(version))
+    print(f"Saved {stats_path(version)}: energy threshold {detector.energy_threshold:.3f}, "
+          f"Mahalanobis threshold {detector.mahalanobis_threshold:.1f}")
+    return 0
+
+
+def synthetic_ood_images(directory, count, seed=0):
+    """Non-leaf test images: soil, skin tones, sky, noise, plain walls, stripes"""
+    from PIL import Image, ImageDraw, ImageFilter
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        kind = i % 6
+        size = (int(rng.integers(300, 900)), int(rng.integers(300, 900)))
+        if kind == 0:    # soil
+            base = np.array([110, 80, 55]) + rng.integers(-20, 20, 3)
+            arr = np.clip(base + rng.normal(0, 25, (size[1], size[0], 3)), 0, 255)
+            img = Image.fromarray(arr.astype(np.uint8)).filter(ImageFilter.GaussianBlur(1.5))
+        elif kind == 1:  # hand / skin
+            img = Image.new("RGB", size, tuple(int(v) for v in rng.integers(180, 240, 3)))
+            ImageDraw.Draw(img).ellipse([size[0] * 0.2, size[1] * 0.1, size[0] * 0.8, size[1] * 0.9],
+                                        fill=(int(rng.integers(190, 235)), int(rng.integers(140, 180)),
+                                              int(rng.integers(110, 150))))
+        elif kind == 2:  # sky gradient
+            top, bottom = rng.integers(120, 200, 3), rng.integers(200, 255, 3)
+            t = np.linspace(0, 1, size[1])[:, None, None]
+            arr = np.broadcast_to(top * (1 - t) + bottom * t, (size[1], size[0], 3))
+            img = Image.fromarray(arr.astype(np.uint8))
+        elif kind == 3:  # noise
+            img = Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+        elif kind == 4:  # plain wall / paper
+            img = Image.new("RGB", size, tuple(int(v) for v in rng.integers(0, 256, 3)))
+        else:            # stripes / fabric
+            arr = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+            period = int(rng.integers(8, 60))
+            arr[(np.arange(size[1]) // period) % 2 == 0] = rng.integers(0, 256, 3)
+            img = Image.fromarray(arr)
+        path = Path(directory) / f"ood_{i:04d}.jpg"
+        img.save(path, "JPEG", quality=90)
+        paths.append(str(path))
+    return paths
+
+
+def auroc(id_scores, ood_scores):
+    """Probability that a random OOD image scores higher than a random in-distribution one"""
+    scores = np.concatenate([id_scores, ood_scores])
+    ranks = np.empty(len(scores))
+    ranks[np.argsort(scores, kind="mergesort")] = np.arange(1, len(scores) + 1)
+    ood_ranks = ranks[len(id_scores):].sum()
+    n_ood = len(ood_scores)
+    return (ood_ranks - n_ood * (n_ood + 1) / 2) / (n_ood * len(id_scores))
+
+
+def fpr_at_tpr(id_scores, ood_scores, tpr=0.95):
+    """Share of OOD images accepted at the threshold that keeps `tpr` of real leaves"""
+    threshold = np.quantile(id_scores, tpr)
+    return float((ood_scores <= threshold).mean())
+
+
+def cmd_evaluate(args):
+    from evaluate_model import collect_images
+    from embedding_index import load_model_version
+
+    version, loaded = load_model_version(args.version)
+    detector = load_detector(version, loaded.model)
+    if detector is None:
+        print(f"No OOD statistics for model {version}; run `python ood.py fit` first")
+        return 1
+
+    # In-distribution: a separate --id-dir is used whole. In the dataset only the
+    # evaluation split is used: it was kept out of the class statistics and the
+    # thresholds, but not out of the classifier's training
+    training_data = Path(args.id_dir).resolve() == DATA_DIR.resolve()
+    id_paths = [p for p, _ in collect_images([args.id_dir])
+                if not training_data or is_evaluation(p)][:args.limit]
+    tmp = None
+    if args.ood_dir:
+        ood_paths = [p for p, _ in collect_images([args.ood_dir])]
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        ood_paths = synthetic_ood_images(tmp.name, args.synthetic)
+    print(f"Scoring {len(id_paths)} held-out leaf images and {len(ood_paths)} non-leaf images")
+    if training_data:
+        print("Note: the classifier was trained on these leaf images, so the figures below are "
+              "optimistic; pass --id-dir with unseen leaf photos for unbiased ones")
+
+    id_emb, id_keep = embed_all(loaded, id_paths, args.batch_size, args.workers)
+    ood_emb, ood_keep = embed_all(loaded, ood_paths, args.batch_size, args.workers)
+    id_energy, id_dist = detector.scores(id_emb[id_keep])
+    ood_energy, ood_dist = detector.scores(ood_emb[ood_keep])
+
+    # Higher = more OOD for every score below
+    results = {
+        "energy": (-id_energy, -ood_energy),
+        "mahalanobis": (id_dist, ood_dist),
+    }
+    print(f"\n{'score':<14} {'AUROC':>7} {'FPR@95TPR':>10}")
+    for name, (id_s, ood_s) in results.items():
+        print(f"{name:<14} {auroc(id_s, ood_s):>7.3f} {fpr_at_tpr(id_s, ood_s):>10.3f}")
+
+    id_flags = (id_energy < detector.energy_threshold) | (id_dist > detector.mahalanobis_threshold)
+    ood_flags = (ood_energy < detector.energy_threshold) | (ood_dist > detector.mahalanobis_threshold)
+    print(f"\nAt the calibrated thresholds: {1 - id_flags.mean():.1%} of leaves accepted, "
+          f"{ood_flags.mean():.1%} of non-leaf images rejected")
+
+    # Cost of scoring relative to the forward pass it piggybacks on
+    x = np.zeros((1, 224, 224, 3), dtype=np.float32)
+    loaded.predict(x)
+    start = time.perf_counter()
+    for _ in range(10):
+        _, embedding = loaded.predict(x)
+    forward_ms = (time.perf_counter() - start) * 100
+    start = time.perf_counter()
+    for _ in range(200):
+        detector.check(embedding)
+    check_ms = (time.perf_counter() - start) * 5
+    print(f"OOD check {check_ms:.3f} ms per image vs forward pass {forward_ms:.1f} ms "
+          f"({check_ms / forward_ms:.1%} overhead)")
+    if tmp:
+        tmp.cleanup()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fit = sub.add_parser("fit", help="compute class statistics and thresholds for a model version")
+    fit.add_argument("--version")
+    fit.add_argument("--data", default=DATA_DIR)
+    fit.add_argument("--class-indices")
+    fit.add_argument("--tpr", type=float, default=DEFAULT_TPR, help="share of real leaves to accept")
+    fit.set_defaults(func=cmd_fit)
+
+    evaluate = sub.add_parser("evaluate", help="measure detection on non-leaf images")
+    evaluate.add_argument("--version")
+    evaluate.add_argument("--ood-dir", help="folder of non-leaf images")
+    evaluate.add_argument("--synthetic", type=int, default=300, help="generated images when --ood-dir is not given")
+    evaluate.add_argument("--id-dir", default=DATA_DIR,
+                          help="leaf photos to score (default: the evaluation split of the dataset)")
+    evaluate.add_argument("--limit", type=int, default=2000, help="held-out leaf images to score")
+    evaluate.set_defaults(func=cmd_evaluate)
+
+    for p in (fit, evaluate):
+        p.add_argument("--batch-size", type=int, default=64)
+        p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
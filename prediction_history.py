@@ -0,0 +1,285 @@
+"""
+Prediction History
+Append-only log of /predict results with rollups for disease-incidence queries.
+
+Requests hand their result to record(), which only puts it on an in-memory
+queue; a writer thread drains the queue and inserts batches in a single SQLite
+transaction. The same transaction upserts per (day, region, label) counters in
+the daily_counts table, at two levels: per region and across all regions
+(region "*"). Dashboard queries read those rollup rows instead of scanning the
+raw predictions table.
+
+Usage:
+    python prediction_history.py summary [--days 30] [--region Kolar]
+    python prediction_history.py rebuild-rollups
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+
+
+BASE_DIR = Path(__file__).resolve().parent
+HISTORY_DB = Path(os.environ.get("PREDICTION_DB", BASE_DIR / "data" / "history" / "predictions.db"))
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0    # seconds a partial batch may wait before it is written
+QUEUE_SIZE = 20000      # records beyond this are dropped rather than blocking requests
+UNKNOWN_REGION = ""
+ALL_REGIONS = "*"       # rollup rows summed over every region
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    model_version TEXT,
+    label TEXT NOT NULL,
+    confidence REAL,
+    top_k TEXT,
+    image_hash TEXT,
+    region TEXT NOT NULL DEFAULT '',
+    farm_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions (ts);
+CREATE INDEX IF NOT EXISTS idx_predictions_hash ON predictions (image_hash);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    region TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (region, day, label)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO daily_counts (day, region, label, count, confidence_sum) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (region, day, label) DO UPDATE SET
+    count = count + excluded.count,
+    confidence_sum = confidence_sum + excluded.confidence_sum
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+class PredictionHistory:
+    """Batched writer plus rollup-backed queries over the prediction log"""
+
+    def __init__(self, path=HISTORY_DB, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 queue_size=QUEUE_SIZE):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"written": 0, "dropped": 0, "batches": 0, "errors": 0}
+        os.makedirs(self.path.parent, exist_ok=True)
+        with connect(self.path) as conn:
+            conn.executescript(SCHEMA)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._writer.start()
+
+    # ---- WRITES ----
+    def record(self, label, confidence, top_k=None, model_version=None, image_hash=None,
+               region=None, farm_id=None, ts=None):
+        """Queue one prediction; never blocks the caller"""
+        ts = ts or time.time()
+        region = (region or UNKNOWN_REGION).strip()
+        if region == ALL_REGIONS:
+            region = UNKNOWN_REGION
+        row = (ts, day_of(ts), model_version, label, float(confidence),
+               json.dumps(top_k) if top_k is not None else None, image_hash, region, farm_id or None)
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            rows = [row for row in batch if row is not None]
+            if rows:
+                try:
+                    self._write(conn, rows)
+                except sqlite3.Error as e:
+                    self.stats["errors"] += 1
+                    print(f"Prediction history write failed: {e}")
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _write(self, conn, rows):
+        rollup = defaultdict(lambda: [0, 0.0])
+        for row in rows:
+            day, region, label, confidence = row[1], row[7], row[3], row[4]
+            for key in ((day, region, label), (day, ALL_REGIONS, label)):
+                rollup[key][0] += 1
+                rollup[key][1] += confidence
+        with conn:
+            conn.executemany(
+                "INSERT INTO predictions (ts, day, model_version, label, confidence, top_k, image_hash, "
+                "region, farm_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany(UPSERT_ROLLUP, [key + tuple(value) for key, value in rollup.items()])
+        self.stats["written"] += len(rows)
+        self.stats["batches"] += 1
+
+    def flush(self):
+        """Block until everything queued so far is written"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def rebuild_rollups(self):
+        """Recompute daily_counts from the raw table (after manual edits or imports)"""
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM daily_counts")
+            conn.execute(
+                "INSERT INTO daily_counts (day, region, label, count, confidence_sum) "
+                "SELECT day, region, label, COUNT(*), SUM(confidence) FROM predictions "
+                "GROUP BY day, region, label")
+            conn.execute(
+                "INSERT INTO daily_counts (day, region, label, count, confidence_sum) "
+                "SELECT day, ?, label, COUNT(*), SUM(confidence) FROM predictions "
+                "GROUP BY day, label", (ALL_REGIONS,))
+
+    # ---- QUERIES ----
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    @staticmethod
+    def _window(days, end=None):
+        end = end or date.today()
+        return (end - timedelta(days=days - 1)).isoformat(), end.isoformat()
+
+    def daily_counts(self, days=30, region=None, end=None):
+        """{day: {label: count}} for the last `days` days"""
+        start, stop = self._window(days, end)
+        result = defaultdict(dict)
+        for day, label, count in self._conn().execute(
+                "SELECT day, label, count FROM daily_counts WHERE day BETWEEN ? AND ? AND region = ?",
+                (start, stop, ALL_REGIONS if region is None else region)):
+            result[day][label] = count
+        return dict(result)
+
+    def totals(self, days=30, region=None, end=None):
+        """[(label, count, mean confidence)] over the window, most frequent first"""
+        start, stop = self._window(days, end)
+        return self._conn().execute(
+            "SELECT label, SUM(count), SUM(confidence_sum) / SUM(count) FROM daily_counts "
+            "WHERE day BETWEEN ? AND ? AND region = ? GROUP BY label ORDER BY 2 DESC",
+            (start, stop, ALL_REGIONS if region is None else region)).fetchall()
+
+    def by_region(self, days=30, end=None):
+        """{region: {label: count}} over the window"""
+        start, stop = self._window(days, end)
+        result = defaultdict(dict)
+        for region, label, count in self._conn().execute(
+                "SELECT region, label, SUM(count) FROM daily_counts WHERE day BETWEEN ? AND ? "
+                "AND region != ? GROUP BY region, label", (start, stop, ALL_REGIONS)):
+            result[region][label] = count
+        return dict(result)
+
+    def trends(self, days=7, region=None, end=None):
+        """
+        [(label, count in the last `days`, count in the `days` before, change %)],
+        so a disease that is suddenly reported more often stands out.
+        """
+        end = end or date.today()
+        recent = dict((label, count) for label, count, _ in self.totals(days, region, end))
+        previous = dict((label, count) for label, count, _ in
+                        self.totals(days, region, end - timedelta(days=days)))
+        rows = []
+        for label in set(recent) | set(previous):
+            now, before = recent.get(label, 0), previous.get(label, 0)
+            change = (now - before) / before * 100 if before else None
+            rows.append((label, now, before, change))
+        return sorted(rows, key=lambda r: r[1], reverse=True)
+
+    def regions(self):
+        return [r for (r,) in self._conn().execute(
+            "SELECT DISTINCT region FROM daily_counts WHERE region != ? ORDER BY region", (ALL_REGIONS,))]
+
+    def recent(self, limit=20):
+        rows = self._conn().execute(
+            "SELECT ts, model_version, label, confidence, region, farm_id FROM predictions "
+            "ORDER BY ts DESC LIMIT ?", (limit,)).fetchall()
+        return [{"time": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M"), "model_version": version,
+                 "label": label, "confidence": confidence, "region": region, "farm_id": farm_id}
+                for ts, version, label, confidence, region, farm_id in rows]
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_prediction_history():
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = PredictionHistory()
+        return _history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summary", help="disease counts over recent days")
+    summary.add_argument("--days", type=int, default=30)
+    summary.add_argument("--region")
+    sub.add_parser("rebuild-rollups", help="recompute daily_counts from the predictions table")
+    args = parser.parse_args()
+
+    history = PredictionHistory()
+    if args.command == "summary":
+        for label, count, mean_conf in history.totals(args.days, args.region):
+            print(f"{label:<40} {count:>8}  mean confidence {mean_conf:.2f}")
+    elif args.command == "rebuild-rollups":
+        history.rebuild_rollups()
+        print("Rollups rebuilt")
+    history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
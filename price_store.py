@@ -0,0 +1,471 @@
+"""
+Mandi Price Store
+Local columnar time-series store for daily tomato prices per market and grade.
+
+Prices are ingested from Agmarknet-style CSV dumps and kept as one series per
+(market, grade). Each series is a set of parallel columns (date ordinal, min,
+max, modal) sorted by date, so a range lookup is two binary searches and a
+slice. Weekly and monthly rollups are computed when the store is saved.
+
+Usage:
+    python price_store.py ingest dumps/tomato_2019_2024.csv [more.csv ...]
+    python price_store.py query "Kolar" grade_a 2023-01-01 2023-03-31
+    python price_store.py season "Winter (Dec–Feb)"
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import bisect
+import hashlib
+from array import array
+from pathlib import Path
+from datetime import date, datetime
+
+
+BASE_DIR = Path(__file__).resolve().parent
+PRICE_STORE_DIR = BASE_DIR / "data" / "mandi_prices"
+
+# Agmarknet reports prices in Rs. per quintal
+QUINTAL_KG = 100.0
+
+COLUMNS = ("date", "min", "max", "modal")
+ROLLUP_COLUMNS = ("date", "min", "max", "mean", "count")
+
+# Months covered by each season option on the profit analyser form
+SEASON_MONTHS = {
+    'Summer (Mar–Jun)': (3, 4, 5, 6),
+    'Monsoon (Jul–Sep)': (7, 8, 9),
+    'Post Monsoon (Oct–Nov)': (10, 11),
+    'Winter (Dec–Feb)': (12, 1, 2),
+}
+
+# Agmarknet grade/variety labels mapped onto the analyser's three grades
+GRADE_ALIASES = {
+    'a': 'grade_a', 'grade a': 'grade_a', 'grade_a': 'grade_a', 'large': 'grade_a',
+    'super': 'grade_a',
+    'b': 'grade_b', 'grade b': 'grade_b', 'grade_b': 'grade_b', 'faq': 'grade_b',
+    'medium': 'grade_b', 'local': 'grade_b', 'other': 'grade_b', 'deshi': 'grade_b',
+    'c': 'grade_c', 'grade c': 'grade_c', 'grade_c': 'grade_c', 'non-faq': 'grade_c',
+    'small': 'grade_c',
+}
+GRADES = ('grade_a', 'grade_b', 'grade_c')
+
+# Header spellings seen in Agmarknet / data.gov.in exports (normalised, see _norm_header)
+HEADER_ALIASES = {
+    'market': ('market', 'marketname', 'mandi', 'apmc'),
+    'grade': ('grade', 'variety'),
+    'commodity': ('commodity',),
+    'date': ('arrivaldate', 'pricedate', 'reporteddate', 'date'),
+    'min': ('minx0020price', 'minprice', 'minpricersquintal', 'minimumprice'),
+    'max': ('maxx0020price', 'maxprice', 'maxpricersquintal', 'maximumprice'),
+    'modal': ('modalx0020price', 'modalprice', 'modalpricersquintal'),
+}
+
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d-%b-%Y", "%d %b %Y", "%d-%B-%Y")
+
+
+def _norm_header(name):
+    return re.sub(r'[^a-z0-9]', '', name.strip().lower())
+
+
+def _parse_date(value):
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_price(value):
+    try:
+        price = float(value.replace(',', '').strip())
+    except (ValueError, AttributeError):
+        return None
+    return price if price > 0 else None
+
+
+def normalize_grade(value):
+    """Map an Agmarknet grade/variety label onto grade_a/grade_b/grade_c"""
+    return GRADE_ALIASES.get((value or '').strip().lower(), 'grade_b')
+
+
+def normalize_market(value):
+    return ' '.join((value or '').split()).title()
+
+
+def _series_key(market, grade):
+    return f"{market}|{grade}"
+
+
+def _slug(key):
+    # Readable prefix plus a hash of the exact key: "Kolar|grade_a" and
+    # "kolar grade a" would otherwise share files
+    readable = re.sub(r'[^A-Za-z0-9]+', '_', key).strip('_').lower()
+    return f"{readable}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _write_column(path, column):
+    """Write an array column via a temp file so a reader never sees it half-written"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as fh:
+        column.tofile(fh)
+    os.replace(tmp_path, path)
+
+
+def _week_start(ordinal):
+    return ordinal - date.fromordinal(ordinal).weekday()
+
+
+def _month_start(ordinal):
+    return date.fromordinal(ordinal).replace(day=1).toordinal()
+
+
+class PriceSeries:
+    """Date-sorted columns for one (market, grade) pair"""
+
+    def __init__(self):
+        self.date = array('i')
+        self.min = array('f')
+        self.max = array('f')
+        self.modal = array('f')
+        self.weekly = None
+        self.monthly = None
+
+    def __len__(self):
+        return len(self.date)
+
+    def merge(self, rows):
+        """Merge (ordinal, min, max, modal) rows; later rows win on duplicate dates"""
+        if not rows:
+            return
+        merged = dict(zip(self.date, zip(self.min, self.max, self.modal)))
+        for ordinal, lo, hi, modal in rows:
+            merged[ordinal] = (lo, hi, modal)
+        self.date = array('i', sorted(merged))
+        self.min = array('f', (merged[d][0] for d in self.date))
+        self.max = array('f', (merged[d][1] for d in self.date))
+        self.modal = array('f', (merged[d][2] for d in self.date))
+        self.weekly = None
+        self.monthly = None
+
+    def bounds(self, start, end):
+        """Slice indices covering start..end (date ordinals, inclusive)"""
+        return bisect.bisect_left(self.date, start), bisect.bisect_right(self.date, end)
+
+    def range(self, start, end):
+        lo, hi = self.bounds(start, end)
+        return {
+            'date': self.date[lo:hi],
+            'min': self.min[lo:hi],
+            'max': self.max[lo:hi],
+            'modal': self.modal[lo:hi],
+        }
+
+    def build_rollups(self):
+        self.weekly = self._rollup(_week_start)
+        self.monthly = self._rollup(_month_start)
+
+    def _rollup(self, bucket_of):
+        out = {'date': array('i'), 'min': array('f'), 'max': array('f'),
+               'mean': array('f'), 'count': array('i')}
+        current = None
+        lo = hi = total = 0.0
+        count = 0
+        for ordinal, day_min, day_max, modal in zip(self.date, self.min, self.max, self.modal):
+            bucket = bucket_of(ordinal)
+            if bucket != current:
+                if count:
+                    out['date'].append(current)
+                    out['min'].append(lo)
+                    out['max'].append(hi)
+                    out['mean'].append(total / count)
+                    out['count'].append(count)
+                current, lo, hi, total, count = bucket, day_min, day_max, 0.0, 0
+            lo = min(lo, day_min)
+            hi = max(hi, day_max)
+            total += modal
+            count += 1
+        if count:
+            out['date'].append(current)
+            out['min'].append(lo)
+            out['max'].append(hi)
+            out['mean'].append(total / count)
+            out['count'].append(count)
+        return out
+
+    def save(self, directory, slug):
+        for name in COLUMNS:
+            _write_column(directory / f"{slug}.{name}.bin", getattr(self, name))
+        if self.weekly is None:
+            self.build_rollups()
+        for period in ('weekly', 'monthly'):
+            rollup = getattr(self, period)
+            for name in ROLLUP_COLUMNS:
+                _write_column(directory / f"{slug}.{period}.{name}.bin", rollup[name])
+
+    @classmethod
+    def load(cls, directory, slug, count, rollup_counts):
+        series = cls()
+        for name in COLUMNS:
+            column = getattr(series, name)
+            with open(directory / f"{slug}.{name}.bin", "rb") as fh:
+                column.fromfile(fh, count)
+        for period in ('weekly', 'monthly'):
+            rollup = {'date': array('i'), 'min': array('f'), 'max': array('f'),
+                      'mean': array('f'), 'count': array('i')}
+            for name in ROLLUP_COLUMNS:
+                with open(directory / f"{slug}.{period}.{name}.bin", "rb") as fh:
+                    rollup[name].fromfile(fh, rollup_counts[period])
+            setattr(series, period, rollup)
+        return series
+
+
+class PriceStore:
+    """Collection of PriceSeries indexed by (market, grade), persisted to a directory"""
+
+    def __init__(self, directory=PRICE_STORE_DIR):
+        self.directory = Path(directory)
+        self.series = {}
+        self._index_mtime = None
+        self._range_cache = {}
+
+    # ---- persistence ----
+    @property
+    def index_path(self):
+        return self.directory / "index.json"
+
+    def load(self):
+        """(Re)load the store from disk if the index changed since the last load"""
+        if not self.index_path.exists():
+            return self
+        mtime = self.index_path.stat().st_mtime
+        if mtime == self._index_mtime:
+            return self
+        with open(self.index_path, "r", encoding="utf-8") as fh:
+            index = json.load(fh)
+        self.series = {}
+        for key, meta in index['series'].items():
+            self.series[key] = PriceSeries.load(
+                self.directory, meta['slug'], meta['count'], meta['rollups'])
+        self._index_mtime = mtime
+        self._range_cache = {}
+        return self
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index = {'series': {}, 'updated': datetime.now().isoformat(timespec='seconds')}
+        for key, series in self.series.items():
+            slug = _slug(key)
+            series.save(self.directory, slug)
+            index['series'][key] = {
+                'slug': slug,
+                'count': len(series),
+                'start': date.fromordinal(series.date[0]).isoformat() if len(series) else None,
+                'end': date.fromordinal(series.date[-1]).isoformat() if len(series) else None,
+                'rollups': {'weekly': len(series.weekly['date']),
+                            'monthly': len(series.monthly['date'])},
+            }
+        tmp_path = self.index_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(index, fh, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = self.index_path.stat().st_mtime
+        self._range_cache = {}
+
+    # ---- ingest ----
+    def ingest_csv(self, path, commodity='tomato'):
+        """
+        Stream one Agmarknet-style CSV into the store.
+        Rows are read one at a time and buffered per series as compact arrays,
+        so multi-year, multi-market dumps never need to fit in memory as text.
+        Returns the number of rows ingested.
+        """
+        pending = {}
+        ingested = 0
+        with open(path, "r", encoding="utf-8-sig", newline="") as fh:
+            reader = csv.reader(fh)
+            header = next(reader, None)
+            if not header:
+                return 0
+            columns = self._map_header(header)
+            missing = [c for c in ('market', 'date', 'modal') if c not in columns]
+            if missing:
+                raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+
+            for row in reader:
+                if len(row) < len(header):
+                    continue
+                if 'commodity' in columns and commodity and \
+                        commodity not in row[columns['commodity']].lower():
+                    continue
+                day = _parse_date(row[columns['date']])
+                modal = _parse_price(row[columns['modal']])
+                if day is None or modal is None:
+                    continue
+                lo = _parse_price(row[columns['min']]) if 'min' in columns else None
+                hi = _parse_price(row[columns['max']]) if 'max' in columns else None
+                market = normalize_market(row[columns['market']])
+                grade = normalize_grade(row[columns['grade']]) if 'grade' in columns else 'grade_b'
+
+                buf = pending.get((market, grade))
+                if buf is None:
+                    buf = pending[(market, grade)] = (array('i'), array('f'), array('f'), array('f'))
+                buf[0].append(day.toordinal())
+                buf[1].append((lo or modal) / QUINTAL_KG)
+                buf[2].append((hi or modal) / QUINTAL_KG)
+                buf[3].append(modal / QUINTAL_KG)
+                ingested += 1
+
+        for (market, grade), (dates, lows, highs, modals) in pending.items():
+            key = _series_key(market, grade)
+            series = self.series.setdefault(key, PriceSeries())
+            series.merge(list(zip(dates, lows, highs, modals)))
+        return ingested
+
+    @staticmethod
+    def _map_header(header):
+        normalized = [_norm_header(h) for h in header]
+        columns = {}
+        for field, aliases in HEADER_ALIASES.items():
+            # aliases are in priority order, e.g. prefer Grade over Variety
+            for alias in aliases:
+                if alias in normalized:
+                    columns[field] = normalized.index(alias)
+                    break
+        return columns
+
+    # ---- queries ----
+    def markets(self):
+        return sorted({key.split('|', 1)[0] for key in self.series})
+
+    def get_series(self, market, grade):
+        return self.series.get(_series_key(normalize_market(market), grade))
+
+    def query(self, market, grade, start, end):
+        """Daily rows (Rs/kg) for one market and grade between two dates (inclusive)"""
+        series = self.get_series(market, grade)
+        if series is None:
+            return None
+        return series.range(start.toordinal(), end.toordinal())
+
+    def rollup(self, market, grade, period='monthly'):
+        """Weekly or monthly min/max/mean rollup for one market and grade"""
+        series = self.get_series(market, grade)
+        if series is None:
+            return None
+        if series.weekly is None:
+            series.build_rollups()
+        return getattr(series, period)
+
+    def season_prices(self, season, grade, markets=None, years=None):
+        """
+        All daily modal prices (Rs/kg) falling in the given season's months,
+        across the selected markets (default: all) and years (default: all).
+        """
+        months = SEASON_MONTHS.get(season)
+        if not months:
+            return []
+        wanted = None if markets is None else {normalize_market(m) for m in markets}
+        values = []
+        for key, series in self.series.items():
+            market, series_grade = key.split('|', 1)
+            if series_grade != grade or not len(series):
+                continue
+            if wanted is not None and market not in wanted:
+                continue
+            first = date.fromordinal(series.date[0]).year
+            last = date.fromordinal(series.date[-1]).year
+            for year in range(first, last + 1):
+                if years is not None and year not in years:
+                    continue
+                for start, end in _season_windows(year, months):
+                    lo, hi = series.bounds(start, end)
+                    values.extend(series.modal[lo:hi])
+        return values
+
+    def price_ranges(self, season, markets=None, low_pct=10, high_pct=90, min_samples=20):
+        """
+        Per-grade (low, high) price ranges for a season, taken as percentiles of
+        the historical modal price. Grades with too little history are omitted
+        so callers can fall back to their defaults.
+        """
+        cache_key = (season, tuple(markets) if markets else None, low_pct, high_pct, min_samples)
+        if cache_key in self._range_cache:
+            return self._range_cache[cache_key]
+        ranges = {}
+        for grade in GRADES:
+            values = sorted(self.season_prices(season, grade, markets=markets))
+            if len(values) < min_samples:
+                continue
+            ranges[grade] = (round(_percentile(values, low_pct), 2),
+                             round(_percentile(values, high_pct), 2))
+        self._range_cache[cache_key] = ranges
+        return ranges
+
+
+def _season_windows(year, months):
+    """(start, end) ordinal windows for the given months of one calendar year"""
+    windows = []
+    for month in sorted(months):
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        windows.append((start.toordinal(), end.toordinal() - 1))
+    return windows
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    f = int(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+
+_store = None
+
+
+def get_price_store():
+    """Shared store instance, reloaded when the on-disk index changes"""
+    global _store
+    if _store is None:
+        _store = PriceStore()
+    return _store.load()
+
+
+def _main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 1
+    store = PriceStore().load()
+    command = argv[1]
+
+    if command == "ingest":
+        for path in argv[2:]:
+            rows = store.ingest_csv(path)
+            print(f"Ingested {rows} rows from {path}")
+        store.save()
+        print(f"Store now has {len(store.series)} series in {store.directory}")
+    elif command == "query":
+        market, grade, start, end = argv[2:6]
+        rows = store.query(market, grade, date.fromisoformat(start), date.fromisoformat(end))
+        if rows is None:
+            print("No such series")
+            return 1
+        for ordinal, lo, hi, modal in zip(rows['date'], rows['min'], rows['max'], rows['modal']):
+            print(f"{date.fromordinal(ordinal)}  min={lo:.2f}  max={hi:.2f}  modal={modal:.2f}")
+    elif command == "season":
+        print(json.dumps(store.price_ranges(argv[2]), indent=2, ensure_ascii=False))
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv))
@@ -0,0 +1,180 @@
+"""
+Request Profiler
+Opt-in sampling profiler for individual Flask requests.
+
+A profiled request gets a sampler thread that reads the request thread's stack
+from sys._current_frames() every few milliseconds; the samples are written in
+collapsed-stack format ("outer;inner;leaf count" per line), which flamegraph.pl,
+speedscope and inferno read directly. The model call can additionally be traced
+with the TensorFlow profiler (TensorBoard format, op-level timings) next to it.
+
+Requests are picked either at random (sample_rate, changeable at runtime through
+/debug/profiler) or explicitly with an "X-Profile: <PROFILE_TOKEN>" header. When
+the rate is 0 and the header is absent, the per-request cost is one comparison.
+Output goes to PROFILE_DIR and is capped at PROFILE_MAX_FILES profiles.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import threading
+from pathlib import Path
+from collections import Counter
+from contextlib import contextmanager
+
+
+BASE_DIR = Path(__file__).resolve().parent
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", BASE_DIR / "profiles"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))  # seconds between stack samples
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 50))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_HEADER = "X-Profile"
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """Stack of a frame as 'outermost;...;innermost'"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfileSession:
+    """Samples one thread's Python stack until stop()"""
+
+    def __init__(self, profile_id, route, thread_id, interval=PROFILE_INTERVAL):
+        self.profile_id = profile_id
+        self.route = route
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.tf_trace_dir = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{profile_id}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.samples[collapse_stack(frame)] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+class Profiler:
+    """Decides which requests to profile and stores the results"""
+
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE,
+                 max_files=PROFILE_MAX_FILES, token=PROFILE_TOKEN, interval=PROFILE_INTERVAL):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.token = token
+        self.interval = interval
+        self.trace_tf = True
+        self.profiled = 0
+        self._lock = threading.Lock()
+        self._tf_lock = threading.Lock()   # the TF profiler is process-wide: one trace at a time
+        self._counter = 0
+
+    def wanted(self, headers):
+        """Should this request be profiled? Cheap when profiling is off"""
+        if self.sample_rate <= 0 and PROFILE_HEADER not in headers:
+            return False
+        if self.token and headers.get(PROFILE_HEADER) == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def authorized(self, headers):
+        return bool(self.token) and headers.get(PROFILE_HEADER) == self.token
+
+    def start(self, route):
+        with self._lock:
+            self._counter += 1
+            profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._counter}"
+        return ProfileSession(profile_id, route, threading.get_ident(), self.interval)
+
+    @contextmanager
+    def tf_trace(self, session):
+        """TensorFlow profiler trace around the with-block, if this request is profiled"""
+        if session is None or not self.trace_tf or not self._tf_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            import tensorflow as tf
+            logdir = self.directory / f"{session.profile_id}.tf"
+            tf.profiler.experimental.start(str(logdir))
+        except Exception as e:
+            print(f"TensorFlow profiler unavailable: {e}")
+            self._tf_lock.release()
+            yield
+            return
+        try:
+            yield
+        finally:
+            try:
+                tf.profiler.experimental.stop()
+                session.tf_trace_dir = logdir
+            except Exception as e:
+                print(f"TensorFlow profiler stop failed: {e}")
+            self._tf_lock.release()
+
+    def finish(self, session):
+        """Stop sampling, write <id>.folded and trim old profiles; returns the file path"""
+        session.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        route = session.route.strip("/").replace("/", "_").replace("<", "").replace(">", "") or "root"
+        path = self.directory / f"{session.profile_id}_{route}.folded"
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(session.collapsed())
+        with self._lock:
+            self.profiled += 1
+        self._trim()
+        return path
+
+    def _trim(self):
+        profiles = sorted(self.directory.glob("*.folded"), key=lambda p: p.stat().st_mtime)
+        for path in profiles[:max(0, len(profiles) - self.max_files)]:
+            trace_dir = path.with_name(path.name.split("_", 1)[0] + ".tf")
+            try:
+                path.unlink()
+                if trace_dir.exists():
+                    shutil.rmtree(trace_dir, ignore_errors=True)
+            except OSError:
+                pass
+
+    def recent(self, limit=20):
+        if not self.directory.exists():
+            return []
+        profiles = sorted(self.directory.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [p.name for p in profiles[:limit]]
+
+    def status(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "interval": self.interval,
+            "trace_tf": self.trace_tf,
+            "profiled": self.profiled,
+            "directory": str(self.directory),
+            "recent": self.recent(),
+        }
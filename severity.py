@@ -0,0 +1,339 @@
+"""
+Lesion Severity
+Share of the leaf area that is diseased, measured from colour rather than model confidence.
+
+Works on a small copy of the image (WORK_SIZE pixels a side; the app passes the
+224x224 array it already decoded for the model) with NumPy only:
+    1. background: pixels within a Lab distance of the colours on the image
+       border, connected to the border, and not green
+    2. leaf mask: everything else, opened and hole-filled
+    3. lesion mask: leaf pixels that are not healthy green (HSV hue/saturation
+       and Lab a*), i.e. brown, yellow, grey or the white of powdery mildew,
+       opened to drop speckle; very dark pixels are treated as shadow
+    4. affected % = lesion pixels / leaf pixels
+Morphology uses shifted boolean arrays (no SciPy). The stage takes about 7-10 ms
+on the 224x224 model input and 25-30 ms on a full photo (`bench`).
+
+Limitations, from `validate` against hand-labelled dataset photos
+(data/severity_labels.csv, affected area estimated by eye):
+    - it underestimates: mean absolute error is about 11 points overall
+    - only lesions that are clearly not green are separated from healthy
+      tissue. Early blight, late blight and Septoria leaf spot score well above
+      healthy leaves. Mosaic, leaf curl, leaf mold, target spot, spider mites,
+      bacterial spot and powdery mildew score about the same as healthy leaves,
+      so the app reports no affected area for them (MEASURABLE_CLASSES)
+    - a leaf photographed against other foliage or bare soil blends into the
+      background. Field shots of healthy leaves can score 15-30%.
+
+Usage:
+    python severity.py validate                       # error against hand-labelled photos
+    python severity.py classes [--per-class 40]       # mean severity per dataset class
+    python severity.py check [--images 60]            # self-consistency on drawn leaves
+    python severity.py bench
+"""
+
+import sys
+import csv
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data" / "tomato"
+LABELS_FILE = BASE_DIR / "data" / "severity_labels.csv"
+WORK_SIZE = 112
+# Diseases whose lesions the colour segmentation separates from healthy tissue
+MEASURABLE_CLASSES = ("Early_blight", "Late_blight", "Septoria_leaf_spot")
+
+# Thresholds (Lab a* in its usual -128..127 range, HSV saturation/value in 0..1, hue in degrees)
+GREEN_A_MAX = -5.0        # healthy tissue: a* below this ...
+GREEN_S_MIN = 0.08        # ... saturated enough (lower and it is glare or mildew) ...
+HEALTHY_HUE = (65.0, 170.0)   # ... and a green hue
+SHADOW_V_MAX = 0.16       # darker than this is shadow: counted neither as lesion nor as leaf
+BORDER_CLUSTERS = 3       # background colours sampled from the image border
+BACKGROUND_DISTANCE = 14.0    # Lab distance to a border colour that still counts as background
+
+
+# ---- COLOUR SPACES ----
+def green_hue(rgb, hue_range=HEALTHY_HUE, min_saturation=GREEN_S_MIN):
+    """
+    HSV test "hue within hue_range (60-180 degrees) and saturation above min_saturation",
+    written without divisions: in that range green is the largest channel and
+    hue = 60 * ((b - r) / chroma + 2).
+    """
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    chroma = g - np.minimum(r, b)
+    lo, hi = hue_range[0] / 60.0 - 2.0, hue_range[1] / 60.0 - 2.0
+    return ((g >= r) & (g >= b) & (chroma > min_saturation * g)
+            & (b - r >= lo * chroma) & (b - r <= hi * chroma))
+
+
+def rgb_to_lab(rgb):
+    """CIE L*a*b* (D65) for float sRGB in [0, 1]"""
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ np.array([[0.4124, 0.2126, 0.0193],
+                             [0.3576, 0.7152, 0.1192],
+                             [0.1805, 0.0722, 0.9505]], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    L = 116.0 * f[..., 1] - 16.0
+    a = 500.0 * (f[..., 0] - f[..., 1])
+    b = 200.0 * (f[..., 1] - f[..., 2])
+    return L, a, b
+
+
+# ---- MORPHOLOGY (3x3 square structuring element) ----
+def dilate(mask):
+    out = mask.copy()
+    out[1:, :] |= mask[:-1, :]
+    out[:-1, :] |= mask[1:, :]
+    rows = out.copy()
+    out[:, 1:] |= rows[:, :-1]
+    out[:, :-1] |= rows[:, 1:]
+    return out
+
+
+def erode(mask):
+    return ~dilate(~mask)
+
+
+def opening(mask):
+    return dilate(erode(mask))
+
+
+def closing(mask, iterations=1):
+    for _ in range(iterations):
+        mask = dilate(mask)
+    for _ in range(iterations):
+        mask = erode(mask)
+    return mask
+
+
+def fill_holes(mask):
+    """Set every background region not connected to the image border"""
+    background = ~mask
+    outside = np.zeros_like(mask)
+    outside[0, :], outside[-1, :], outside[:, 0], outside[:, -1] = (
+        background[0, :], background[-1, :], background[:, 0], background[:, -1])
+    while True:
+        grown = dilate(outside) & background
+        if np.array_equal(grown, outside):
+            return ~outside
+        outside = grown
+
+
+# ---- SEVERITY ----
+def downscale(image, size=WORK_SIZE):
+    """Float RGB [0, 1] array of at most size x size from a PIL image, uint8 or float array"""
+    if isinstance(image, Image.Image):
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.BILINEAR)
+        return np.asarray(image, dtype=np.float32) / 255.0
+    rgb = np.asarray(image, dtype=np.float32)
+    if rgb.max() > 1.0:
+        rgb = rgb / 255.0
+    factor = max(1, min(rgb.shape[0], rgb.shape[1]) // size)
+    if factor > 1:
+        # Box-filter downscale by an integer factor (2x2 mean for the 224x224 model input)
+        h, w = rgb.shape[0] // factor * factor, rgb.shape[1] // factor * factor
+        rgb = sum(rgb[i:h:factor, j:w:factor] for i in range(factor) for j in range(factor)) / factor ** 2
+    return rgb
+
+
+def border_colours(lab, clusters=BORDER_CLUSTERS, iterations=3):
+    """Lab cluster centres of the pixels on the image border (mostly background in leaf photos)"""
+    ring = np.concatenate([lab[:2].reshape(-1, 3), lab[-2:].reshape(-1, 3),
+                           lab[:, :2].reshape(-1, 3), lab[:, -2:].reshape(-1, 3)])
+    centres = ring[np.linspace(0, len(ring) - 1, clusters).astype(int)]
+    for _ in range(iterations):
+        nearest = ((ring[:, None, :] - centres[None]) ** 2).sum(-1).argmin(axis=1)
+        for k in range(clusters):
+            members = ring[nearest == k]
+            if len(members):
+                centres[k] = members.mean(axis=0)
+    return centres
+
+
+def reconstruct(seed, allowed):
+    """Pixels of `allowed` connected to `seed` (morphological reconstruction by dilation)"""
+    reached = seed & allowed
+    while True:
+        grown = dilate(reached) & allowed
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+
+def segment(rgb):
+    """(leaf mask, lesion mask) for a float RGB image"""
+    val = rgb.max(axis=-1)
+    lab = np.stack(rgb_to_lab(rgb), axis=-1)
+    green = green_hue(rgb) & (lab[..., 1] < GREEN_A_MAX)
+
+    # Background: colours like the image border, connected to the border, never green tissue
+    centres = border_colours(lab)
+    like_border = np.zeros_like(green)
+    for centre in centres:
+        like_border |= ((lab - centre) ** 2).sum(axis=-1) < BACKGROUND_DISTANCE ** 2
+    border = np.zeros_like(green)
+    border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+    background = reconstruct(border, like_border & ~green)
+
+    leaf = fill_holes(opening(~background))
+    # Mixed leaf/background pixels along the outline are neither: drop a 1-pixel rim
+    lesion = opening(erode(leaf) & ~green) & (val >= SHADOW_V_MAX)
+    return leaf & (val >= SHADOW_V_MAX), lesion
+
+
+def measurable(label):
+    """True if the affected area is meaningful for a predicted class"""
+    return any(label.lower().startswith(name.lower()) for name in MEASURABLE_CLASSES)
+
+
+def estimate(image, size=WORK_SIZE):
+    """
+    Affected leaf area for one image (PIL image, uint8 array, or float array in [0, 1]).
+    Returns {"affected_pct", "leaf_pct" (share of the frame that is leaf), "leaf_found"}.
+    """
+    leaf, lesion = segment(downscale(image, size))
+    leaf_pixels = int(leaf.sum())
+    found = leaf_pixels >= 0.02 * leaf.size
+    return {
+        "affected_pct": round(100.0 * lesion.sum() / leaf_pixels, 1) if found else 0.0,
+        "leaf_pct": round(100.0 * leaf_pixels / leaf.size, 1),
+        "leaf_found": bool(found),
+    }
+
+
+# ---- CHECKS ----
+def synthetic_case(rng, size=224):
+    """
+    A drawn leaf with lesions of known area: (uint8 image, true affected %).
+    Drawn with the same colour assumptions the thresholds encode, so it catches
+    regressions in the pipeline but says nothing about accuracy on real photos.
+    """
+    # Backgrounds leaf photos are taken on: bench grey, paper, soil, dark cloth
+    base = [(150, 140, 150), (225, 220, 210), (110, 85, 60), (45, 45, 50)][int(rng.integers(4))]
+    shade = rng.integers(-20, 21)
+    background = tuple(int(np.clip(v + shade + rng.integers(-5, 6), 0, 255)) for v in base)
+    img = Image.new("RGB", (size, size), background)
+    leaf = Image.new("L", (size, size), 0)
+    cx, cy = size / 2 + rng.normal(0, 8), size / 2 + rng.normal(0, 8)
+    rx, ry = rng.uniform(0.25, 0.42) * size, rng.uniform(0.3, 0.45) * size
+    ImageDraw.Draw(leaf).ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=255)
+    green = (int(rng.integers(40, 90)), int(rng.integers(110, 170)), int(rng.integers(30, 70)))
+    img.paste(green, mask=leaf)
+
+    lesions = Image.new("L", (size, size), 0)
+    draw = ImageDraw.Draw(lesions)
+    palette = [(120, 80, 40), (95, 60, 30), (200, 180, 60), (62, 44, 32), (225, 225, 215)]
+    spots = Image.new("RGB", (size, size))
+    spot_draw = ImageDraw.Draw(spots)
+    for _ in range(int(rng.integers(0, 14))):
+        x, y = rng.uniform(cx - rx * 0.8, cx + rx * 0.8), rng.uniform(cy - ry * 0.8, cy + ry * 0.8)
+        r = rng.uniform(3, 0.16 * size)
+        box = [x - r, y - r * rng.uniform(0.6, 1.0), x + r, y + r * rng.uniform(0.6, 1.0)]
+        draw.ellipse(box, fill=255)
+        spot_draw.ellipse(box, fill=palette[int(rng.integers(len(palette)))])
+    lesion_mask = np.asarray(lesions) > 0
+    leaf_mask = np.asarray(leaf) > 0
+    img.paste(spots, mask=Image.fromarray(((lesion_mask & leaf_mask) * 255).astype(np.uint8)))
+
+    arr = np.asarray(img, dtype=np.float32)
+    arr += rng.normal(0, 6, arr.shape)          # sensor noise / texture
+    true_pct = 100.0 * (lesion_mask & leaf_mask).sum() / leaf_mask.sum()
+    return arr.clip(0, 255).astype(np.uint8), true_pct
+
+
+def cmd_check(args):
+    rng = np.random.default_rng(args.seed)
+    errors, truths = [], []
+    for _ in range(args.images):
+        img, true_pct = synthetic_case(rng)
+        estimated = estimate(img)["affected_pct"]
+        errors.append(estimated - true_pct)
+        truths.append(true_pct)
+    errors = np.abs(np.array(errors))
+    print(f"{args.images} drawn leaves, true affected area {min(truths):.0f}-{max(truths):.0f}% "
+          f"(self-consistency only; see `validate` for real photos)")
+    print(f"Mean absolute error {errors.mean():.1f} points, median {np.median(errors):.1f}, "
+          f"within 5 points: {(errors <= 5).mean():.0%}, within 10 points: {(errors <= 10).mean():.0%}")
+    return 0
+
+
+def cmd_validate(args):
+    """Error against photos whose affected area was estimated by eye"""
+    with open(args.labels, newline="", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(fh))
+    by_class = {}
+    for row in rows:
+        with Image.open(DATA_DIR / row["image"]) as img:
+            estimated = estimate(img.convert("RGB").resize((224, 224)))["affected_pct"]
+        by_class.setdefault(row["image"].split("/")[0], []).append((float(row["affected_pct"]), estimated))
+    print(f"{'class':<40} {'n':>3} {'labelled':>9} {'estimated':>10} {'MAE':>6}")
+    errors = {True: [], False: []}
+    for name, pairs in sorted(by_class.items()):
+        truth, estimated = np.array(pairs).T
+        errors[measurable(name)].extend(np.abs(estimated - truth))
+        print(f"{name:<40} {len(pairs):>3} {truth.mean():>8.1f}% {estimated.mean():>9.1f}% "
+              f"{np.abs(estimated - truth).mean():>6.1f}{'' if measurable(name) else '  (not reported)'}")
+    for reported, label in ((True, "reported classes"), (False, "other classes")):
+        if errors[reported]:
+            print(f"MAE {label}: {np.mean(errors[reported]):.1f} points over {len(errors[reported])} images")
+    return 0
+
+
+def cmd_classes(args):
+    """Sanity check on real photos: healthy leaves should score near zero"""
+    for folder in sorted(p for p in DATA_DIR.iterdir() if p.is_dir()):
+        files = sorted(folder.iterdir())[:args.per_class]
+        scores = []
+        for path in files:
+            with Image.open(path) as img:
+                scores.append(estimate(img.convert("RGB").resize((224, 224)))["affected_pct"])
+        print(f"{folder.name:<40} mean {np.mean(scores):5.1f}%  median {np.median(scores):5.1f}%")
+    return 0
+
+
+def cmd_bench(args):
+    rng = np.random.default_rng(0)
+    model_input = synthetic_case(rng)[0].astype(np.float32) / 255.0
+    photo = Image.fromarray(synthetic_case(rng, 224)[0]).resize((1600, 1200))
+    cases = [("224x224 model input (app)", lambda: estimate(model_input)),
+             ("1600x1200 photo (incl. resize)", lambda: estimate(photo.copy()))]
+    for name, fn in cases:
+        fn()
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            fn()
+        print(f"{name:<34} {(time.perf_counter() - start) / args.runs * 1000:6.2f} ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    validate = sub.add_parser("validate", help="error against hand-labelled dataset photos")
+    validate.add_argument("--labels", default=LABELS_FILE)
+    validate.set_defaults(func=cmd_validate)
+    check = sub.add_parser("check", help="self-consistency on drawn leaves with known lesion area")
+    check.add_argument("--images", type=int, default=60)
+    check.add_argument("--seed", type=int, default=7)
+    check.set_defaults(func=cmd_check)
+    classes = sub.add_parser("classes", help="mean severity per class in data/tomato")
+    classes.add_argument("--per-class", type=int, default=40)
+    classes.set_defaults(func=cmd_classes)
+    bench = sub.add_parser("bench", help="latency per image")
+    bench.add_argument("--runs", type=int, default=50)
+    bench.set_defaults(func=cmd_bench)
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,16 @@
   const submitBtn = document.getElementById('submit-btn');
   const spinner = document.getElementById('spinner');
   const form = document.getElementById('upload-form');
+  const originalBytesInput = document.getElementById('original-bytes');
+
+  // Longest side sent to the server; the model only needs 224px
+  const maxSide = parseInt(form.dataset.maxSide, 10) || 1024;
+  const jpegQuality = parseFloat(form.dataset.jpegQuality) || 0.85;
+
+  let previewUrl = null;
 
   function resetPreview() {
+    if (previewUrl) { URL.revokeObjectURL(previewUrl); previewUrl = null; }
     previewImg.style.display = 'none';
     previewImg.src = '';
     previewEmpty.style.display = 'block';
@@ -16,19 +24,89 @@
   fileInput.addEventListener('change', (ev) => {
     const file = ev.target.files && ev.target.files[0];
     if (!file) { resetPreview(); return; }
-    const reader = new FileReader();
-    reader.onload = (e) => {
-      previewImg.src = e.target.result;
-      previewImg.style.display = 'block';
-      previewEmpty.style.display = 'none';
-      submitBtn.disabled = false;
-    };
-    reader.readAsDataURL(file);
+    if (previewUrl) URL.revokeObjectURL(previewUrl);
+    previewUrl = URL.createObjectURL(file);
+    previewImg.src = previewUrl;
+    previewImg.style.display = 'block';
+    previewEmpty.style.display = 'none';
+    submitBtn.disabled = false;
+    originalBytesInput.value = file.size;
   });
 
-  form.addEventListener('submit', () => {
+  // Decode with EXIF orientation applied (createImageBitmap where supported,
+  // otherwise an <img>, which browsers orient by default)
+  function decode(file) {
+    if (window.createImageBitmap) {
+      return createImageBitmap(file, { imageOrientation: 'from-image' })
+        .catch(() => decodeWithImg(file));
+    }
+    return decodeWithImg(file);
+  }
+
+  function decodeWithImg(file) {
+    return new Promise((resolve, reject) => {
+      const url = URL.createObjectURL(file);
+      const img = new Image();
+      img.onload = () => { URL.revokeObjectURL(url); resolve(img); };
+      img.onerror = (e) => { URL.revokeObjectURL(url); reject(e); };
+      img.src = url;
+    });
+  }
+
+  function encode(source, width, height) {
+    if (window.OffscreenCanvas) {
+      const canvas = new OffscreenCanvas(width, height);
+      canvas.getContext('2d').drawImage(source, 0, 0, width, height);
+      return canvas.convertToBlob({ type: 'image/jpeg', quality: jpegQuality });
+    }
+    const canvas = document.createElement('canvas');
+    canvas.width = width;
+    canvas.height = height;
+    canvas.getContext('2d').drawImage(source, 0, 0, width, height);
+    return new Promise((resolve) => canvas.toBlob(resolve, 'image/jpeg', jpegQuality));
+  }
+
+  async function downscale(file) {
+    const source = await decode(file);
+    const srcWidth = source.width || source.naturalWidth;
+    const srcHeight = source.height || source.naturalHeight;
+    const scale = Math.min(1, maxSide / Math.max(srcWidth, srcHeight));
+    const width = Math.max(1, Math.round(srcWidth * scale));
+    const height = Math.max(1, Math.round(srcHeight * scale));
+    const blob = await encode(source, width, height);
+    if (source.close) source.close();
+    // Keep the original if re-encoding would not make it smaller
+    if (!blob || blob.size >= file.size) return file;
+    const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+    return new File([blob], name, { type: 'image/jpeg', lastModified: Date.now() });
+  }
+
+  form.addEventListener('submit', async (ev) => {
+    const file = fileInput.files && fileInput.files[0];
     submitBtn.disabled = true;
     spinner.style.display = 'inline';
+    if (!file || form.dataset.resized === '1' || !window.DataTransfer) return;
+
+    ev.preventDefault();
+    try {
+      const upload = await downscale(file);
+      if (upload !== file) {
+        const transfer = new DataTransfer();
+        transfer.items.add(upload);
+        fileInput.files = transfer.files;
+      }
+    } catch (err) {
+      console.error('Could not resize image, uploading original:', err);
+    }
+    form.dataset.resized = '1';
+    form.submit();
+  });
+
+  // Coming back via the browser's back button restores this page from cache
+  window.addEventListener('pageshow', () => {
+    form.dataset.resized = '';
+    spinner.style.display = 'none';
+    submitBtn.disabled = !(fileInput.files && fileInput.files[0]);
   });
 
 })();
@@ -0,0 +1,214 @@
+"""
+Static Files
+Serves /static with per-file cache headers, precompressed CSS/JS and byte ranges.
+
+Cache policy:
+    immutable, 1 year  - content-addressed names: uploads and Grad-CAM overlays
+                         (named by image hash), TTS audio (named by text hash), and
+                         CSS/JS linked through asset_url(), which puts a hash of the
+                         file contents in the name (css/style.<hash>.css)
+    revalidate         - everything else: no-cache with ETag/Last-Modified, so an
+                         unchanged file costs a 304 and no body
+
+`python static_files.py build` writes .br (when the brotli package is installed)
+and .gz copies of each CSS/JS/SVG file next to the original. A variant the
+client accepts is served only while it is newer than its source; otherwise the
+file goes out uncompressed. Range requests (audio seeking, resumed downloads)
+get 206 responses from werkzeug's conditional handling.
+
+Usage:
+    python static_files.py build [--force]     # write .br/.gz variants, print sizes
+"""
+
+import os
+import re
+import sys
+import gzip
+import hashlib
+import argparse
+import mimetypes
+import threading
+from pathlib import Path
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+BASE_DIR = Path(__file__).resolve().parent
+STATIC_DIR = BASE_DIR / "static"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = (".css", ".js", ".svg")
+# Preference order when the client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+FINGERPRINT_LENGTH = 10
+
+# Names that change whenever the content does
+IMMUTABLE_NAMES = (
+    re.compile(r"uploads/[0-9a-f]{32}\.(jpg|jpeg|png)"),
+    re.compile(r"gradcam/[\w.-]+_[0-9a-f]{32}\.jpg"),
+    re.compile(r"audio/tts_[0-9a-f]{32}\.\w+"),
+)
+FINGERPRINTED = re.compile(r"(.+)\.([0-9a-f]{%d})(\.\w+)" % FINGERPRINT_LENGTH)
+
+
+def is_immutable(filename):
+    return any(pattern.fullmatch(filename) for pattern in IMMUTABLE_NAMES)
+
+
+def split_fingerprint(filename):
+    """('css/style.css', '<hash>') for 'css/style.<hash>.css', else (filename, None)"""
+    match = FINGERPRINTED.fullmatch(filename)
+    if match is None:
+        return filename, None
+    return match.group(1) + match.group(3), match.group(2)
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class StaticFiles:
+    """Static file responses plus counters of bytes sent and bytes saved"""
+
+    def __init__(self, directory=STATIC_DIR):
+        self.directory = Path(directory)
+        self.bytes_sent = 0
+        self.bytes_saved = {"compression": 0, "not_modified": 0, "range": 0}
+        self._fingerprints = {}     # filename -> (mtime_ns, size, digest)
+        self._lock = threading.Lock()
+
+    def fingerprint(self, filename):
+        """Short hash of a file's contents, recomputed only when the file changes"""
+        path = safe_join(str(self.directory), filename)
+        try:
+            stat = os.stat(path)
+        except (TypeError, OSError):
+            return None
+        cached = self._fingerprints.get(filename)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, "rb") as fh:
+            digest = hashlib.sha256(fh.read()).hexdigest()[:FINGERPRINT_LENGTH]
+        self._fingerprints[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def url(self, filename):
+        """/static URL with the content hash in the file name, for long-lived caching"""
+        digest = self.fingerprint(filename)
+        if digest is None:
+            return f"/static/{filename}"
+        stem, ext = os.path.splitext(filename)
+        return f"/static/{stem}.{digest}{ext}"
+
+    def variant(self, path):
+        """(encoding, path) of the best fresh precompressed copy the client accepts"""
+        if not path.endswith(COMPRESSIBLE):
+            return None, path
+        mtime = os.path.getmtime(path)
+        for encoding, suffix in ENCODINGS:
+            if not request.accept_encodings[encoding]:
+                continue
+            try:
+                if os.path.getmtime(path + suffix) >= mtime:
+                    return encoding, path + suffix
+            except OSError:
+                continue
+        return None, path
+
+    def serve(self, filename):
+        path = safe_join(str(self.directory), filename)
+        # Precompressed copies are only sent as a Content-Encoding of their source
+        if path is None or filename.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+            abort(404)
+        immutable = is_immutable(filename)
+        if not os.path.isfile(path):
+            filename, digest = split_fingerprint(filename)
+            path = safe_join(str(self.directory), filename) if digest else None
+            if path is None or not os.path.isfile(path):
+                abort(404)
+            # A stale hash (page rendered before a deploy) still gets the current
+            # file, but must not be pinned in caches under the old name
+            immutable = digest == self.fingerprint(filename)
+
+        encoding, send_path = self.variant(path)
+        response = send_file(
+            send_path,
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            conditional=True,
+            max_age=IMMUTABLE_MAX_AGE if immutable else 0,
+        )
+        if immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        if path.endswith(COMPRESSIBLE):
+            response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if request.method == "GET":
+            self._record(response, os.path.getsize(path), os.path.getsize(send_path))
+        return response
+
+    def _record(self, response, original_size, full_size):
+        status = response.status_code
+        sent = (response.content_length or 0) if status != 304 else 0
+        with self._lock:
+            self.bytes_sent += sent
+            if status == 200:
+                self.bytes_saved["compression"] += original_size - full_size
+            elif status == 304:
+                self.bytes_saved["not_modified"] += full_size
+            elif status == 206:
+                self.bytes_saved["range"] += full_size - sent
+
+
+def build(directory=STATIC_DIR, force=False):
+    """Write precompressed variants of every compressible file; returns size rows"""
+    encodings = [(enc, suffix) for enc, suffix in ENCODINGS if enc != "br" or BROTLI_AVAILABLE]
+    rows = []
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE:
+            continue
+        data = path.read_bytes()
+        sizes = {}
+        for encoding, suffix in encodings:
+            target = path.with_name(path.name + suffix)
+            if force or not target.exists() or target.stat().st_mtime < path.stat().st_mtime:
+                tmp = target.with_name(target.name + ".tmp")
+                tmp.write_bytes(compress(data, encoding))
+                os.replace(tmp, target)
+            sizes[encoding] = target.stat().st_size
+        rows.append((path.relative_to(directory), len(data), sizes))
+    return rows
+
+
+def cmd_build(args):
+    if not BROTLI_AVAILABLE:
+        print("brotli is not installed; writing gzip variants only (pip install brotli)")
+    rows = build(force=args.force)
+    print(f"{'file':30} {'bytes':>9} {'gzip':>9} {'br':>9}")
+    for name, size, sizes in rows:
+        print(f"{str(name):30} {size:9d} {sizes.get('gzip', 0):9d} {sizes.get('br', 0) or '-':>9}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="precompress CSS/JS/SVG under static/")
+    build_cmd.add_argument("--force", action="store_true", help="rewrite variants that are up to date")
+    build_cmd.set_defaults(func=cmd_build)
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+"""
+Parallel hyperparameter search for train_tomato_model.py.
+
+Trials run in worker processes, each pinned to its own set of CPU cores with a
+matching TensorFlow thread count. Weak trials are stopped by successive halving:
+every trial trains for a few epochs, the best 1/eta continue for eta times as
+many epochs, and so on up to --max-epochs. A continuing trial resumes from its
+checkpoint. All trials read one decoded copy of the dataset (uint8, memory-mapped
+.npy), which is built once and reused while the image folder is unchanged.
+
+Every trial and rung is appended to saved_models/hparam_search/results.csv
+(config, validation metrics, wall time, CPUs). `promote` writes the best
+config to saved_models/best_config.json, and train_tomato_model.py then uses it
+instead of its built-in defaults.
+
+Usage:
+    python training/hparam_search.py run --trials 27 --workers 3 --min-epochs 2 --max-epochs 18
+    python training/hparam_search.py run --limit-per-class 200     # quick search on a subset
+    python training/hparam_search.py results
+    python training/hparam_search.py promote [TRIAL]               # default: best finished trial
+"""
+
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from incremental_train import class_files, split_validation  # noqa: E402
+
+
+# ---- SETTINGS ----
+DATA_DIR = BASE_DIR / "data" / "tomato"
+SEARCH_DIR = BASE_DIR / "saved_models" / "hparam_search"
+RESULTS_PATH = SEARCH_DIR / "results.csv"
+BEST_CONFIG_PATH = BASE_DIR / "saved_models" / "best_config.json"
+IMG_SIZE = 224
+
+# name: (kind, ...) -- names match the constants in train_tomato_model.py
+SEARCH_SPACE = {
+    "HEAD_LR": ("log", 1e-4, 3e-3),
+    "FINE_TUNE_LR": ("log", 1e-6, 1e-4),
+    "DROPOUT": ("uniform", 0.1, 0.5),
+    "BATCH_SIZE": ("choice", [16, 32, 64]),
+    "EPOCHS": ("choice", [3, 5, 8]),              # head epochs before fine-tuning starts
+    "FINE_TUNE_AT": ("choice", [60, 80, 100, 120, 140]),
+    "ROTATION_RANGE": ("choice", [0, 10, 20, 30]),
+    "ZOOM_RANGE": ("uniform", 0.0, 0.3),
+    "HORIZONTAL_FLIP": ("choice", [True, False]),
+}
+RESULT_FIELDS = ["trial", "rung", "epochs", "val_accuracy", "best_val_accuracy", "val_loss",
+                 "train_accuracy", "wall_seconds", "cpus", "status", "finished"] + list(SEARCH_SPACE)
+
+
+def sample_config(rng):
+    config = {}
+    for name, (kind, *spec) in SEARCH_SPACE.items():
+        if kind == "log":
+            config[name] = float(math.exp(rng.uniform(math.log(spec[0]), math.log(spec[1]))))
+        elif kind == "uniform":
+            config[name] = round(rng.uniform(spec[0], spec[1]), 3)
+        else:
+            config[name] = rng.choice(spec[0])
+    return config
+
+
+# ---- SHARED DATASET CACHE ----
+def dataset_signature(splits):
+    digest = hashlib.sha1(str(IMG_SIZE).encode())
+    for training, validation in splits.values():
+        digest.update(f"validation:{len(validation)}\n".encode())
+        for rel in validation + training:
+            stat = (DATA_DIR / rel).stat()
+            digest.update(f"{rel}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def build_cache(limit_per_class=None, workers=None):
+    """Decode every image once into cache/<signature>/; returns the cache directory"""
+    from evaluate_model import decoded_batches
+
+    # Validation images are picked by file-name hash (incremental_train.split_validation),
+    # not by the positional validation_split=0.2 that train_tomato_model.py uses
+    splits = {}
+    for name, names in class_files(DATA_DIR).items():
+        training, validation = split_validation(names)
+        if limit_per_class:
+            # Keep the 80/20 training/validation proportions within the subset
+            held_out = max(1, int(limit_per_class * 0.2))
+            training, validation = training[:limit_per_class - held_out], validation[:held_out]
+        splits[name] = (training, validation)
+    cache_dir = SEARCH_DIR / "cache" / dataset_signature(splits)
+    if (cache_dir / "labels.npy").exists():
+        print(f"Using dataset cache {cache_dir}")
+        return cache_dir
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    class_indices = {name: i for i, name in enumerate(splits)}
+    items, validation_flags = [], []
+    for name, (training, validation) in splits.items():
+        items.extend((rel, class_indices[name]) for rel in validation + training)
+        validation_flags.extend([True] * len(validation) + [False] * len(training))
+
+    print(f"Decoding {len(items)} images into {cache_dir} ...")
+    start = time.perf_counter()
+    images = np.lib.format.open_memmap(cache_dir / "images.npy", mode="w+", dtype=np.uint8,
+                                       shape=(len(items), IMG_SIZE, IMG_SIZE, 3))
+    labels = np.array([label for _, label in items], dtype=np.int32)
+    workers = workers or os.cpu_count() or 1
+    paths = [str(DATA_DIR / rel) for rel, _ in items]
+    for offset, batch, ok, errors in decoded_batches(paths, 64, workers, 2 * workers):
+        images[offset + np.asarray(ok, dtype=int)] = batch
+        for i, message in errors:
+            print(f"Could not read {paths[offset + i]}: {message}")
+            labels[offset + i] = -1       # excluded from training and validation
+    images.flush()
+    del images
+    np.save(cache_dir / "validation.npy", np.array(validation_flags))
+    with open(cache_dir / "class_indices.json", "w", encoding="utf-8") as fh:
+        json.dump(class_indices, fh, indent=2)
+    np.save(cache_dir / "labels.npy", labels)     # written last: marks the cache complete
+    print(f"Cache built in {time.perf_counter() - start:.0f}s")
+    return cache_dir
+
+
+# ---- WORKER ----
+_worker = {}
+
+
+def init_worker(cpu_queue):
+    """Pin this process to one CPU group and size TensorFlow's thread pools to it"""
+    cpus = cpu_queue.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    threads = str(len(cpus))
+    os.environ.update(OMP_NUM_THREADS=threads, TF_NUM_INTRAOP_THREADS=threads, TF_NUM_INTEROP_THREADS="2",
+                      TF_CPP_MIN_LOG_LEVEL="2")
+    _worker["cpus"] = cpus
+
+
+def load_cache(tf, cache_dir):
+    if _worker.get("cache_dir") != cache_dir:
+        labels = np.load(Path(cache_dir) / "labels.npy")
+        validation = np.load(Path(cache_dir) / "validation.npy")
+        _worker.update(
+            cache_dir=cache_dir,
+            images=np.load(Path(cache_dir) / "images.npy", mmap_mode="r"),  # shared page cache
+            labels=labels,
+            train_rows=np.flatnonzero(~validation & (labels >= 0)),
+            val_rows=np.flatnonzero(validation & (labels >= 0)),
+        )
+        tf.config.threading.set_intra_op_parallelism_threads(len(_worker["cpus"]))
+    return _worker
+
+
+def make_dataset(tf, data, rows, batch_size, augment=None, seed=0):
+    rng = np.random.default_rng(seed)
+    images, labels = data["images"], data["labels"]
+
+    def batches():
+        order = rows.copy()
+        if augment is not None:
+            rng.shuffle(order)
+        for i in range(0, len(order), batch_size):
+            idx = np.sort(order[i:i + batch_size])
+            yield images[idx], labels[idx]
+
+    ds = tf.data.Dataset.from_generator(batches, output_signature=(
+        tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.uint8), tf.TensorSpec((None,), tf.int32)))
+    ds = ds.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y))
+    if augment is not None:
+        ds = ds.map(lambda x, y: (augment(x, training=True), y))
+    return ds.prefetch(2)
+
+
+def augmenter(tf, config):
+    """Keras layers matching the ImageDataGenerator ranges in train_tomato_model.py"""
+    layers = []
+    if config["HORIZONTAL_FLIP"]:
+        layers.append(tf.keras.layers.RandomFlip("horizontal"))
+    if config["ROTATION_RANGE"]:
+        layers.append(tf.keras.layers.RandomRotation(config["ROTATION_RANGE"] / 360.0))
+    if config["ZOOM_RANGE"]:
+        layers.append(tf.keras.layers.RandomZoom((-config["ZOOM_RANGE"], config["ZOOM_RANGE"])))
+    return tf.keras.Sequential(layers) if layers else None
+
+
+def build_model(tf, config, num_classes):
+    """Same architecture as train_tomato_model.py"""
+    base = tf.keras.applications.MobileNetV2(weights="imagenet", include_top=False,
+                                             input_shape=(IMG_SIZE, IMG_SIZE, 3))
+    x = tf.keras.layers.GlobalAveragePooling2D()(base.output)
+    x = tf.keras.layers.Dropout(config["DROPOUT"])(x)
+    output = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    return tf.keras.Model(inputs=base.input, outputs=output)
+
+
+def set_phase(model, config, fine_tune):
+    """Head training: only the last three layers; fine-tuning: also the backbone from FINE_TUNE_AT"""
+    head_start = len(model.layers) - 3
+    for i, layer in enumerate(model.layers):
+        layer.trainable = i >= head_start or (fine_tune and i >= config["FINE_TUNE_AT"])
+
+
+def run_trial(task):
+    """Train one trial from task['start'] to task['end'] epochs, resuming from its checkpoint"""
+    import tensorflow as tf
+
+    started = time.perf_counter()
+    config, trial_dir = task["config"], Path(task["trial_dir"])
+    data = load_cache(tf, task["cache_dir"])
+    num_classes = int(data["labels"].max()) + 1
+    tf.keras.backend.clear_session()
+    tf.keras.utils.set_random_seed(task["seed"])
+
+    checkpoint = trial_dir / "model.h5"
+    model = tf.keras.models.load_model(str(checkpoint)) if task["start"] else build_model(tf, config, num_classes)
+    counts = np.bincount(data["labels"][data["train_rows"]], minlength=num_classes)
+    class_weight = {i: len(data["train_rows"]) / (num_classes * n) for i, n in enumerate(counts) if n}
+    train = make_dataset(tf, data, data["train_rows"], config["BATCH_SIZE"], augmenter(tf, config),
+                         seed=task["seed"] + task["start"])
+    val = make_dataset(tf, data, data["val_rows"], 64)
+
+    history = {}
+    head_end = min(task["end"], config["EPOCHS"])
+    segments = [(task["start"], head_end, False, config["HEAD_LR"]),
+                (max(task["start"], config["EPOCHS"]), task["end"], True, config["FINE_TUNE_LR"])]
+    for first, last, fine_tune, lr in segments:
+        if first >= last:
+            continue
+        set_phase(model, config, fine_tune)
+        model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=lr),
+                      loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+        early_stop = tf.keras.callbacks.EarlyStopping(monitor="val_accuracy", patience=3)
+        fit = model.fit(train, validation_data=val, initial_epoch=first, epochs=last,
+                        class_weight=class_weight, callbacks=[early_stop], verbose=0)
+        for key, values in fit.history.items():
+            history.setdefault(key, []).extend(values)
+        if early_stop.stopped_epoch:
+            break
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    model.save(str(checkpoint))
+
+    return {
+        "trial": task["trial"],
+        "rung": task["rung"],
+        "epochs": task["start"] + len(history.get("val_accuracy", [])),
+        "val_accuracy": history["val_accuracy"][-1],
+        "best_val_accuracy": max(history["val_accuracy"] + [task.get("best", 0.0)]),
+        "val_loss": history["val_loss"][-1],
+        "train_accuracy": history["accuracy"][-1],
+        "wall_seconds": round(time.perf_counter() - started, 1),
+        "cpus": " ".join(str(c) for c in sorted(_worker["cpus"])),
+    }
+
+
+# ---- SEARCH ----
+def cpu_groups(workers):
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    workers = max(1, min(workers, len(cpus)))
+    size = len(cpus) // workers
+    return [set(cpus[i * size:(i + 1) * size]) for i in range(workers)]
+
+
+def rung_budgets(min_epochs, max_epochs, eta):
+    budgets = [min_epochs]
+    while budgets[-1] * eta < max_epochs:
+        budgets.append(budgets[-1] * eta)
+    if budgets[-1] < max_epochs:
+        budgets.append(max_epochs)
+    return budgets
+
+
+def append_results(rows):
+    new_file = not RESULTS_PATH.exists()
+    with open(RESULTS_PATH, "a", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def cmd_run(args):
+    SEARCH_DIR.mkdir(parents=True, exist_ok=True)
+    cache_dir = build_cache(args.limit_per_class, args.workers * 2)
+    groups = cpu_groups(args.workers)
+    rng = random.Random(args.seed)
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    trials = {f"{run_id}-{i:03d}": {"config": sample_config(rng), "epochs": 0, "best": 0.0}
+              for i in range(args.trials)}
+    budgets = rung_budgets(args.min_epochs, args.max_epochs, args.eta)
+    print(f"{args.trials} trials, rungs at {budgets} epochs, {len(groups)} workers "
+          f"with {len(groups[0])} CPUs each")
+
+    context = multiprocessing.get_context("spawn")   # fresh TensorFlow runtime per worker
+    cpu_queue = context.Queue()
+    for group in groups:
+        cpu_queue.put(group)
+    alive = list(trials)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(len(groups), mp_context=context, initializer=init_worker,
+                             initargs=(cpu_queue,)) as pool:
+        for rung, budget in enumerate(budgets):
+            futures = {pool.submit(run_trial, {
+                "trial": trial_id, "rung": rung, "config": trials[trial_id]["config"],
+                "start": trials[trial_id]["epochs"], "end": budget, "best": trials[trial_id]["best"],
+                "cache_dir": str(cache_dir), "trial_dir": str(SEARCH_DIR / "trials" / trial_id),
+                "seed": args.seed,
+            }): trial_id for trial_id in alive}
+            results = []
+            for future in as_completed(futures):
+                trial_id = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  trial {trial_id} failed: {e}")
+                    result = {"trial": trial_id, "rung": rung, "best_val_accuracy": -1.0, "status": "failed"}
+                trials[trial_id].update(epochs=result.get("epochs", budget), best=result["best_val_accuracy"])
+                results.append(result)
+                if "val_accuracy" in result:
+                    print(f"  rung {rung} trial {trial_id}: val_accuracy {result['val_accuracy']:.4f} "
+                          f"after {result['epochs']} epochs ({result['wall_seconds']:.0f}s)")
+
+            # Successive halving: keep the best 1/eta (trials that stopped early don't continue)
+            keep = max(1, len(alive) // args.eta) if rung < len(budgets) - 1 else 0
+            ranked = sorted((r for r in results if r.get("epochs") == budget),
+                            key=lambda r: r["best_val_accuracy"], reverse=True)
+            survivors = {r["trial"] for r in ranked[:keep]}
+            for r in results:
+                r.update({name: trials[r["trial"]]["config"][name] for name in SEARCH_SPACE})
+                r.setdefault("status", "continued" if r["trial"] in survivors else
+                             "finished" if rung == len(budgets) - 1 else "stopped")
+                r["finished"] = datetime.now().isoformat(timespec="seconds")
+            append_results(results)
+            alive = [t for t in alive if t in survivors]
+            if not alive:
+                break
+
+    best = max(trials.items(), key=lambda item: item[1]["best"])
+    print(f"\nSearch finished in {time.perf_counter() - started:.0f}s. Best trial {best[0]}: "
+          f"val_accuracy {best[1]['best']:.4f} after {best[1]['epochs']} epochs")
+    print(json.dumps(best[1]["config"], indent=2))
+    print(f"Results: {RESULTS_PATH}\nPromote with: python training/hparam_search.py promote {best[0]}")
+    return 0
+
+
+def read_results():
+    if not RESULTS_PATH.exists():
+        return []
+    with open(RESULTS_PATH, "r", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
+
+
+def cmd_results(args):
+    rows = [r for r in read_results() if r["status"] in ("finished", "stopped") and r["val_accuracy"]]
+    rows.sort(key=lambda r: float(r["best_val_accuracy"]), reverse=True)
+    print(f"{'trial':<22} {'status':<9} {'epochs':>6} {'best val acc':>12} {'wall s':>7}")
+    for r in rows[:args.top]:
+        print(f"{r['trial']:<22} {r['status']:<9} {r['epochs']:>6} {float(r['best_val_accuracy']):>12.4f} "
+              f"{float(r['wall_seconds']):>7.0f}")
+    return 0
+
+
+def parse_value(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return {"True": True, "False": False}.get(value, value)
+
+
+def cmd_promote(args):
+    """Write the best trial's config to best_config.json.
+
+    Trials were scored on the hash-based validation split, while
+    train_tomato_model.py holds out the last 20% of each class folder (Keras
+    validation_split). The two validation sets overlap only partly, so the
+    val_accuracy recorded here is not directly comparable with the one the full
+    training run reports.
+    """
+    rows = [r for r in read_results() if r["status"] == "finished" and (not args.trial or r["trial"] == args.trial)]
+    if not rows:
+        print("No finished trial found" + (f" with id {args.trial}" if args.trial else ""))
+        return 1
+    best = max(rows, key=lambda r: float(r["best_val_accuracy"]))
+    config = {name: parse_value(best[name]) for name in SEARCH_SPACE}
+    total_epochs = int(best["epochs"])
+    config["FINE_TUNE_EPOCHS"] = max(0, total_epochs - config["EPOCHS"])
+    config["FINE_TUNE"] = config["FINE_TUNE_EPOCHS"] > 0
+    with open(BEST_CONFIG_PATH, "w", encoding="utf-8") as fh:
+        json.dump({"trial": best["trial"], "val_accuracy": float(best["best_val_accuracy"]),
+                   "promoted": datetime.now().isoformat(timespec="seconds"), "config": config}, fh, indent=2)
+    print(f"Wrote {BEST_CONFIG_PATH} from trial {best['trial']}; train_tomato_model.py will use it")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run a search")
+    run.add_argument("--trials", type=int, default=27)
+    run.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                     help="parallel trials; the CPUs are split evenly between them")
+    run.add_argument("--min-epochs", type=int, default=2, help="epochs every trial gets")
+    run.add_argument("--max-epochs", type=int, default=18)
+    run.add_argument("--eta", type=int, default=3, help="keep 1/eta of the trials at each rung")
+    run.add_argument("--limit-per-class", type=int, help="search on a subset of each class")
+    run.add_argument("--seed", type=int, default=0)
+    run.set_defaults(func=cmd_run)
+    results = sub.add_parser("results", help="best trials so far")
+    results.add_argument("--top", type=int, default=10)
+    results.set_defaults(func=cmd_results)
+    promote = sub.add_parser("promote", help="write saved_models/best_config.json for train_tomato_model.py")
+    promote.add_argument("trial", nargs="?")
+    promote.set_defaults(func=cmd_promote)
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""
+Incremental retraining from newly confirmed field images.
+
+Starts from the served model instead of ImageNet weights. The MobileNetV2
+backbone stays frozen, so every image is embedded once (the same pooled
+embedding the app already computes) and only the classification head is
+retrained on:
+    - new images: files in data/tomato added after the base model was trained,
+      or copied in from --new-dir (<class>/<image> folders)
+    - a replay buffer: a per-class reservoir sample of earlier images kept in
+      saved_models/replay_buffer.json and updated after every run
+New class folders get new output units appended after the existing ones, so
+the indices in class_indices.json never change. Accuracy on old classes is
+measured before and after on a validation split chosen by a hash of the file
+name (about 20% of each class folder). Unlike a positional split, it does not
+move when files are added, so images the head was trained on in earlier runs
+never end up in it. A base model from train_tomato_model.py used Keras'
+positional split, so a few of these images may have been in its training set;
+before and after are measured on the same images, so the change still shows
+forgetting.
+
+Usage (from the repository root or training/):
+    python training/incremental_train.py                      # images added since the base model
+    python training/incremental_train.py --new-dir field_uploads/confirmed
+    python training/incremental_train.py --since 2026-10-01 --promote
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from evaluate_model import IMAGE_EXTENSIONS  # noqa: E402
+from model_registry import (ModelRegistry, LEGACY_MODEL_PATH, LEGACY_CLASS_IND_PATH,  # noqa: E402
+                            MODEL_FILE, LoadedModel, embedding_model)
+
+
+# ---- SETTINGS ----
+DATA_DIR = BASE_DIR / "data" / "tomato"
+MODEL_DIR = BASE_DIR / "saved_models"
+REPLAY_BUFFER_PATH = MODEL_DIR / "replay_buffer.json"
+REPLAY_PER_CLASS = 200     # reservoir size per class
+VALIDATION_SPLIT = 0.2     # share of each folder held out, by file-name hash
+EPOCHS = 15
+BATCH_SIZE = 64
+LEARNING_RATE = 1e-3
+DROPOUT = 0.3
+NO_OLD_EVAL = ("Not publishing: there are no old-class validation images (--eval-per-class is 0 or "
+               "the classes are too small), so forgetting cannot be checked. Use --no-publish to train anyway")
+
+
+# ---- DATA ----
+def class_files(data_dir):
+    """{class: [relative paths]} in sorted order"""
+    files = {}
+    for folder in sorted(p for p in Path(data_dir).iterdir() if p.is_dir()):
+        names = sorted(str(p.relative_to(data_dir)) for p in folder.rglob("*")
+                       if p.suffix.lower() in IMAGE_EXTENSIONS)
+        files[folder.name] = names
+    return files
+
+
+def is_validation(rel, validation_split=VALIDATION_SPLIT):
+    """Stable held-out split by file name (crc32, as ood.py splits calibration images)"""
+    return zlib.crc32(os.path.basename(rel).encode("utf-8")) % 100 < validation_split * 100
+
+
+def split_validation(names, validation_split=VALIDATION_SPLIT):
+    """(training, validation) lists for one class folder"""
+    training, validation = [], []
+    for rel in names:
+        (validation if is_validation(rel, validation_split) else training).append(rel)
+    return training, validation
+
+
+def import_new_images(new_dir, data_dir):
+    """Copy <class>/<image> folders into the dataset; returns the relative paths added"""
+    added = []
+    for src in sorted(Path(new_dir).rglob("*")):
+        if src.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        dest = Path(data_dir) / src.parent.name / src.name
+        if dest.exists():
+            continue
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dest)
+        added.append(str(dest.relative_to(data_dir)))
+    return added
+
+
+class ReplayBuffer:
+    """Per-class reservoir sample (Algorithm R) of training images seen so far"""
+
+    def __init__(self, size_per_class=REPLAY_PER_CLASS, seed=0):
+        self.size_per_class = size_per_class
+        self.seen = defaultdict(int)
+        self.items = defaultdict(list)
+        self.rng = random.Random(seed)
+
+    def add(self, label, item):
+        self.seen[label] += 1
+        reservoir = self.items[label]
+        if len(reservoir) < self.size_per_class:
+            reservoir.append(item)
+        else:
+            slot = self.rng.randrange(self.seen[label])
+            if slot < self.size_per_class:
+                reservoir[slot] = item
+
+    def sample(self):
+        return [(item, label) for label, items in self.items.items() for item in items]
+
+    def save(self, path):
+        tmp = Path(str(path) + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"size_per_class": self.size_per_class, "seen": self.seen, "items": self.items}, fh)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, size_per_class=REPLAY_PER_CLASS, seed=0):
+        buffer = cls(size_per_class, seed)
+        if Path(path).exists():
+            with open(path, "r", encoding="utf-8") as fh:
+                state = json.load(fh)
+            buffer.seen.update(state["seen"])
+            for label, items in state["items"].items():
+                buffer.items[label] = items[:size_per_class]
+        return buffer
+
+
+# ---- MODEL ----
+def base_model_paths(version):
+    registry = ModelRegistry()
+    version = version or registry.current()
+    if version:
+        path = registry.path(version)
+        return version, path / MODEL_FILE, path / "class_indices.json"
+    return "legacy", LEGACY_MODEL_PATH, LEGACY_CLASS_IND_PATH
+
+
+def expand_head(weights, bias, num_classes, seed=0):
+    """Output layer weights with units appended for new classes; existing columns unchanged"""
+    old = weights.shape[1]
+    if num_classes == old:
+        return weights.copy(), bias.copy()
+    rng = np.random.default_rng(seed)
+    limit = np.sqrt(6.0 / (weights.shape[0] + num_classes))  # glorot uniform, as Dense uses
+    new_w = rng.uniform(-limit, limit, (weights.shape[0], num_classes - old)).astype(weights.dtype)
+    new_b = np.full(num_classes - old, bias.mean(), dtype=bias.dtype)
+    return np.concatenate([weights, new_w], axis=1), np.concatenate([bias, new_b])
+
+
+def head_model(tf, embedding_dim, num_classes, weights, bias):
+    inputs = tf.keras.Input(shape=(embedding_dim,))
+    x = tf.keras.layers.Dropout(DROPOUT)(inputs)
+    outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    head = tf.keras.Model(inputs, outputs)
+    head.layers[-1].set_weights([weights, bias])
+    return head
+
+
+def full_model(tf, base, head):
+    """Base backbone + pooling with the retrained head, saved like train_tomato_model.py output"""
+    pool = next(layer for layer in base.layers if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D))
+    x = tf.keras.layers.Dropout(DROPOUT)(pool.output)
+    output = tf.keras.layers.Dense(head.layers[-1].units, activation="softmax")(x)
+    model = tf.keras.Model(inputs=base.inputs, outputs=output)
+    model.layers[-1].set_weights(head.layers[-1].get_weights())
+    return model
+
+
+def accuracy_by_class(probs, y, labels):
+    predicted = probs.argmax(axis=1)
+    return {labels[c]: float((predicted[y == c] == c).mean()) for c in np.unique(y)}
+
+
+# ---- MAIN ----
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", help="base model version (default: the registry CURRENT)")
+    parser.add_argument("--new-dir", help="confirmed images in <class>/<image> folders to add to data/tomato")
+    parser.add_argument("--since", help="treat dataset images modified after this date (YYYY-MM-DD) as new "
+                                        "(default: when the base model was saved)")
+    parser.add_argument("--replay-per-class", type=int, default=REPLAY_PER_CLASS)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--eval-per-class", type=int, default=200, help="validation images per old class")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-publish", action="store_true")
+    parser.add_argument("--promote", action="store_true")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from embedding_index import embed_images
+    from ood import OODDetector, final_dense
+
+    started = time.perf_counter()
+    version, model_path, class_indices_path = base_model_paths(args.version)
+    base = tf.keras.models.load_model(str(model_path))
+    with open(class_indices_path, "r", encoding="utf-8") as fh:
+        base_indices = json.load(fh)
+    class_indices = dict(base_indices)
+    embedder = LoadedModel(version, base, None, "", embedding_model(base))
+    print(f"Base model {version}: {len(class_indices)} classes")
+
+    # ---- NEW IMAGES ----
+    added = set(import_new_images(args.new_dir, DATA_DIR)) if args.new_dir else set()
+    since = (datetime.strptime(args.since, "%Y-%m-%d").timestamp() if args.since
+             else os.path.getmtime(model_path))
+    files = class_files(DATA_DIR)
+    for name in files:
+        if name not in class_indices:
+            class_indices[name] = len(class_indices)   # append: existing indices never move
+            print(f"New class {name} -> index {class_indices[name]}")
+    labels = [None] * len(class_indices)
+    for name, idx in class_indices.items():
+        labels[idx] = name
+    old_labels = labels[:len(base_indices)]
+
+    new_train, new_eval, old_eval = [], [], []
+    for name, names in files.items():
+        validation = split_validation(names)[1]
+        if name in base_indices:
+            old_eval.extend((rel, name) for rel in validation[:args.eval_per_class])
+        for rel in names:
+            if rel in added or os.path.getmtime(DATA_DIR / rel) > since:
+                (new_eval if is_validation(rel) else new_train).append((rel, name))
+    if not new_train:
+        print("No new images to train on")
+        return 1
+    if not old_eval and not args.no_publish:
+        print(NO_OLD_EVAL)
+        return 1
+
+    # ---- REPLAY BUFFER ----
+    replay = ReplayBuffer.load(REPLAY_BUFFER_PATH, args.replay_per_class, args.seed)
+    new_set = {rel for rel, _ in new_train} | {rel for rel, _ in new_eval}
+    if not REPLAY_BUFFER_PATH.exists():
+        # First run: stream every earlier training image through the reservoir
+        for name, names in files.items():
+            for rel in split_validation(names)[0]:
+                if rel not in new_set:
+                    replay.add(name, rel)
+    # Buffers saved before the hash split may hold images that are now validation images
+    replayed = [(rel, name) for rel, name in replay.sample()
+                if (DATA_DIR / rel).exists() and not is_validation(rel)]
+    print(f"Training on {len(new_train)} new images + {len(replayed)} replayed, "
+          f"evaluating on {len(old_eval)} old-class and {len(new_eval)} new validation images")
+
+    # ---- EMBED (backbone frozen: one forward pass per image) ----
+    def embed(items):
+        paths = [str(DATA_DIR / rel) for rel, _ in items]
+        x = np.zeros((len(paths), embedder.dual.outputs[0].shape[-1]), dtype=np.float32)
+        old_probs = np.zeros((len(paths), len(base_indices)), dtype=np.float32)
+        keep = np.zeros(len(paths), dtype=bool)
+        for rows, embeddings, probs in embed_images(embedder, paths, BATCH_SIZE, args.workers):
+            x[rows], old_probs[rows], keep[rows] = embeddings, probs, True
+        y = np.array([class_indices[name] for _, name in items])
+        return x[keep], y[keep], old_probs[keep]
+
+    t0 = time.perf_counter()
+    train_x, train_y, _ = embed(new_train + replayed)
+    old_x, old_y, old_before = embed(old_eval)
+    new_x, new_y, _ = embed(new_eval) if new_eval else (None, None, None)
+    embed_seconds = time.perf_counter() - t0
+
+    # ---- TRAIN HEAD ----
+    weights, bias = expand_head(*final_dense(base), len(class_indices), args.seed)
+    head = head_model(tf, train_x.shape[1], len(class_indices), weights, bias)
+    head.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+                 loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    counts = np.bincount(train_y, minlength=len(class_indices))
+    class_weight = {c: len(train_y) / (np.count_nonzero(counts) * n) for c, n in enumerate(counts) if n}
+    t0 = time.perf_counter()
+    head.fit(train_x, train_y, batch_size=BATCH_SIZE, epochs=args.epochs, shuffle=True,
+             class_weight=class_weight, verbose=2)
+    train_seconds = time.perf_counter() - t0
+
+    # ---- REPORT ----
+    metrics = {"base_version": version, "new_images": len(new_train), "replayed_images": len(replayed),
+               "num_classes": len(class_indices), "epochs": args.epochs}
+    if len(old_x):
+        old_after = head.predict(old_x, verbose=0)
+        before = accuracy_by_class(old_before, old_y, old_labels)
+        after = accuracy_by_class(old_after, old_y, labels)
+        print(f"\n{'old class':<40} {'before':>7} {'after':>7}")
+        for name in old_labels:
+            if name in before:
+                print(f"{name:<40} {before[name]:>7.3f} {after[name]:>7.3f}")
+        metrics["old_class_accuracy_before"] = float((old_before.argmax(axis=1) == old_y).mean())
+        metrics["old_class_accuracy_after"] = float((old_after.argmax(axis=1) == old_y).mean())
+        print(f"{'old classes overall':<40} {metrics['old_class_accuracy_before']:>7.3f} "
+              f"{metrics['old_class_accuracy_after']:>7.3f}")
+    else:
+        print("\nNo old-class validation images could be read: skipping the before/after check")
+    if new_x is not None and len(new_x):
+        metrics["new_image_accuracy"] = float((head.predict(new_x, verbose=0).argmax(axis=1) == new_y).mean())
+        print(f"{'new validation images':<40} {'':>7} {metrics['new_image_accuracy']:>7.3f}")
+    print(f"\nEmbedding {embed_seconds:.0f}s, head training {train_seconds:.0f}s, "
+          f"total {time.perf_counter() - started:.0f}s")
+
+    # ---- SAVE ----
+    model = full_model(tf, base, head)
+    final_path = MODEL_DIR / "tomato_disease_model_incremental.h5"
+    model.save(str(final_path))
+    class_indices_out = MODEL_DIR / "class_indices_incremental.json"
+    with open(class_indices_out, "w", encoding="utf-8") as fh:
+        json.dump(class_indices, fh, indent=2)
+    extras = {"class_indices.json": class_indices_out}
+    ood_stats_path = MODEL_DIR / "ood_stats_incremental.npz"
+    calibration = old_x if new_x is None else np.concatenate([old_x, new_x])
+    if len(calibration):
+        OODDetector.fit(train_x, train_y, calibration, *head.layers[-1].get_weights()).save(ood_stats_path)
+        extras["ood_stats.npz"] = ood_stats_path
+    else:
+        print("No validation images to calibrate the OOD thresholds: skipping ood_stats.npz")
+
+    # New images join the reservoir so later runs keep replaying them
+    for rel, name in new_train:
+        replay.add(name, rel)
+    replay.save(REPLAY_BUFFER_PATH)
+    print(f"Saved {final_path}")
+
+    if not args.no_publish:
+        if "old_class_accuracy_after" not in metrics:
+            print(NO_OLD_EVAL)
+            return 1
+        new_version = ModelRegistry().publish(
+            final_path,
+            extras,
+            metrics=metrics,
+            promote=args.promote,
+            source=f"training/incremental_train.py from {version}",
+        )
+        print(f"Published model version {new_version} to the registry")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ from PIL import ImageFile
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 import os
+import sys
 import json
 import numpy as np
 import tensorflow as tf
@@ -22,7 +23,27 @@ EPOCHS = 10            # head training epochs
 FINE_TUNE = True       # whether to run fine-tuning stage
 FINE_TUNE_EPOCHS = 10  # additional epochs for fine-tuning
 FINE_TUNE_AT = 100     # layer index in base_model from which to unfreeze
+HEAD_LR = 1e-3         # learning rate for head training
+FINE_TUNE_LR = 1e-5    # learning rate for fine-tuning
+DROPOUT = 0.3
+ROTATION_RANGE = 20    # augmentation
+ZOOM_RANGE = 0.2
+HORIZONTAL_FLIP = True
 MODEL_DIR = "../saved_models"
+PUBLISH = True         # publish the trained model as a new version in saved_models/registry
+PROMOTE = False        # serve the new version right away (otherwise: model_registry.py shadow/promote)
+
+# Settings promoted by training/hparam_search.py override the defaults above
+# (set IGNORE_BEST_CONFIG=1 to train with the defaults)
+TUNABLE = ("EPOCHS", "FINE_TUNE", "FINE_TUNE_EPOCHS", "FINE_TUNE_AT", "BATCH_SIZE", "HEAD_LR",
+           "FINE_TUNE_LR", "DROPOUT", "ROTATION_RANGE", "ZOOM_RANGE", "HORIZONTAL_FLIP")
+best_config_path = os.path.join(MODEL_DIR, "best_config.json")
+if os.path.exists(best_config_path) and os.environ.get("IGNORE_BEST_CONFIG") != "1":
+    with open(best_config_path, "r", encoding="utf-8") as fh:
+        tuned = json.load(fh).get("config", {})
+    globals().update({name: value for name, value in tuned.items() if name in TUNABLE})
+    print(f"Using tuned settings from {best_config_path}:",
+          {name: value for name, value in tuned.items() if name in TUNABLE})
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
@@ -31,9 +52,9 @@ os.makedirs(MODEL_DIR, exist_ok=True)
 datagen = ImageDataGenerator(
     rescale=1/255.0,
     validation_split=0.2,
-    horizontal_flip=True,
-    rotation_range=20,
-    zoom_range=0.2
+    horizontal_flip=HORIZONTAL_FLIP,
+    rotation_range=ROTATION_RANGE,
+    zoom_range=ZOOM_RANGE
 )
 
 train_gen = datagen.flow_from_directory(
@@ -81,14 +102,14 @@ base_model.trainable = False
 
 x = base_model.output
 x = GlobalAveragePooling2D()(x)
-x = Dropout(0.3)(x)
+x = Dropout(DROPOUT)(x)
 output = Dense(num_classes, activation='softmax')(x)
 
 model = Model(inputs=base_model.input, outputs=output)
 
 # Compile for head training (higher lr)
 model.compile(
-    optimizer=Adam(learning_rate=1e-3),
+    optimizer=Adam(learning_rate=HEAD_LR),
     loss='categorical_crossentropy',
     metrics=['accuracy']
 )
@@ -123,7 +144,7 @@ if FINE_TUNE:
 
     # Recompile with a lower learning rate
     model.compile(
-        optimizer=Adam(learning_rate=1e-5),
+        optimizer=Adam(learning_rate=FINE_TUNE_LR),
         loss='categorical_crossentropy',
         metrics=['accuracy']
     )
@@ -155,4 +176,61 @@ try:
         json.dump(hist, fh, indent=2)
     print(f"Saved training history to {hist_path}")
 except Exception as e:
-    print("Could not save history:", e)
\ No newline at end of file
+    print("Could not save history:", e)
+
+
+# ---- OUT-OF-DISTRIBUTION STATISTICS ----
+# Class means/covariance of the pooled embeddings (training subset) and rejection
+# thresholds (validation subset), used by the app to flag non-leaf uploads
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+ood_stats_path = os.path.join(MODEL_DIR, "ood_stats.npz")
+# Never publish a previous run's statistics: they were fitted to another model's embeddings
+if os.path.exists(ood_stats_path):
+    os.remove(ood_stats_path)
+ood_fitted = False
+try:
+    from ood import OODDetector, final_dense, is_evaluation
+    from model_registry import embedding_model
+
+    plain_gen = ImageDataGenerator(rescale=1/255.0, validation_split=0.2)
+    embedder = embedding_model(model)
+    pooled = {}
+    for subset in ("training", "validation"):
+        gen = plain_gen.flow_from_directory(DATA_DIR, target_size=(IMG_SIZE, IMG_SIZE),
+                                            batch_size=BATCH_SIZE, subset=subset, shuffle=False)
+        # Leave out ood.py's evaluation split so `ood.py evaluate` measures unseen leaves
+        fit_mask = np.array([not is_evaluation(name) for name in gen.filenames])
+        pooled[subset] = (embedder.predict(gen, verbose=0)[0][fit_mask], gen.classes[fit_mask])
+    weights, bias = final_dense(model)
+    detector = OODDetector.fit(pooled["training"][0], pooled["training"][1], pooled["validation"][0],
+                               weights, bias)
+    detector.save(ood_stats_path)
+    ood_fitted = True
+    print(f"Saved OOD statistics to {ood_stats_path}")
+except Exception as e:
+    print("Could not compute OOD statistics (the model will be published without them):", e)
+
+
+# ---- PUBLISH TO MODEL REGISTRY ----
+# The running app picks up a promoted version without a restart
+if PUBLISH:
+    from model_registry import ModelRegistry
+
+    final_metrics = {}
+    for name, values in hist.items():
+        if values:
+            final_metrics[name] = float(values[-1])
+    final_metrics.update(num_classes=num_classes, epochs=len(hist.get("loss", [])),
+                         best_val_accuracy=float(max(hist.get("val_accuracy", [0]))))
+    extras = {"class_indices.json": class_indices_path,
+              "training_history.json": os.path.join(MODEL_DIR, "training_history.json")}
+    if ood_fitted:
+        extras["ood_stats.npz"] = ood_stats_path
+    version = ModelRegistry().publish(
+        final_path,
+        extras,
+        metrics=final_metrics,
+        promote=PROMOTE,
+        source="training/train_tomato_model.py",
+    )
+    print(f"Published model version {version} to the registry")
@@ -0,0 +1,283 @@
+"""
+Text-to-Speech Cache
+Content-addressed audio cache in front of a pluggable TTS backend.
+
+Audio files are named after a hash of (backend, language, voice settings, text),
+so identical answers are synthesized once and then served from disk. The store
+is bounded by total size and file count with least-recently-used eviction.
+
+Backends:
+    gtts    - Google Text-to-Speech (network, default when installed)
+    espeak  - espeak-ng command line (offline, Kannada voice "kn")
+    silent  - short silent WAV, for tests and benchmarks
+Select with the TTS_BACKEND environment variable.
+"""
+
+import io
+import os
+import json
+import wave
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from collections import OrderedDict
+
+try:
+    from gtts import gTTS
+    GTTS_AVAILABLE = True
+except ImportError:
+    GTTS_AVAILABLE = False
+
+
+BASE_DIR = Path(__file__).resolve().parent
+AUDIO_FOLDER = BASE_DIR / "static" / "audio"
+
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+TTS_CACHE_MAX_FILES = int(os.environ.get("TTS_CACHE_MAX_FILES", 5000))
+FILE_PREFIX = "tts_"
+
+
+# ---- BACKENDS ----
+class TTSBackend:
+    """Interface for speech engines: turn text into audio bytes"""
+
+    name = "base"
+    extension = "mp3"
+
+    def settings(self):
+        """Voice settings that change the audio and so belong in the cache key"""
+        return {}
+
+    def synthesize(self, text, lang):
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    name = "gtts"
+    extension = "mp3"
+
+    def __init__(self, slow=False):
+        if not GTTS_AVAILABLE:
+            raise RuntimeError("gTTS not installed")
+        self.slow = slow
+
+    def settings(self):
+        return {"slow": self.slow}
+
+    def synthesize(self, text, lang):
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=self.slow).write_to_fp(buf)
+        return buf.getvalue()
+
+
+class EspeakBackend(TTSBackend):
+    """Offline synthesis through the espeak-ng binary"""
+
+    name = "espeak"
+    extension = "wav"
+
+    def __init__(self, speed=150, binary=None):
+        self.binary = binary or shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.binary:
+            raise RuntimeError("espeak-ng not found on PATH")
+        self.speed = speed
+
+    def settings(self):
+        return {"speed": self.speed}
+
+    def synthesize(self, text, lang):
+        result = subprocess.run(
+            [self.binary, "-v", lang, "-s", str(self.speed), "--stdout", text],
+            capture_output=True, check=True, timeout=60,
+        )
+        return result.stdout
+
+
+class SilentBackend(TTSBackend):
+    """Returns a short silent WAV without touching the network"""
+
+    name = "silent"
+    extension = "wav"
+
+    def __init__(self, duration=0.2, sample_rate=8000):
+        self.duration = duration
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text, lang):
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b"\x00\x00" * int(self.duration * self.sample_rate))
+        return buf.getvalue()
+
+
+BACKENDS = {
+    "gtts": GTTSBackend,
+    "espeak": EspeakBackend,
+    "silent": SilentBackend,
+}
+
+
+def get_backend(name=None):
+    """Backend by name (or TTS_BACKEND), else the first one that can be created"""
+    name = name or os.environ.get("TTS_BACKEND")
+    candidates = [name] if name else ["gtts", "espeak"]
+    for candidate in candidates:
+        try:
+            return BACKENDS[candidate]()
+        except KeyError:
+            print(f"Warning: unknown TTS backend '{candidate}'")
+        except Exception as e:
+            print(f"Warning: TTS backend '{candidate}' unavailable: {e}")
+    return None
+
+
+# ---- CACHE ----
+class TTSCache:
+    """Bounded on-disk LRU cache of synthesized audio, keyed by content hash"""
+
+    def __init__(self, backend, directory=AUDIO_FOLDER,
+                 max_bytes=TTS_CACHE_MAX_BYTES, max_files=TTS_CACHE_MAX_FILES):
+        self.backend = backend
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.stats = {"hits": 0, "misses": 0, "errors": 0, "evictions": 0}
+        self._entries = OrderedDict()   # filename -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}             # filename -> Event for concurrent identical requests
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild LRU order from files already on disk (by last access/modification)"""
+        files = []
+        for path in self.directory.glob(f"{FILE_PREFIX}*.*"):
+            if path.suffix == ".tmp":
+                continue
+            stat = path.stat()
+            files.append((max(stat.st_atime, stat.st_mtime), path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def key(self, text, lang):
+        payload = json.dumps(
+            [self.backend.name, lang, self.backend.settings(), text],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def filename(self, text, lang):
+        return f"{FILE_PREFIX}{self.key(text, lang)}.{self.backend.extension}"
+
+    def lookup(self, text, lang):
+        """Filename if the audio is already cached, else None (never synthesizes)"""
+        name = self.filename(text, lang)
+        with self._lock:
+            if name in self._entries:
+                self._touch(name)
+                self.stats["hits"] += 1
+                return name
+        return None
+
+    def get(self, text, lang):
+        """Filename of the cached audio, synthesizing it on a miss"""
+        name = self.filename(text, lang)
+        with self._lock:
+            if name in self._entries:
+                self._touch(name)
+                self.stats["hits"] += 1
+                return name
+            pending = self._inflight.get(name)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[name] = threading.Event()
+
+        if not owner:
+            # Another request is synthesizing the same text; share its result
+            pending.wait()
+            with self._lock:
+                if name in self._entries:
+                    self.stats["hits"] += 1
+                    return name
+            return None
+
+        try:
+            return self._synthesize(name, text, lang)
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+            pending.set()
+
+    def _synthesize(self, name, text, lang):
+        with self._lock:
+            self.stats["misses"] += 1
+        try:
+            audio = self.backend.synthesize(text, lang)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"TTS generation error: {e}")
+            return None
+
+        # Unique temp name: other server processes may synthesize the same text at once
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=name + ".", suffix=".tmp",
+                                         delete=False) as tmp:
+            tmp.write(audio)
+        try:
+            os.replace(tmp.name, self.directory / name)
+        except OSError:
+            os.unlink(tmp.name)
+            raise
+
+        with self._lock:
+            self._entries[name] = len(audio)
+            self._total_bytes += len(audio)
+            self._evict(keep=name)
+        return name
+
+    def _touch(self, name):
+        self._entries.move_to_end(name)
+        try:
+            os.utime(self.directory / name)
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        while self._entries and (self._total_bytes > self.max_bytes or len(self._entries) > self.max_files):
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self.directory / name)
+            except OSError:
+                pass
+
+    def prewarm(self, texts, lang, background=True):
+        """Synthesize every text not yet cached, optionally on a daemon thread"""
+        def run():
+            for text in texts:
+                self.get(text, lang)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="tts-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, files=len(self._entries), bytes=self._total_bytes,
+                        backend=self.backend.name)
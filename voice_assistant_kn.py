@@ -3,6 +3,14 @@ Krishi Voice Assistant - ಕೃಷಿ ಧ್ವನಿ ಸಹಾಯಕ
 Kannada Only - ಕನ್ನಡ ಮಾತ್ರ
 """
 
+from keyword_matcher import KeywordMatcher
+from knowledge_base import get_knowledge_base
+from metrics import REGISTRY, timed
+
+
+VOICE_ANSWERS = REGISTRY.counter(
+    "tomato_voice_answers_total", "Voice assistant answers by source", ("source",))
+
 # Language configuration
 LANGUAGE = {
     'name': 'ಕನ್ನಡ (Kannada)',
@@ -25,56 +33,108 @@ AGRICULTURE_KEYWORDS = [
 ]
 
 
+# Topic keywords, in tie-break priority order (earlier wins on equal score)
+TOPIC_KEYWORDS = [
+    ('disease', ['ರೋಗ', 'disease', 'sick', 'problem', 'spot', 'curl', 'blight', 'ಚುಕ್ಕೆ', 'ಸುರುಳಿ']),
+    ('farming', ['ಹೇಗೆ', 'how', 'tip', 'advice', 'suggest', 'ಸಲಹೆ', 'ವಿಧಾನ']),
+    ('market', ['ಬೆಲೆ', 'ಮಾರುಕಟ್ಟೆ', 'price', 'market', 'sell', 'ಮಾರಾಟ']),
+    ('soil', ['ಮಣ್ಣು', 'ಗೊಬ್ಬರ', 'soil', 'fertilizer', 'compost', 'ಕಂಪೋಸ್ಟ್']),
+    ('irrigation', ['ನೀರಾವರಿ', 'ನೀರು', 'irrigation', 'water', 'drip', 'ಹನಿ']),
+    ('weather', ['ಹವಾಮಾನ', 'ತಾಪಮಾನ', 'weather', 'temperature', 'ಮಳೆ', 'ಬಿಸಿಲು']),
+]
+
+
+# Q&A database loaded from data/knowledge_base/ (see knowledge_base.py)
+_knowledge_base = get_knowledge_base()
+CSV_QA_DATABASE = _knowledge_base.qa_dict()
+QA_ALIASES = _knowledge_base.alias_map()
+
+
+# ASCII Q&A keys this short ("ph") are matched as whole words only, so they
+# don't fire inside unrelated English words ("phone", "photo")
+SHORT_KEY_LENGTH = 3
+
+
+def _whole_word(keyword):
+    return keyword.isascii() and len(keyword) <= SHORT_KEY_LENGTH
+
+
+def build_matcher(qa_database, aliases=None):
+    """Compile agriculture keywords, Q&A keys/aliases and topic words into one matcher"""
+    matcher = KeywordMatcher()
+    for keyword in AGRICULTURE_KEYWORDS:
+        matcher.add(keyword, ('agri', None))
+    order = {keyword: i for i, keyword in enumerate(qa_database)}
+    for keyword, i in order.items():
+        matcher.add(keyword, ('qa', (i, keyword)), whole_word=_whole_word(keyword))
+    for alias, keyword in (aliases or {}).items():
+        if keyword in order:
+            matcher.add(alias, ('qa', (order[keyword], keyword)), whole_word=_whole_word(alias))
+    for priority, (topic, words) in enumerate(TOPIC_KEYWORDS):
+        for word in words:
+            matcher.add(word, ('topic', (priority, topic)))
+    return matcher.build()
+
+
+# The matcher and the answers it indexes are published as one tuple, so a request
+# never looks up a key from one knowledge base version in another's answers
+_qa_state = (CSV_QA_DATABASE, build_matcher(CSV_QA_DATABASE, QA_ALIASES))
+
+
+def rebuild_matcher():
+    """Recompile the matcher after CSV_QA_DATABASE has been changed"""
+    global _qa_state
+    _qa_state = (CSV_QA_DATABASE, build_matcher(CSV_QA_DATABASE, QA_ALIASES))
+
+
+def refresh_knowledge_base():
+    """Pick up edits to the knowledge base files without a restart"""
+    global CSV_QA_DATABASE, QA_ALIASES, _qa_state
+    if _knowledge_base.maybe_reload():
+        qa_database = _knowledge_base.qa_dict()
+        aliases = _knowledge_base.alias_map()
+        matcher = build_matcher(qa_database, aliases)
+        _qa_state = (qa_database, matcher)
+        CSV_QA_DATABASE, QA_ALIASES = qa_database, aliases
+
+
+def analyze_question(question):
+    """
+    Scan the question once and collect everything it matches.
+    Q&A keys are ranked by specificity (longest key, then most occurrences,
+    then database order); topics by matched characters, then priority.
+    """
+    qa_database, matcher = _qa_state
+    agri = False
+    qa_hits = {}
+    topic_hits = {}
+    for start, end, pattern, (kind, value) in matcher.find_all(question):
+        if kind == 'agri':
+            agri = True
+        elif kind == 'qa':
+            qa_hits[value] = qa_hits.get(value, 0) + 1
+        else:
+            topic_hits[value] = topic_hits.get(value, 0) + (end - start)
+
+    qa_ranked = sorted(qa_hits, key=lambda v: (-len(v[1]), -qa_hits[v], v[0]))
+    topics_ranked = sorted(topic_hits, key=lambda v: (-topic_hits[v], v[0]))
+    return {
+        'agriculture': agri,
+        'qa_keys': [keyword for _, keyword in qa_ranked],
+        # Answer from the same knowledge base version as the matched keys
+        'qa_answer': qa_database[qa_ranked[0][1]] if qa_ranked else None,
+        'topics': [topic for _, topic in topics_ranked],
+    }
+
+
 def is_agriculture_related(text):
     """Check if the question is related to agriculture"""
-    text_lower = text.lower()
-    for keyword in AGRICULTURE_KEYWORDS:
-        if keyword.lower() in text_lower:
-            return True
-    return False
-
-
-# Extended Q&A database from CSV
-CSV_QA_DATABASE = {
-    'ಬ್ಯಾಕ್ಟೀರಿಯಾ ಸ್ಪಾಟ್': "ಬ್ಯಾಕ್ಟೀರಿಯಾ ಸ್ಪಾಟ್ ಗೆ ಕಾಪರ್ ಆಧಾರಿತ ಶಿಲೀಂಧ್ರನಾಶಕಗಳನ್ನು ಬಳಸಿ ಮತ್ತು ಸೋಂಕಿತ ಎಲೆಗಳನ್ನು ತೆಗೆದುಹಾಕಿ. ನೀರಾವರಿಯನ್ನು ಕಡಿಮೆ ಮಾಡಿ ಮತ್ತು ಸಸ್ಯಗಳ ನಡುವೆ ಸಾಕಷ್ಟು ಅಂತರ ಇರಿಸಿ.",
-    'ತಾಪಮಾನ': "ಟಮಾಟೊ ಬೆಳೆಗೆ ಸೂಕ್ತ ತಾಪಮಾನ 20 ರಿಂದ 25 ಡಿಗ್ರಿ ಸೆಲ್ಸಿಯಸ್. ಬಿಸಿಲಿನಲ್ಲಿ ನೆರಳು ಜಾಲರಿ ಬಳಸಿ ಮತ್ತು ನಿಯಮಿತವಾಗಿ ನೀರು ಕೊಡಿ.",
-    'ನೀರು ಬೇಕು': "ಟಮಾಟೊ ಸಸ್ಯಕ್ಕೆ ವಾರಕ್ಕೆ 2 ರಿಂದ 3 ಬಾರಿ ನೀರು ಕೊಡಿ. ಮಣ್ಣು ತೇವವಾಗಿರಲಿ. ಡ್ರಿಪ್ ನೀರಾವರಿ ಉತ್ತಮ.",
-    'ಮಳೆಗಾಲ': "ಮಳೆಗಾಲದಲ್ಲಿ ಒಳಚರಂಡಿ ವ್ಯವಸ್ಥೆ ಮಾಡಿ. ಶಿಲೀಂಧ್ರನಾಶಕ ಸಿಂಪಡಿಸಿ. ಸಸ್ಯಗಳ ನಡುವೆ ಸಾಕಷ್ಟು ಅಂತರ ಇರಿಸಿ.",
-    'ಬಿಸಿಲು': "ಬಿಸಿಲಿನಲ್ಲಿ ನೆರಳು ಜಾಲರಿ ಬಳಸಿ. ನಿಯಮಿತವಾಗಿ ನೀರು ಕೊಡಿ. ಸಂಜೆ ನೀರಾವರಿ ಮಾಡುವುದು ಉತ್ತಮ.",
-    'ಬೀಜ ಬಿತ್ತನೆ': "ಟಮಾಟೊ ಬೀಜ ಬಿತ್ತನೆ ಜೂನ್ ರಿಂದ ಜುಲೈ ಮತ್ತು ಅಕ್ಟೋಬರ್ ರಿಂದ ನವೆಂಬರ್ ತಿಂಗಳಲ್ಲಿ. ಹವಾಮಾನ ಸ್ಥಿರವಾಗಿರಲಿ.",
-    'ಕೊಯ್ಲು': "ಬಿತ್ತನೆಯಿಂದ 60 ರಿಂದ 80 ದಿನಗಳಲ್ಲಿ ಟಮಾಟೊ ಕೊಯ್ಲು ಮಾಡಬಹುದು. ಹಣ್ಣು ಕೆಂಪು ಬಣ್ಣಕ್ಕೆ ಬಂದಾಗ ಕೊಯ್ಲು ಮಾಡಿ.",
-    'ಅಂತರ': "ಟಮಾಟೊ ಸಸ್ಯಗಳ ನಡುವೆ 45 ರಿಂದ 60 ಸೆಂಟಿಮೀಟರ್ ಅಂತರ ಇಡಿ. ಇದರಿಂದ ಗಾಳಿ ಪರಿಚಲನೆ ಹೆಚ್ಚಾಗುತ್ತದೆ.",
-    'ಇಳುವರಿ': "ಪ್ರತಿ ಸಸ್ಯಕ್ಕೆ 3 ರಿಂದ 5 ಕೆಜಿ ಟಮಾಟೊ ಇಳುವರಿ ಸಿಗುತ್ತದೆ. ರೋಗ ನಿರೋಧಕ ಪ್ರಭೇದಗಳನ್ನು ಬಳಸಿದರೆ ಇಳುವರಿ ಹೆಚ್ಚಾಗುತ್ತದೆ.",
-    'ಚಿಕಿತ್ಸಾ ವೆಚ್ಚ': "ಪ್ರತಿ ಸಸ್ಯಕ್ಕೆ ಚಿಕಿತ್ಸಾ ವೆಚ್ಚ 10 ರಿಂದ 20 ರೂಪಾಯಿ ಆಗುತ್ತದೆ. ರೋಗ ನಿರೋಧಕ ಪ್ರಭೇದಗಳನ್ನು ಬಳಸಿದರೆ ವೆಚ್ಚ ಕಡಿಮೆಯಾಗುತ್ತದೆ.",
-    'ಲಾಭ': "ಪ್ರತಿ ಎಕರೆಗೆ 50000 ರಿಂದ 100000 ರೂಪಾಯಿ ಲಾಭ ಸಾಧ್ಯ. ರೋಗ ನಿರ್ವಹಣೆ ಮತ್ತು ಸರಿಯಾದ ನೀರಾವರಿಯಿಂದ ಲಾಭ ಹೆಚ್ಚಾಗುತ್ತದೆ.",
-    'ವೆಚ್ಚ': "ಪ್ರತಿ ಎಕರೆಗೆ 30000 ರಿಂದ 50000 ರೂಪಾಯಿ ವೆಚ್ಚವಾಗುತ್ತದೆ. ಬೀಜ ಗೊಬ್ಬರ ಕೀಟನಾಶಕ ಮತ್ತು ನೀರಾವರಿ ವೆಚ್ಚ ಸೇರಿದೆ.",
-    'ರೋಗ ನಿರೋಧಕ': "ಅರ್ಕಾ ವಿಕಾಸ್ ಅರ್ಕಾ ಮೇಘಲಿ ಮತ್ತು ಪೊನ್ನಿ ರೋಗ ನಿರೋಧಕ ಪ್ರಭೇದಗಳು. ಈ ಪ್ರಭೇದಗಳನ್ನು ಬಳಸಿದರೆ ರೋಗಗಳಿಂದ ರಕ್ಷಣೆ ಸಿಗುತ್ತದೆ.",
-    'ಸ್ಪೈಡರ್ ಮೈಟ್ಸ್': "ಸ್ಪೈಡರ್ ಮೈಟ್ಸ್ ಗೆ ನೀಮ್ ಎಣ್ಣೆ ಅಥವಾ ಮೈಟಿಸೈಡ್ ಸಿಂಪಡಿಸಿ. ಸಸ್ಯಗಳನ್ನು ನೀರಾವರಿ ಮಾಡುವಾಗ ಎಲೆಗಳ ಕೆಳಗೆ ಕೂಡ ನೀರು ಕೊಡಿ.",
-    'ಟಾರ್ಗೆಟ್ ಸ್ಪಾಟ್': "ಟಾರ್ಗೆಟ್ ಸ್ಪಾಟ್ ಗೆ ತಾಮ್ರ ಶಿಲೀಂಧ್ರನಾಶಕ ಬಳಸಿ. ಸಸ್ಯಗಳ ನಡುವೆ ಸಾಕಷ್ಟು ಅಂತರ ಇರಿಸಿ ಮತ್ತು ಒಳಚರಂಡಿ ವ್ಯವಸ್ಥೆ ಮಾಡಿ.",
-    'ಲೀಫ್ ಕರ್ಲ್': "ಯೆಲ್ಲೋ ಲೀಫ್ ಕರ್ಲ್ ವೈರಸ್ ಗೆ ಬಿಳಿ ನೊಣ ನಿಯಂತ್ರಣ ಮಾಡಿ ಮತ್ತು ಸೋಂಕಿತ ಸಸ್ಯಗಳನ್ನು ತೆಗೆದುಹಾಕಿ. ವೈರಸ್ ತಡೆಗಟ್ಟಲು ಕೀಟ ನಿಯಂತ್ರಣ ಮಾಡಿ.",
-    'ಮೊಸೈಕ್ ವೈರಸ್': "ಮೊಸೈಕ್ ವೈರಸ್ ನಲ್ಲಿ ಎಲೆಗಳು ಚುಕ್ಕೆಗಳು ಮತ್ತು ವಿರೂಪಗೊಳ್ಳುತ್ತವೆ. ಸಸ್ಯದ ಬೆಳವಣಿಗೆ ನಿಂತುಹೋಗುತ್ತದೆ. ಸೋಂಕಿತ ಸಸ್ಯಗಳನ್ನು ತೆಗೆದುಹಾಕಿ.",
-    'ಸೆಪ್ಟೋರಿಯಾ': "ಸೆಪ್ಟೋರಿಯಾ ತಡೆಗಟ್ಟಲು ಮಳೆಯಿಂದ ರಕ್ಷಿಸಿ ಮತ್ತು ಶಿಲೀಂಧ್ರನಾಶಕ ಸಿಂಪಡಿಸಿ. ಸಸ್ಯಗಳ ನಡುವೆ ಸಾಕಷ್ಟು ಅಂತರ ಇರಿಸಿ.",
-    'ಲೀಫ್ ಮೋಲ್ಡ್': "ಲೀಫ್ ಮೋಲ್ಡ್ ಗೆ ಗಾಳಿ ಪರಿಚಲನೆ ಹೆಚ್ಚಿಸಿ ತೇವಾಂಶ ಕಡಿಮೆ ಮಾಡಿ ಮತ್ತು ಶಿಲೀಂಧ್ರನಾಶಕ ಸಿಂಪಡಿಸಿ.",
-    'ph': "ಟಮಾಟೊಗೆ ಮಣ್ಣಿನ pH 6 ರಿಂದ 7 ಇರಬೇಕು. ಮಣ್ಣು ಪರೀಕ್ಷೆ ಮಾಡಿಸಿ ಮತ್ತು ಅಗತ್ಯಾನುಸಾರ ಗೊಬ್ಬರ ಹಾಕಿ.",
-    'ಬೀಜ ಬೆಲೆ': "ಹೈಬ್ರಿಡ್ ಬೀಜದ ಬೆಲೆ 500 ರಿಂದ 1000 ರೂಪಾಯಿ ಪ್ರತಿ ಪ್ಯಾಕೆಟ್. ರೋಗ ನಿರೋಧಕ ಪ್ರಭೇದಗಳ ಬೀಜಗಳು ಸ್ವಲ್ಪ ಹೆಚ್ಚು ಬೆಲೆಯಲ್ಲಿವೆ.",
-    'ಸಹಾಯಧನ': "ಡ್ರಿಪ್ ನೀರಾವರಿ ಮತ್ತು ಪಾಲಿಹೌಸ್ ಗೆ ಸರ್ಕಾರಿ ಸಹಾಯಧನ ಸಿಗುತ್ತದೆ. ಪ್ರಧಾನ ಮಂತ್ರಿ ಕಿಸಾನ್ ಸಮ್ಮಾನ್ ನಿಧಿಯಿಂದ ಸಹಾಯಧನ ಸಿಗುತ್ತದೆ.",
-    'ಸಾವಯವ': "ಸಾವಯವ ಬೆಳೆಗೆ ಹಸುವಿನ ಗೊಬ್ಬರ ಮತ್ತು ನೀಮ್ ಎಣ್ಣೆ ಬಳಸಿ. ಸಾವಯವ ಟಮಾಟೊಗೆ ಹೆಚ್ಚು ಬೆಲೆ ಸಿಗುತ್ತದೆ.",
-    'ಹೈಬ್ರಿಡ್': "ಹೈಬ್ರಿಡ್ ಪ್ರಭೇದಗಳು ಹೆಚ್ಚು ಇಳುವರಿ ಮತ್ತು ರೋಗ ನಿರೋಧಕ. ಅರ್ಕಾ ವಿಕಾಸ್ ಅರ್ಕಾ ಮೇಘಲಿ ಉತ್ತಮ ಪ್ರಭೇದಗಳು.",
-    'ತರಬೇತಿ': "ಕೃಷಿ ವಿಜ್ಞಾನ ಕೇಂದ್ರದಲ್ಲಿ ತರಬೇತಿ ಪಡೆಯಬಹುದು. ಸರ್ಕಾರಿ ಕೃಷಿ ಇಲಾಖೆಯವರು ನೀಡುವ ತರಬೇತಿ ಪ್ರಯೋಜನಕರವಾಗಿರುತ್ತದೆ.",
-    'ವಿಮೆ': "ಪ್ರಧಾನ ಮಂತ್ರಿ ಫಸಲ್ ಬೀಮಾ ಯೋಜನೆಯಲ್ಲಿ ವಿಮೆ ಮಾಡಿಸಬಹುದು. ರೋಗ ಕೀಟ ಹವಾಮಾನ ಸಮಸ್ಯೆಗಳಿಗೆ ವಿಮೆ ಸಿಗುತ್ತದೆ.",
-    'ಸಾಲ': "ಬ್ಯಾಂಕ್ ಮತ್ತು ಸಹಕಾರ ಸಂಘಗಳಿಂದ ಕೃಷಿ ಸಾಲ ಲಭ್ಯ. ಪ್ರಧಾನ ಮಂತ್ರಿ ಕಿಸಾನ್ ಸಮ್ಮಾನ್ ನಿಧಿಯಿಂದ ಸಾಲ ಲಭ್ಯ.",
-    'ಮಳೆನೀರು': "ಮಳೆನೀರು ಸಂಗ್ರಹಣೆ ನೀರಾವರಿಗೆ ಉಪಯೋಗವಾಗುತ್ತದೆ. ಮಳೆಯ ನೀರನ್ನು ಸಂಗ್ರಹಿಸಿ ಮತ್ತು ಬೇಕಾದಾಗ ಬಳಸಿ.",
-    'ಮಣ್ಣು ಪರೀಕ್ಷೆ': "ಮಣ್ಣು ಪರೀಕ್ಷೆಯಿಂದ ಗೊಬ್ಬರ ಅಗತ್ಯ ತಿಳಿಯುತ್ತದೆ. ಕೃಷಿ ಇಲಾಖೆಯಲ್ಲಿ ಮಣ್ಣು ಪರೀಕ್ಷೆ ಮಾಡಿಸಬಹುದು.",
-    'ಕೀಟನಾಶಕ': "ನೀಮ್ ಎಣ್ಣೆ ಅಥವಾ ಕೀಟನಾಶಕ ಸಿಂಪಡಿಸಿ ಕೀಟ ನಿಯಂತ್ರಣ ಮಾಡಿ. ಹಸಿರು ಹುಳುಗಳಿಗೆ BT ಕೀಟನಾಶಕ ಬಳಸಿ.",
-}
+    return analyze_question(text)['agriculture']
 
 
 def check_csv_questions(question):
-    """Check if question matches any from CSV database"""
-    for keyword, answer in CSV_QA_DATABASE.items():
-        if keyword in question:
-            return answer
-    return None
+    """Return the most specific CSV database answer matched by the question"""
+    return analyze_question(question)['qa_answer']
 
 
 def get_weather_info():
@@ -104,44 +164,33 @@ def get_weather_info():
 
 def get_agriculture_response(question):
     """Generate agriculture-specific response in Kannada"""
-    question_lower = question.lower()
-    
+    refresh_knowledge_base()
+    with timed('voice', 'keyword_match'):
+        match = analyze_question(question)
+
     # Check if agriculture-related
-    if not is_agriculture_related(question):
+    if not match['agriculture']:
+        VOICE_ANSWERS.inc(source='out_of_scope')
         return LANGUAGE['out_of_scope']
-    
-    # Check specific questions from CSV first
-    csv_response = check_csv_questions(question_lower)
-    if csv_response:
-        return csv_response
-    
-    # Disease queries - ರೋಗ
-    if any(word in question_lower for word in ['ರೋಗ', 'disease', 'sick', 'problem', 'spot', 'curl', 'blight', 'ಚುಕ್ಕೆ', 'ಸುರುಳಿ']):
-        return get_disease_info()
-    
-    # Farming tips - ಕೃಷಿ ಸಲಹೆ
-    elif any(word in question_lower for word in ['ಹೇಗೆ', 'how', 'tip', 'advice', 'suggest', 'ಸಲಹೆ', 'ವಿಧಾನ']):
-        return get_farming_tips()
-    
-    # Market/price queries - ಬೆಲೆ/ಮಾರುಕಟ್ಟೆ
-    elif any(word in question_lower for word in ['ಬೆಲೆ', 'ಮಾರುಕಟ್ಟೆ', 'price', 'market', 'sell', 'ಮಾರಾಟ']):
-        return get_market_info()
-    
-    # Soil/fertilizer queries - ಮಣ್ಣು/ಗೊಬ್ಬರ
-    elif any(word in question_lower for word in ['ಮಣ್ಣು', 'ಗೊಬ್ಬರ', 'soil', 'fertilizer', 'compost', 'ಕಂಪೋಸ್ಟ್']):
-        return get_soil_info()
-    
-    # Irrigation - ನೀರಾವರಿ
-    elif any(word in question_lower for word in ['ನೀರಾವರಿ', 'ನೀರು', 'irrigation', 'water', 'drip', 'ಹನಿ']):
-        return get_irrigation_info()
-    
-    # Weather/temperature - ಹವಾಮಾನ
-    elif any(word in question_lower for word in ['ಹವಾಮಾನ', 'ತಾಪಮಾನ', 'weather', 'temperature', 'ಮಳೆ', 'ಬಿಸಿಲು']):
-        return get_weather_info()
-    
+
+    # Exact Q&A key first, then a fuzzy knowledge base match for noisy transcriptions
+    if match['qa_keys']:
+        VOICE_ANSWERS.inc(source='qa_exact')
+        return match['qa_answer']
+    with timed('voice', 'fuzzy_lookup'):
+        fuzzy = _knowledge_base.best_answer(question)
+    if fuzzy:
+        VOICE_ANSWERS.inc(source='qa_fuzzy')
+        return fuzzy['answer']
+
+    # Topic queries - disease, tips, market, soil, irrigation, weather
+    if match['topics']:
+        VOICE_ANSWERS.inc(source='topic_' + match['topics'][0])
+        return TOPIC_HANDLERS[match['topics'][0]]()
+
     # Default helpful response
-    else:
-        return get_default_help()
+    VOICE_ANSWERS.inc(source='default')
+    return get_default_help()
 
 
 def get_disease_info():
@@ -295,3 +344,21 @@ def get_default_help():
 🌱 ಸರ್ಕಾರಿ ಯೋಜನೆಗಳು
 
 ನಿಮ್ಮ ಪ್ರಶ್ನೆ ಏನು?"""
+
+
+TOPIC_HANDLERS = {
+    'disease': get_disease_info,
+    'farming': get_farming_tips,
+    'market': get_market_info,
+    'soil': get_soil_info,
+    'irrigation': get_irrigation_info,
+    'weather': get_weather_info,
+}
+
+
+def get_canned_responses():
+    """Every fixed answer the assistant can give, e.g. for pre-generating audio"""
+    responses = [LANGUAGE['out_of_scope'], get_default_help()]
+    responses += [handler() for handler in TOPIC_HANDLERS.values()]
+    responses += list(CSV_QA_DATABASE.values())
+    return list(dict.fromkeys(responses))
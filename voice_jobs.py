@@ -0,0 +1,92 @@
+"""
+Voice Audio Jobs
+Runs text-to-speech off the request thread on a bounded worker pool.
+
+/voice-ai/process answers with the text straight away; audio that is not
+already cached is synthesized here and the client polls the job until the
+file is ready. Jobs are keyed by the TTS cache filename, so identical answers
+requested at the same time share one job.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", 2))
+TTS_MAX_PENDING = int(os.environ.get("TTS_MAX_PENDING", 32))
+JOB_TTL = 600  # seconds a finished job stays queryable
+
+
+class VoiceJobQueue:
+    """Bounded background synthesis in front of a TTSCache"""
+
+    def __init__(self, cache, workers=TTS_WORKERS, max_pending=TTS_MAX_PENDING):
+        self.cache = cache
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self._jobs = {}      # job_id -> {'status', 'audio_file', 'finished'}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def job_id(filename):
+        return filename.split(".", 1)[0]
+
+    def submit(self, text, lang):
+        """
+        Returns (status, job_id, audio_file):
+            ('ready', job_id, file)   - audio already cached
+            ('pending', job_id, None) - synthesis queued or running
+            ('busy', None, None)      - queue full, no audio for this answer
+        """
+        cached = self.cache.lookup(text, lang)
+        if cached:
+            return "ready", self.job_id(cached), cached
+
+        job_id = self.job_id(self.cache.filename(text, lang))
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job and job["status"] == "pending":
+                return "pending", job_id, None
+            if self._pending >= self.max_pending:
+                return "busy", None, None
+            self._pending += 1
+            self._jobs[job_id] = {"status": "pending", "audio_file": None, "finished": None}
+
+        self._executor.submit(self._run, job_id, text, lang)
+        return "pending", job_id, None
+
+    def _run(self, job_id, text, lang):
+        try:
+            audio_file = self.cache.get(text, lang)
+        except Exception as e:
+            print(f"TTS job {job_id} failed: {e}")
+            audio_file = None
+        with self._lock:
+            self._pending -= 1
+            self._jobs[job_id] = {
+                "status": "ready" if audio_file else "failed",
+                "audio_file": audio_file,
+                "finished": time.monotonic(),
+            }
+
+    def status(self, job_id):
+        """(status, audio_file) for a job; 'unknown' once expired or never submitted"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return "unknown", None
+        return job["status"], job["audio_file"]
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished"] is not None and now - job["finished"] > JOB_TTL]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)